@@ -0,0 +1,74 @@
+# Compares the Chrome render path with the browserless http path on the
+# stand-in site. Run from the top level dir of the project:
+#   python -m benchmarks.bench_fetch 20
+import resource
+import sys
+import time
+
+# The scraper wants a site to point at, the stand-in site replaces it below
+from benchmarks.standin_site import StandinSite
+from src import scraper
+
+DEFAULT_PAGES = 20
+CARDS_PER_PAGE = 12
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def time_pages(render, driver, base_url, pages):
+    start = time.perf_counter()
+    cards = 0
+    for page_num in range(1, pages + 1):
+        cards += len(render(driver, base_url + str(page_num)))
+    elapsed = time.perf_counter() - start
+    return {
+        "pages": pages,
+        "cards": cards,
+        "seconds": round(elapsed, 3),
+        "ms_per_page": round(1000 * elapsed / pages, 2),
+    }
+
+
+def bench_http(site, pages):
+    fetcher = scraper.provision_http_fetcher()
+    try:
+        results = {
+            "http_json": time_pages(scraper.fetch_page, fetcher, site.data_url, pages),
+            "http_html": time_pages(scraper.fetch_page, fetcher, site.url, pages),
+        }
+    finally:
+        fetcher.quit()
+    # Nothing else has run yet, so this is what the http path needed
+    results["http_peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return results
+
+
+def bench_browser(site, pages):
+    try:
+        driver = scraper.provision_webdriver()
+    except SystemExit:
+        return {"browser": "skipped, could not start Chrome"}
+    try:
+        return {"browser": time_pages(scraper.render_page, driver, site.url, pages)}
+    finally:
+        driver.quit()
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PAGES
+    # http_html needs the cards in the server rendered page, the browser gets
+    # the JS rendered one like the real site
+    with StandinSite(cards_per_page=CARDS_PER_PAGE, js_delay_ms=None) as site:
+        results = bench_http(site, pages)
+    with StandinSite(cards_per_page=CARDS_PER_PAGE, js_delay_ms=100) as site:
+        results.update(bench_browser(site, pages))
+
+    for name, result in results.items():
+        print(f"{name}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# How long importing each entry point takes, from python -X importtime in a
+# fresh interpreter, and whether Selenium, BeautifulSoup or dotenv came with it:
+#   python -m benchmarks.bench_import --rounds=5
+# Options: --rounds= imports of each module, the fastest one counts,
+# --top= heaviest imports to list for each module
+import os
+import subprocess
+import sys
+
+from src.cli import split_cli_args
+
+MODULES = ["src.parse", "src.reparse", "src.scraper", "src.api", "src.shard"]
+HEAVY_PACKAGES = ["selenium", "bs4", "dotenv"]
+DEFAULT_ROUNDS = 5
+DEFAULT_TOP = 5
+CLI_OPTIONS = ["rounds", "top"]
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    # {imported module: (self microseconds, cumulative microseconds, nesting)}, no
+    # WEBSITE_URL or .env, an import that needs them fails here
+    env = {key: value for key, value in os.environ.items() if key != "WEBSITE_URL"}
+    env["PYTHONPATH"] = PROJECT_DIR
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {result.stderr.splitlines()[-1]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        # Two spaces deeper for every level of nesting
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(self_us), int(cumulative_us), level)
+    return times
+
+
+def direct_imports(times, module):
+    # What module imported itself, listed right before it one level deeper.
+    # Anything before that was the interpreter starting up
+    names = list(times)
+    imports = {}
+    for name in reversed(names[: names.index(module)]):
+        level = times[name][2]
+        if level == 0:
+            break
+        if level == 1:
+            imports[name] = times[name][1]
+    return imports
+
+
+def measure(module, rounds):
+    fastest = None
+    for _ in range(rounds):
+        times = import_times(module)
+        if fastest is None or times[module][1] < fastest[module][1]:
+            fastest = times
+    return fastest
+
+
+def main():
+    args, options = split_cli_args(sys.argv, CLI_OPTIONS)
+    rounds = int(options.get("rounds") or DEFAULT_ROUNDS)
+    top = int(options.get("top") or DEFAULT_TOP)
+
+    for module in MODULES:
+        try:
+            times = measure(module, rounds)
+        except RuntimeError as e:
+            print(f"{module:>12}: {e}")
+            continue
+        heavy = [package for package in HEAVY_PACKAGES if package in times]
+        print(
+            f"{module:>12}: {times[module][1] / 1000:7.1f}ms, "
+            f"{len(times)} modules, pulls in {heavy or 'nothing heavy'}"
+        )
+        imports = direct_imports(times, module)
+        for name, cumulative in sorted(
+            imports.items(), key=lambda item: item[1], reverse=True
+        )[:top]:
+            print(f"{'':>14}{name}: {cumulative / 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
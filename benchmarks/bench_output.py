@@ -0,0 +1,116 @@
+# File size, write time and load time of each output format for a big run of
+# synthetic realtors. Office names and addresses repeat like they do on the
+# real site. parquet is skipped without pyarrow.
+# Run from the top level dir of the project:
+#   python -m benchmarks.bench_output 50000
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from importlib.util import find_spec
+
+from src import scraper
+from src.sinks import ParquetSink, SqliteSink, StreamingCsvWriter
+
+DEFAULT_REALTORS = 50000
+CARDS_PER_PAGE = 12
+OFFICES = 400
+LOAD_ROUNDS = 3
+
+
+def make_pages(realtors):
+    pages = []
+    for start in range(0, realtors, CARDS_PER_PAGE):
+        pages.append(
+            [
+                scraper.RealtorData(
+                    f"REALTOR {index}",
+                    "SALESPERSON" if index % 5 else "BROKER",
+                    f"OFFICE {index % OFFICES} REALTY",
+                    f"{index % OFFICES} MAIN ST, OMAHA, NEBRASKA",
+                    f"555-{index // 10000:03d}-{index % 10000:04d}",
+                )
+                for index in range(start, min(start + CARDS_PER_PAGE, realtors))
+            ]
+        )
+    return pages
+
+
+def load_csv(filename):
+    with open(filename, newline="") as file:
+        return sum(1 for _ in csv.DictReader(file))
+
+
+def load_sqlite(filename):
+    connection = sqlite3.connect(filename)
+    rows = len(connection.execute("SELECT * FROM realtors").fetchall())
+    connection.close()
+    return rows
+
+
+def load_parquet(filename):
+    import pyarrow.parquet
+
+    return pyarrow.parquet.read_table(filename).num_rows
+
+
+def bench_output(open_sink, load, filename, pages, realtors):
+    start = time.perf_counter()
+    sink = open_sink(filename)
+    for page_num, page_data in enumerate(pages, 1):
+        sink.write_page(page_num, page_data)
+        if page_num % scraper.BATCH_SIZE == 0:
+            sink.checkpoint(
+                list(range(page_num - scraper.BATCH_SIZE + 1, page_num + 1))
+            )
+    sink.close()
+    write_seconds = time.perf_counter() - start
+
+    load_seconds = None
+    for _ in range(LOAD_ROUNDS):
+        start = time.perf_counter()
+        assert load(filename) == realtors
+        elapsed = time.perf_counter() - start
+        load_seconds = elapsed if load_seconds is None else min(load_seconds, elapsed)
+    return {
+        "size_kb": round(os.path.getsize(filename) / 1024),
+        "write_ms": round(1000 * write_seconds),
+        "load_ms": round(1000 * load_seconds, 1),
+    }
+
+
+def main():
+    realtors = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REALTORS
+    pages = make_pages(realtors)
+    # Checkpoint lines for every batch would bury the results
+    scraper.LOGGER.setLevel(logging.WARNING)
+    outputs = {
+        "csv": (
+            lambda filename: StreamingCsvWriter(scraper.initialize_csv(filename[:-4])),
+            load_csv,
+        ),
+        "sqlite": (
+            lambda filename: SqliteSink(filename, scraper.RealtorData._fields),
+            load_sqlite,
+        ),
+        "parquet": (
+            lambda filename: ParquetSink(filename, scraper.RealtorData._fields),
+            load_parquet,
+        ),
+    }
+    extensions = {"csv": "csv", "sqlite": "db", "parquet": "parquet"}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (open_sink, load) in outputs.items():
+            if name == "parquet" and find_spec("pyarrow") is None:
+                print(f"{name}: skipped, pyarrow not installed")
+                continue
+            filename = os.path.join(directory, f"realtors.{extensions[name]}")
+            print(f"{name}: {bench_output(open_sink, load, filename, pages, realtors)}")
+
+
+if __name__ == "__main__":
+    main()
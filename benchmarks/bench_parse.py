@@ -0,0 +1,72 @@
+# Cards per second for each page parser on a synthetic listing page, and for
+# card field extraction on its own, the single pass field table against the
+# five card.find() calls it replaced.
+# Run from the top level dir of the project:
+#   python -m benchmarks.bench_parse 2000
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.standin_site import render_listing_page
+from src import scraper
+
+DEFAULT_CARDS = 2000
+ROUNDS = 3
+
+
+def cards_per_second(page_parser, page_source):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        cards = len(page_parser(page_source))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(cards / best)
+
+
+# The extractor before the field table, one subtree walk per field
+def collect_with_find_calls(soup):
+    page_data = []
+    for card in soup.find_all(id=scraper.CARD_ID_PATTERN):
+        values = []
+        for css_class in [
+            "realtorCardName",
+            "realtorCardTitle",
+            "realtorCardOfficeName",
+            "realtorCardOfficeAddress",
+            "realtorCardContactNumber TelephoneNumber",
+        ]:
+            try:
+                values.append(scraper.sanitize(card.find(class_=css_class).text))
+            except (TypeError, AttributeError):
+                values.append("")
+        page_data.append(scraper.RealtorData(*values))
+    return page_data
+
+
+def main():
+    cards = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CARDS
+    page_source = render_listing_page(1, cards_per_page=cards)
+    expected = scraper.parse_page_source(page_source)
+
+    for parser in scraper.PARSERS:
+        if scraper.check_input_parser(parser) != parser:
+            print(f"{parser}: skipped, not installed")
+            continue
+        for strain_cards in [False, True]:
+            page_parser = scraper.make_page_parser(parser, strain_cards)
+            assert page_parser(page_source) == expected
+            name = f"{parser}{' strained' if strain_cards else ''}"
+            print(f"{name}: {cards_per_second(page_parser, page_source)} cards/s")
+
+    soup = BeautifulSoup(page_source, "html.parser")
+    assert collect_with_find_calls(soup) == expected
+    before = cards_per_second(collect_with_find_calls, soup)
+    after = cards_per_second(scraper.collect_realtor_data_from_page, soup)
+    print(f"extract before (find per field): {before} cards/s")
+    print(f"extract after (field table): {after} cards/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Compares the full and lean browser profiles on the stand-in site, per page
+# load time and the RSS of the whole Chrome process tree. Linux only.
+# Run from the top level dir of the project:
+#   python -m benchmarks.bench_profile 20
+import sys
+import time
+
+from benchmarks.standin_site import StandinSite
+from src import scraper
+from src.metrics import process_tree_rss_bytes
+
+DEFAULT_PAGES = 20
+
+
+def bench_profile(profile, site, pages):
+    try:
+        driver = scraper.provision_webdriver(profile)
+    except SystemExit:
+        return "skipped, could not start Chrome"
+
+    assets_before = site.assets_served
+    page_times = []
+    peak_rss = 0.0
+    try:
+        for page_num in range(1, pages + 1):
+            start = time.perf_counter()
+            scraper.render_page(driver, site.url + str(page_num))
+            page_times.append(time.perf_counter() - start)
+            peak_rss = max(peak_rss, process_tree_rss_bytes(driver.service.process.pid))
+    finally:
+        driver.quit()
+
+    return {
+        "pages": pages,
+        "ms_per_page": round(1000 * sum(page_times) / pages, 1),
+        "peak_browser_rss_mb": round(peak_rss / 1024 / 1024, 1),
+        "assets_requested": site.assets_served - assets_before,
+    }
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PAGES
+    with StandinSite(js_delay_ms=100) as site:
+        for profile in scraper.BROWSER_PROFILES:
+            print(f"{profile}: {bench_profile(profile, site, pages)}")
+
+
+if __name__ == "__main__":
+    main()
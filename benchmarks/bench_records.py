@@ -0,0 +1,110 @@
+# Peak RSS of holding a run's realtors in memory, as a list of RealtorData and
+# in a RecordStore, each measured in a process of its own:
+#   python -m benchmarks.bench_records 100000
+# Options: --agents-per-office= realtors sharing a company and address,
+# --duplicate-rate= chance of a realtor turning up again on a later page
+import json
+import random
+import resource
+import subprocess
+import sys
+
+from src.cli import split_cli_args
+from src.parse import RealtorData, sanitize
+from src.records import RecordStore
+
+DEFAULT_RECORDS = 100000
+DEFAULT_AGENTS_PER_OFFICE = 25
+DEFAULT_DUPLICATE_RATE = 0.05
+ROLES = ["REALTOR®", "Broker", "Salesperson", "Associate Broker", "Agent"]
+REPRESENTATIONS = ["namedtuple", "store", "store-dedup"]
+CLI_OPTIONS = ["agents-per-office", "duplicate-rate", "representation"]
+
+
+def synthetic_realtors(records, agents_per_office, duplicate_rate, seed=1):
+    # Every string is built fresh, like sanitize does for every card on a page
+    rng = random.Random(seed)
+    agents = 0
+    for _ in range(records):
+        if agents and rng.random() < duplicate_rate:
+            agent = rng.randrange(agents)
+        else:
+            agent = agents
+            agents += 1
+        office = agent // agents_per_office
+        yield RealtorData(
+            sanitize(f" REALTOR  {agent} "),
+            sanitize(f" {ROLES[agent % len(ROLES)]} "),
+            sanitize(f" OFFICE {office} REALTY INC. "),
+            sanitize(f" {office} MAIN ST, OMAHA, Nebraska 68102 "),
+            sanitize(f" 402-555-{agent % 10000:04d} "),
+        )
+
+
+def peak_rss_kb():
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(representation, records, agents_per_office, duplicate_rate):
+    realtors = synthetic_realtors(records, agents_per_office, duplicate_rate)
+    before = peak_rss_kb()
+    if representation == "namedtuple":
+        held = list(realtors)
+    else:
+        held = RecordStore(dedup=representation == "store-dedup")
+        held.extend(realtors)
+    return {
+        "representation": representation,
+        "records_held": len(held),
+        "peak_rss_mb": round((peak_rss_kb() - before) / 1024, 1),
+    }
+
+
+def main():
+    args, options = split_cli_args(sys.argv, CLI_OPTIONS)
+    records = int(args[1]) if len(args) > 1 else DEFAULT_RECORDS
+    agents_per_office = int(
+        options.get("agents-per-office") or DEFAULT_AGENTS_PER_OFFICE
+    )
+    duplicate_rate = float(options.get("duplicate-rate") or DEFAULT_DUPLICATE_RATE)
+
+    if "representation" in options:
+        result = measure(
+            options["representation"], records, agents_per_office, duplicate_rate
+        )
+        print(json.dumps(result))
+        return
+
+    # A process each, a representation measured after another would reuse
+    # memory the first one freed
+    results = []
+    for representation in REPRESENTATIONS:
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_records",
+                str(records),
+                f"--agents-per-office={agents_per_office}",
+                f"--duplicate-rate={duplicate_rate}",
+                f"--representation={representation}",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results.append(json.loads(output))
+
+    baseline = results[0]["peak_rss_mb"]
+    print(f"{records} records, {agents_per_office} agents per office")
+    for result in results:
+        ratio = result["peak_rss_mb"] / baseline if baseline else 0.0
+        print(
+            f"{result['representation']:>12}: {result['peak_rss_mb']:7.1f}MB "
+            f"({ratio:.0%} of namedtuple), {result['records_held']} records held"
+        )
+
+
+if __name__ == "__main__":
+    main()
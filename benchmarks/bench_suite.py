@@ -0,0 +1,176 @@
+# Throughput of the scraper's hot paths on synthetic pages, saved as JSON so a
+# run can be compared with one from an earlier version:
+#   python -m benchmarks.bench_suite results.json --compare=old_results.json
+# Options: --cards= cards per page, --pages= pages for the write and scrape
+# benchmarks, --missing-rate= chance of each card field being left out,
+# --rounds= runs of each benchmark, the best one counts
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.standin_site import (
+    StandinSite,
+    expected_page_data,
+    render_listing_page,
+)
+from src import scraper
+from src.cli import split_cli_args
+from src.http_fetch import HttpFetcher
+
+DEFAULT_RESULTS = "bench_results.json"
+DEFAULT_CARDS = 500
+DEFAULT_PAGES = 40
+DEFAULT_MISSING_RATE = 0.05
+DEFAULT_ROUNDS = 5
+# A result this much slower than the one compared against is flagged
+REGRESSION_RATIO = 0.9
+CLI_OPTIONS = ["cards", "pages", "missing-rate", "rounds", "compare"]
+
+
+def best_seconds(func, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_sanitize(cards, rounds):
+    values = [f"  REALTOR\n {index}\t  MAIN ST,   OMAHA  " for index in range(cards)]
+
+    def run():
+        for value in values:
+            scraper.sanitize(value)
+
+    return {"calls_per_s": round(cards / best_seconds(run, rounds))}
+
+
+def bench_collect(cards, missing_rate, rounds):
+    page_source = render_listing_page(1, cards, missing_rate=missing_rate)
+    soup = BeautifulSoup(page_source, scraper.DEFAULT_PARSER)
+    assert scraper.collect_realtor_data_from_page(soup) == expected_page_data(
+        1, cards, missing_rate
+    )
+    seconds = best_seconds(lambda: scraper.collect_realtor_data_from_page(soup), rounds)
+    return {"cards_per_s": round(cards / seconds)}
+
+
+def bench_write_to_csv(cards, pages, rounds, directory):
+    pages_data = [
+        [scraper.RealtorData(*row) for row in expected_page_data(page_num, cards)]
+        for page_num in range(1, pages + 1)
+    ]
+    filename = os.path.join(directory, "write.csv")
+
+    def run():
+        scraper.initialize_csv(filename[:-4])
+        scraper.write_to_csv(filename, pages_data)
+
+    return {"rows_per_s": round(cards * pages / best_seconds(run, rounds))}
+
+
+def bench_scrape_pages(cards, pages, missing_rate, rounds, directory):
+    # The whole loop, fetching, parsing and writing, over http to the stand-in
+    # site, the browser would drown everything else out
+    fetcher = HttpFetcher()
+    with StandinSite(cards, js_delay_ms=None, missing_rate=missing_rate) as site:
+        scraper.URL = site.url
+        scraper.DATA_URL = None
+
+        def run():
+            filename = scraper.initialize_csv(os.path.join(directory, "scrape"))
+            scraper.scrape_pages(fetcher, filename, pages, fetch_mode="http")
+
+        seconds = best_seconds(run, rounds)
+    fetcher.quit()
+    return {
+        "pages_per_s": round(pages / seconds, 1),
+        "cards_per_s": round(cards * pages / seconds),
+    }
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, old_results):
+    # Every number here is a rate, so lower is slower
+    for name, metrics in results["benchmarks"].items():
+        old_metrics = old_results["benchmarks"].get(name, {})
+        for metric, value in metrics.items():
+            old_value = old_metrics.get(metric)
+            if not old_value:
+                continue
+            ratio = value / old_value
+            flag = "  REGRESSION" if ratio < REGRESSION_RATIO else ""
+            print(f"{name}.{metric}: {old_value} -> {value} ({ratio:.2f}x){flag}")
+
+
+def main():
+    args, options = split_cli_args(sys.argv, CLI_OPTIONS)
+    results_path = args[1] if len(args) > 1 else DEFAULT_RESULTS
+    cards = int(options.get("cards") or DEFAULT_CARDS)
+    pages = int(options.get("pages") or DEFAULT_PAGES)
+    missing_rate = float(options.get("missing-rate") or DEFAULT_MISSING_RATE)
+    rounds = int(options.get("rounds") or DEFAULT_ROUNDS)
+
+    # Missing fields are logged per card, that is part of what is measured but
+    # shouldn't end up on the screen
+    scraper.LOGGER.setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as directory:
+        benchmarks = {
+            "sanitize": bench_sanitize(cards, rounds),
+            "collect_realtor_data_from_page": bench_collect(
+                cards, missing_rate, rounds
+            ),
+            "write_to_csv": bench_write_to_csv(cards, pages, rounds, directory),
+            "scrape_pages": bench_scrape_pages(
+                cards, pages, missing_rate, rounds, directory
+            ),
+        }
+
+    results = {
+        "version": git_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {
+            "cards": cards,
+            "pages": pages,
+            "missing_rate": missing_rate,
+            "rounds": rounds,
+        },
+        "benchmarks": benchmarks,
+    }
+    with open(results_path, "w") as file:
+        json.dump(results, file, indent=2)
+
+    for name, metrics in benchmarks.items():
+        print(f"{name}: {metrics}")
+    print(f"Saved to {results_path}")
+
+    if options.get("compare"):
+        with open(options["compare"]) as file:
+            compare_results(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
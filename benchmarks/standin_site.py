@@ -0,0 +1,312 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import re
+import threading
+import time
+
+CARDS_PER_PAGE = 12
+JS_DELAY_MS = 500
+# Logos, stylesheet and font, what a lean browser profile should skip
+ASSET_DELAY_MS = 20
+ASSET_BYTES = 32 * 1024
+ASSET_TYPES = {
+    ".png": "image/png",
+    ".css": "text/css",
+    ".woff2": "font/woff2",
+}
+
+CARD_TEMPLATE = """<div class="realtorCardCon card" id="RealtorCard-{card_id}">
+    <div class="realtorCardBody">
+        <img class="realtorCardOfficeLogo" src="/static/logo-{card_id}.png" />
+{fields}
+    </div>
+</div>"""
+# Every field in card order, with its record key and the element it is in.
+# A missing field leaves its element out of the card and its key out of the
+# record
+CARD_FIELDS = [
+    ("name", "RealtorName", '<span class="realtorCardName">{}</span>'),
+    ("role", "RealtorPosition", '<div class="realtorCardTitle">{}</div>'),
+    ("company", "OfficeName", '<div class="realtorCardOfficeName">{}</div>'),
+    ("address", "OfficeAddress", '<div class="realtorCardOfficeAddress">{}</div>'),
+    (
+        "number",
+        "Phone",
+        '<span class="realtorCardContactNumber TelephoneNumber">{}</span>',
+    ),
+]
+
+# Cards show up in two bursts like the real site, so a waiter that returns
+# on the first card it sees will come back with half a page
+JS_PAGE_TEMPLATE = """<html>
+<head>
+<title>Stand-in listing page {page_num}</title>
+<link rel="stylesheet" href="/static/site.css" />
+<link rel="preload" href="/static/site.woff2" as="font" crossorigin />
+</head>
+<body>
+{pagination}
+<div id="realtorCardsList"></div>
+<script>
+var cards = {cards_json};
+var half = Math.ceil(cards.length / 2);
+function addCards(from, to) {{
+    var list = document.getElementById("realtorCardsList");
+    list.insertAdjacentHTML("beforeend", cards.slice(from, to).join(""));
+}}
+setTimeout(function () {{
+    addCards(0, half);
+    setTimeout(function () {{ addCards(half, cards.length); }}, {burst_gap_ms});
+}}, {js_delay_ms});
+</script>
+</body>
+</html>"""
+
+STATIC_PAGE_TEMPLATE = """<html>
+<head>
+<title>Stand-in listing page {page_num}</title>
+<link rel="stylesheet" href="/static/site.css" />
+<link rel="preload" href="/static/site.woff2" as="font" crossorigin />
+</head>
+<body>
+{pagination}
+<div id="realtorCardsList">{cards}</div>
+</body>
+</html>"""
+
+# Server rendered, like the real site's pager
+PAGINATION_TEMPLATE = """<div class="paginationCon">
+    Page <span class="paginationCurrentPage">{page_num}</span> of
+    <span class="paginationTotalPagesNum">{total_pages}</span>
+</div>"""
+
+
+def missing_fields(page_num, index, missing_rate=0.0):
+    # Seeded by the card, so a page comes out the same every time it's rendered
+    if not missing_rate:
+        return set()
+    rng = random.Random(page_num * 100003 + index)
+    return {field for field, _, _ in CARD_FIELDS if rng.random() < missing_rate}
+
+
+def make_record(page_num, index, missing_rate=0.0):
+    # Same keys as the data-binding attributes on the real cards
+    record = {
+        "IndividualId": page_num * 1000 + index,
+        "RealtorName": f"REALTOR {page_num}-{index}",
+        "RealtorPosition": "SALESPERSON",
+        "OfficeName": f"OFFICE {index % 4}",
+        "OfficeAddress": f"{index} MAIN ST, OMAHA, NEBRASKA",
+        "Phone": f"555-{page_num:03d}-{index:04d}",
+    }
+    for field, key, _ in CARD_FIELDS:
+        if field in missing_fields(page_num, index, missing_rate):
+            del record[key]
+    return record
+
+
+def make_card(page_num, index, missing_rate=0.0):
+    record = make_record(page_num, index, missing_rate)
+    return CARD_TEMPLATE.format(
+        card_id=record["IndividualId"],
+        fields="\n".join(
+            f"        {template.format(record[key])}"
+            for _, key, template in CARD_FIELDS
+            if key in record
+        ),
+    )
+
+
+def expected_page_data(page_num, cards_per_page=CARDS_PER_PAGE, missing_rate=0.0):
+    # What the scraper should get out of the page, "" for a missing field
+    return [
+        tuple(
+            make_record(page_num, index, missing_rate).get(key, "")
+            for _, key, _ in CARD_FIELDS
+        )
+        for index in range(cards_per_page)
+    ]
+
+
+def cards_on_page(page_num, cards_per_page=CARDS_PER_PAGE, total_pages=None):
+    # Pages past the last one come back without cards, like the real site
+    if total_pages is not None and page_num > total_pages:
+        return 0
+    return cards_per_page
+
+
+def render_listing_page(
+    page_num,
+    cards_per_page=CARDS_PER_PAGE,
+    js_delay_ms=None,
+    missing_rate=0.0,
+    total_pages=None,
+):
+    cards = [
+        make_card(page_num, index, missing_rate)
+        for index in range(cards_on_page(page_num, cards_per_page, total_pages))
+    ]
+    pagination = ""
+    if total_pages is not None:
+        pagination = PAGINATION_TEMPLATE.format(
+            page_num=page_num, total_pages=total_pages
+        )
+    if js_delay_ms is None:
+        return STATIC_PAGE_TEMPLATE.format(
+            page_num=page_num, pagination=pagination, cards="\n".join(cards)
+        )
+    return JS_PAGE_TEMPLATE.format(
+        page_num=page_num,
+        pagination=pagination,
+        cards_json=json.dumps(cards),
+        js_delay_ms=js_delay_ms,
+        burst_gap_ms=max(50, js_delay_ms // 4),
+    )
+
+
+def render_listing_json(
+    page_num, cards_per_page=CARDS_PER_PAGE, missing_rate=0.0, total_pages=None
+):
+    records = [
+        make_record(page_num, index, missing_rate)
+        for index in range(cards_on_page(page_num, cards_per_page, total_pages))
+    ]
+    listing = {"Results": records}
+    if total_pages is not None:
+        listing["Paging"] = {
+            "CurrentPage": page_num,
+            "TotalPages": total_pages,
+            "TotalRecords": total_pages * cards_per_page,
+        }
+    return json.dumps(listing)
+
+
+def write_listing_pages(
+    directory, pages, cards_per_page=CARDS_PER_PAGE, missing_rate=0.0
+):
+    # Saved pages on disk, like a folder for python -m src.reparse
+    os.makedirs(directory, exist_ok=True)
+    for page_num in range(1, pages + 1):
+        with open(os.path.join(directory, f"page_{page_num}.html"), "w") as file:
+            file.write(
+                render_listing_page(page_num, cards_per_page, None, missing_rate)
+            )
+
+
+class StandinSite:
+    # Serves listing pages at <url><page_num>, the same way WEBSITE_URL is used,
+    # and the data the page's JS would load at <data_url><page_num>
+    def __init__(
+        self,
+        cards_per_page=CARDS_PER_PAGE,
+        js_delay_ms=JS_DELAY_MS,
+        missing_rate=0.0,
+        total_pages=None,
+    ):
+        self.cards_per_page = cards_per_page
+        self.js_delay_ms = js_delay_ms
+        self.missing_rate = missing_rate
+        self.total_pages = total_pages
+        self.requests_served = 0
+        self.connections_opened = 0
+        self.assets_served = 0
+        self.asset_delay_ms = ASSET_DELAY_MS
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/listings?page="
+
+    @property
+    def data_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/listings?page="
+
+    def make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so pooled sessions can reuse their connections
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes, without this every
+            # keep-alive response waits on a delayed ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                site.connections_opened += 1
+
+            def do_GET(self):
+                if self.path.startswith("/static/"):
+                    self.send_asset()
+                    return
+                match = re.search(r"page=(\d+)$", self.path)
+                if match is None:
+                    self.send_error(404)
+                    return
+                site.requests_served += 1
+                page_num = int(match.group(1))
+                if self.path.startswith("/api/"):
+                    content_type = "application/json"
+                    body = render_listing_json(
+                        page_num,
+                        site.cards_per_page,
+                        site.missing_rate,
+                        site.total_pages,
+                    )
+                else:
+                    content_type = "text/html; charset=utf-8"
+                    body = render_listing_page(
+                        page_num,
+                        site.cards_per_page,
+                        site.js_delay_ms,
+                        site.missing_rate,
+                        site.total_pages,
+                    )
+                body = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_asset(self):
+                extension = self.path[self.path.rfind(".") :]
+                if extension not in ASSET_TYPES:
+                    self.send_error(404)
+                    return
+                site.assets_served += 1
+                time.sleep(site.asset_delay_ms / 1000)
+                self.send_response(200)
+                self.send_header("Content-Type", ASSET_TYPES[extension])
+                self.send_header("Content-Length", str(ASSET_BYTES))
+                self.end_headers()
+                self.wfile.write(b"\0" * ASSET_BYTES)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,183 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from src.http_fetch import HttpFetcher
+from src.metrics import RunMetrics
+from src.parse import parse_page_source
+from src import scraper
+from src.pool import DriverPool
+from src.records import RecordStore
+from src.scraper import (
+    DEFAULT_BROWSER_PROFILE,
+    DEFAULT_FETCH_MODE,
+    DEFAULT_MAX_EMPTY_PAGES,
+    DEFAULT_RECYCLE_PAGES,
+    DEFAULT_RECYCLE_RSS_MB,
+    FETCH_MODES,
+    discover_pages_to_scrape,
+    iter_pages,
+    start_webdriver,
+)
+from src.wait import DEFAULT_WAIT_CEILING, WaitStats
+
+# For using the scraper from other code rather than the command line.
+# Nothing in here exits or writes a file, errors are raised to the caller:
+#   with open_drivers(workers=4) as drivers:
+#       for realtor in iter_realtors(100, drivers):
+#           ...
+# or from async code:
+#   async for realtor in aiter_realtors(100, fetch_mode="http"):
+#       ...
+
+# Handed back by the worker thread once the pages run out
+DONE = object()
+
+
+@contextmanager
+def open_drivers(
+    workers=1,
+    fetch_mode=DEFAULT_FETCH_MODE,
+    profile=DEFAULT_BROWSER_PROFILE,
+    html_cache=None,
+    recycle_pages=DEFAULT_RECYCLE_PAGES,
+    recycle_rss_mb=DEFAULT_RECYCLE_RSS_MB,
+):
+    # Starts a pool of drivers for fetch_mode and quits them all on the way
+    # out, however the block was left
+    if fetch_mode not in FETCH_MODES:
+        raise ValueError(f"fetch_mode has to be one of {FETCH_MODES}")
+    if fetch_mode == "replay":
+        # The cache is the driver, whoever opened it closes it
+        if html_cache is None:
+            raise ValueError("fetch_mode replay needs an html_cache")
+        yield html_cache
+        return
+
+    provision = partial(start_webdriver, profile=profile)
+    restart_driver = provision
+    if fetch_mode == "http":
+        provision = HttpFetcher
+        restart_driver = None
+    pool = DriverPool.provision(
+        workers,
+        provision,
+        restart_driver=restart_driver,
+        recycle_pages=recycle_pages,
+        recycle_rss_bytes=recycle_rss_mb * 1024 * 1024,
+    )
+    try:
+        yield pool
+    finally:
+        pool.quit()
+
+
+def iter_pages_of_realtors(
+    pages_to_scrape=None,
+    drivers=None,
+    first_page=1,
+    workers=1,
+    fetch_mode=DEFAULT_FETCH_MODE,
+    profile=DEFAULT_BROWSER_PROFILE,
+    wait_ceiling=DEFAULT_WAIT_CEILING,
+    page_parser=parse_page_source,
+    html_cache=None,
+    max_empty_pages=DEFAULT_MAX_EMPTY_PAGES,
+    rate_controller=None,
+    metrics=None,
+    normalizer=None,
+):
+    # Yields (page_num, realtors) as each page is parsed. Without drivers it
+    # starts workers of its own and quits them once it is closed or done.
+    # pages_to_scrape of None reads the page count off the first page, a
+    # Normalizer canonicalizes each page before it is yielded
+    if drivers is None:
+        with open_drivers(workers, fetch_mode, profile, html_cache) as drivers:
+            yield from iter_pages_of_realtors(
+                pages_to_scrape,
+                drivers,
+                first_page,
+                fetch_mode=fetch_mode,
+                wait_ceiling=wait_ceiling,
+                page_parser=page_parser,
+                html_cache=html_cache,
+                max_empty_pages=max_empty_pages,
+                rate_controller=rate_controller,
+                metrics=metrics,
+                normalizer=normalizer,
+            )
+        return
+
+    if scraper.URL is None:
+        # Same .env as the command line, unless the caller set scraper.URL
+        scraper.load_config()
+    pool = drivers if isinstance(drivers, DriverPool) else DriverPool([drivers])
+    if pages_to_scrape is None:
+        pages_to_scrape = discover_pages_to_scrape(pool, fetch_mode, wait_ceiling)
+    if metrics is None:
+        metrics = RunMetrics()
+    pages = iter_pages(
+        pool,
+        range(first_page, pages_to_scrape + 1),
+        WaitStats(ceiling=wait_ceiling),
+        fetch_mode,
+        page_parser,
+        html_cache=html_cache,
+        metrics=metrics,
+        rate_controller=rate_controller,
+        max_empty_pages=max_empty_pages,
+    )
+    if normalizer is None:
+        yield from pages
+        return
+    try:
+        for page_num, page_data in pages:
+            with metrics.time("normalize"):
+                page_data = normalizer.normalize_page(page_data)
+            yield page_num, page_data
+    finally:
+        pages.close()
+
+
+def iter_realtors(pages_to_scrape=None, drivers=None, **options):
+    # One RealtorData at a time, in page order. Takes the same options as
+    # iter_pages_of_realtors
+    pages = iter_pages_of_realtors(pages_to_scrape, drivers, **options)
+    try:
+        for page_num, realtors in pages:
+            yield from realtors
+    finally:
+        pages.close()
+
+
+def collect_realtors(pages_to_scrape=None, drivers=None, dedup=False, **options):
+    # Every realtor in a RecordStore, a fraction of the memory of a list of
+    # RealtorData on a big run. With dedup realtors seen on an earlier page
+    # are dropped
+    store = RecordStore(dedup)
+    store.extend(iter_realtors(pages_to_scrape, drivers, **options))
+    return store
+
+
+async def aiter_realtors(pages_to_scrape=None, drivers=None, **options):
+    # The pages are loaded on a worker thread, one page per hop, so the event
+    # loop keeps running while the browsers wait on the site. asyncio is
+    # imported here, whoever runs this already has it loaded.
+    # Every hop and the close run on the same thread, so a consumer cancelled
+    # mid page closes the pages once that page is done, never while it runs
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aiter")
+    pages = iter_pages_of_realtors(pages_to_scrape, drivers, **options)
+    try:
+        while True:
+            page = await loop.run_in_executor(executor, next, pages, DONE)
+            if page is DONE:
+                return
+            for realtor in page[1]:
+                yield realtor
+    finally:
+        # Shielded, being cancelled again can't leave the drivers running
+        await asyncio.shield(loop.run_in_executor(executor, pages.close))
+        executor.shutdown(wait=False)
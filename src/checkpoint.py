@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import time
+
+JOURNAL_SUFFIX = ".checkpoint"
+
+LOGGER = logging.getLogger("scraper")
+
+
+def fsync_file(path):
+    with open(path, "rb+") as file:
+        os.fsync(file.fileno())
+
+
+class CheckpointJournal:
+    # Append only, one JSON object per line, lives next to the output file.
+    # A batch only counts as done once its line is in the journal, and the line
+    # records how big the output was right after the batch was written
+    def __init__(self, path, output_path, resumed=False):
+        self.path = path
+        self.output_path = output_path
+        self.resumed = resumed
+        self.completed_pages = set()
+        self.committed_bytes = None
+
+    @classmethod
+    def for_output(cls, output_path, resumed=False):
+        return cls(f"{output_path}{JOURNAL_SUFFIX}", output_path, resumed)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        with open(self.path, "rb") as file:
+            content = file.read()
+
+        lines = content.split(b"\n")
+        if lines[-1]:
+            # Torn last line from a crash mid write, that batch never committed.
+            # Cut it off so the lines we add next start on their own line
+            LOGGER.error(f"Ignoring unfinished checkpoint line: {lines[-1]!r}")
+            with open(self.path, "rb+") as file:
+                file.truncate(len(content) - len(lines[-1]))
+
+        for line in lines[:-1]:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                LOGGER.error(f"Ignoring unreadable checkpoint line: {line!r}")
+                continue
+            if entry["event"] == "batch":
+                self.completed_pages.update(entry["pages"])
+            # The start of a run commits the output as it was then, e.g. the header
+            self.committed_bytes = entry["output_bytes"]
+        self.resumed = True
+        return self
+
+    def restore_output(self):
+        # Rows written after the last commit belong to a batch that will be redone
+        if self.committed_bytes is None:
+            return
+        output_bytes = os.path.getsize(self.output_path)
+        if output_bytes > self.committed_bytes:
+            LOGGER.info(
+                f"Dropping {output_bytes - self.committed_bytes} bytes "
+                "written after the last checkpoint"
+            )
+            with open(self.output_path, "rb+") as file:
+                file.truncate(self.committed_bytes)
+
+    def pending_pages(self, pages_to_scrape):
+        return [
+            page_num
+            for page_num in range(1, pages_to_scrape + 1)
+            if page_num not in self.completed_pages
+        ]
+
+    def append(self, entry, mode="a"):
+        entry["time"] = time.time()
+        with open(self.path, mode) as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def start(self, pages_to_scrape):
+        # A fresh run starts a fresh journal, a resumed one keeps adding to it
+        output_bytes = os.path.getsize(self.output_path)
+        self.append(
+            {
+                "event": "start",
+                "pages": pages_to_scrape,
+                "resumed": self.resumed,
+                "output_bytes": output_bytes,
+            },
+            "a" if self.resumed else "w",
+        )
+        self.committed_bytes = output_bytes
+
+    def commit_batch(self, page_nums, output_bytes=None):
+        # Output has to be on disk before the journal says the batch is done.
+        # A writer that already synced it passes in how big it is
+        if output_bytes is None:
+            fsync_file(self.output_path)
+            output_bytes = os.path.getsize(self.output_path)
+        self.append(
+            {"event": "batch", "pages": list(page_nums), "output_bytes": output_bytes}
+        )
+        self.completed_pages.update(page_nums)
+        self.committed_bytes = output_bytes
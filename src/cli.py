@@ -0,0 +1,38 @@
+import logging
+
+LOGGER = logging.getLogger("scraper")
+
+
+def split_cli_args(argv, cli_options):
+    # Options look like --name=value or --name, everything else is positional
+    positional_args = []
+    options = {}
+    for arg in argv:
+        if arg.startswith("--"):
+            name, _, value = arg[2:].partition("=")
+            if name in cli_options:
+                options[name] = value
+            else:
+                LOGGER.error(f"Ignoring unknown option: {arg}")
+        else:
+            positional_args.append(arg)
+    return positional_args, options
+
+
+def check_input_workers(input_workers, default=1):
+    if input_workers.isdigit() and int(input_workers) > 0:
+        return int(input_workers)
+    LOGGER.error(
+        f"Seems like you entered an invalid number of workers: {input_workers}"
+    )
+    LOGGER.error(f"We'll set workers to {default}")
+    return default
+
+
+def check_input_positive_int(input_value, default, what):
+    # For counts that aren't workers, what names it in the error
+    if input_value.isdigit() and int(input_value) > 0:
+        return int(input_value)
+    LOGGER.error(f"Seems like you entered an invalid {what}: {input_value}")
+    LOGGER.error(f"We'll set it to {default}")
+    return default
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import sys
+import time
+
+from src.sinks import BLANK_KEY, realtor_key
+
+FINGERPRINTS_SUFFIX = ".pages.db"
+CHANGES = ["added", "changed", "removed"]
+
+LOGGER = logging.getLogger("scraper")
+
+
+def page_hash(page_data):
+    return hashlib.blake2b(json.dumps(page_data).encode(), digest_size=16).hexdigest()
+
+
+class PageFingerprints:
+    # What the last runs saw, a hash per page and the row of every realtor,
+    # kept in SQLite so a run never has to hold the previous one in memory.
+    # Every realtor seen is stamped with the run, so the ones left over with
+    # an older stamp at the end were removed
+    def __init__(self, path):
+        self.path = path
+        self.run = time.time_ns()
+        try:
+            # The pipeline writes from its own thread, one at a time
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages (page INTEGER PRIMARY KEY, hash TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS realtors (realtor_key TEXT PRIMARY KEY, "
+                "page INTEGER, row TEXT, seen_run INTEGER)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS realtors_page ON realtors (page)"
+            )
+            self.connection.commit()
+        except sqlite3.Error as e:
+            LOGGER.critical(f"Can't open page fingerprints: {e}")
+            sys.exit()
+
+    @classmethod
+    def for_output(cls, input_name):
+        return cls(f"{input_name}{FINGERPRINTS_SUFFIX}")
+
+    def page_unchanged(self, page_num, new_hash):
+        row = self.connection.execute(
+            "SELECT hash FROM pages WHERE page = ?", (page_num,)
+        ).fetchone()
+        return row is not None and row[0] == new_hash
+
+    def mark_page_seen(self, page_num):
+        self.connection.execute(
+            "UPDATE realtors SET seen_run = ? WHERE page = ?", (self.run, page_num)
+        )
+
+    def set_page_hash(self, page_num, new_hash):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages (page, hash) VALUES (?, ?)",
+            (page_num, new_hash),
+        )
+
+    def diff_realtor(self, page_num, key, row):
+        # Returns added, changed or None when the realtor is the same as before
+        row_json = json.dumps(row)
+        previous = self.connection.execute(
+            "SELECT row FROM realtors WHERE realtor_key = ?", (key,)
+        ).fetchone()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO realtors (realtor_key, page, row, seen_run) "
+            "VALUES (?, ?, ?, ?)",
+            (key, page_num, row_json, self.run),
+        )
+        if previous is None:
+            return "added"
+        if previous[0] != row_json:
+            return "changed"
+        return None
+
+    def pop_removed(self, pages_to_scrape):
+        # Only realtors last seen on a page this run covered count as removed
+        removed = self.connection.execute(
+            "SELECT page, row FROM realtors WHERE seen_run != ? AND page <= ? "
+            "ORDER BY page",
+            (self.run, pages_to_scrape),
+        ).fetchall()
+        self.connection.execute(
+            "DELETE FROM realtors WHERE seen_run != ? AND page <= ?",
+            (self.run, pages_to_scrape),
+        )
+        return [(page_num, json.loads(row)) for page_num, row in removed]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        # Anything after the last commit is rolled back with the connection
+        self.connection.close()
+
+
+class DeltaSink:
+    # Sits in front of another sink and only passes on realtors that were
+    # added, changed or removed since the last run, with the change as the
+    # first column. Pages that hash the same as last time are skipped outright
+    def __init__(self, sink, fingerprints, pages_to_scrape, name_index, number_index):
+        self.sink = sink
+        self.fingerprints = fingerprints
+        self.pages_to_scrape = pages_to_scrape
+        self.name_index = name_index
+        self.number_index = number_index
+        self.pages_written = set()
+        self.unchanged_pages = 0
+        self.counts = dict.fromkeys(CHANGES, 0)
+
+    def write_page(self, page_num, page_data):
+        self.pages_written.add(page_num)
+        new_hash = page_hash(page_data)
+        if self.fingerprints.page_unchanged(page_num, new_hash):
+            self.fingerprints.mark_page_seen(page_num)
+            self.unchanged_pages += 1
+            return
+
+        delta_rows = []
+        for row in page_data:
+            key = realtor_key(row[self.name_index], row[self.number_index])
+            if key == BLANK_KEY:
+                # Blank cards can't be told apart, each would be diffed against
+                # the one before it. The page hash still covers them
+                continue
+            change = self.fingerprints.diff_realtor(page_num, key, list(row))
+            if change is not None:
+                self.counts[change] += 1
+                delta_rows.append((change, *row))
+        self.fingerprints.set_page_hash(page_num, new_hash)
+        if delta_rows:
+            self.sink.write_page(page_num, delta_rows)
+
+    def checkpoint(self, page_nums):
+        self.sink.checkpoint(page_nums)
+        self.fingerprints.commit()
+
+    def close(self):
+        try:
+            # A run that stopped early can't tell who was removed
+            if len(self.pages_written) == self.pages_to_scrape:
+                self.write_removed()
+            LOGGER.info(
+                f"{self.unchanged_pages} of {len(self.pages_written)} pages "
+                f"unchanged, {self.counts}"
+            )
+        finally:
+            self.fingerprints.close()
+            self.sink.close()
+
+    def write_removed(self):
+        for page_num, row in self.fingerprints.pop_removed(self.pages_to_scrape):
+            self.counts["removed"] += 1
+            self.sink.write_page(page_num, [("removed", *row)])
+        # Not a batch of pages, just makes sure the removals are committed
+        self.checkpoint([])
@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DEFAULT_CACHE_DIR = "html_cache"
+DEFAULT_CACHE_MB = 1024
+DEFAULT_CACHE_DAYS = 30
+INDEX_NAME = "index.db"
+
+LOGGER = logging.getLogger("scraper")
+
+
+class HtmlCache:
+    # Rendered pages on disk, gzipped and stored under the sha256 of their
+    # html, so the same page under two urls is only kept once. index.db maps
+    # urls to blobs and keeps when each blob was last used. Past max_bytes the
+    # least recently used blobs go first, and urls older than max_age are
+    # treated as missing.
+    # Has a quit() so it can stand in for a driver when replaying
+    def __init__(
+        self,
+        directory,
+        max_bytes=DEFAULT_CACHE_MB * 1024 * 1024,
+        max_age=DEFAULT_CACHE_DAYS * 24 * 60 * 60,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        # Drivers in a pool save pages from several threads
+        self.lock = threading.Lock()
+        try:
+            os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+            self.connection = sqlite3.connect(
+                os.path.join(directory, INDEX_NAME),
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS blobs "
+                "(digest TEXT PRIMARY KEY, size INTEGER, last_used REAL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS urls "
+                "(url TEXT PRIMARY KEY, digest TEXT, stored_at REAL)"
+            )
+        except (OSError, sqlite3.Error) as e:
+            LOGGER.critical(f"Can't open the html cache: {e}")
+            sys.exit()
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.html.gz")
+
+    def put(self, url, page_source):
+        html = page_source.encode()
+        digest = hashlib.sha256(html).hexdigest()
+        blob_path = self.blob_path(digest)
+        now = time.time()
+
+        with self.lock:
+            known = self.connection.execute(
+                "SELECT 1 FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+            if known is None:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                # Written under another name first, a crash can't leave half a blob
+                temp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+                with open(temp_path, "wb") as file:
+                    file.write(gzip.compress(html))
+                os.replace(temp_path, blob_path)
+                self.connection.execute(
+                    "INSERT INTO blobs (digest, size, last_used) VALUES (?, ?, ?)",
+                    (digest, os.path.getsize(blob_path), now),
+                )
+            else:
+                self.connection.execute(
+                    "UPDATE blobs SET last_used = ? WHERE digest = ?", (now, digest)
+                )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO urls (url, digest, stored_at) VALUES (?, ?, ?)",
+                (url, digest, now),
+            )
+            self.evict()
+
+    def get(self, url):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT digest, stored_at FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            digest = row[0]
+            try:
+                with open(self.blob_path(digest), "rb") as file:
+                    html = gzip.decompress(file.read())
+            except (OSError, EOFError) as e:
+                LOGGER.error(f"Dropping unreadable cached page for {url}: {e}")
+                self.connection.execute("DELETE FROM urls WHERE url = ?", (url,))
+                self.misses += 1
+                return None
+            self.connection.execute(
+                "UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), digest)
+            )
+            self.hits += 1
+        return html.decode()
+
+    def size(self):
+        (total,) = self.connection.execute(
+            "SELECT coalesce(sum(size), 0) FROM blobs"
+        ).fetchone()
+        return total
+
+    def evict(self):
+        # Expired urls first, then blobs nothing points to, then the least
+        # recently used blobs until the cache fits
+        self.connection.execute(
+            "DELETE FROM urls WHERE stored_at < ?", (time.time() - self.max_age,)
+        )
+        unused = self.connection.execute(
+            "SELECT digest FROM blobs WHERE digest NOT IN (SELECT digest FROM urls)"
+        ).fetchall()
+        for (digest,) in unused:
+            self.remove_blob(digest)
+
+        total = self.size()
+        while total > self.max_bytes:
+            digest, size = self.connection.execute(
+                "SELECT digest, size FROM blobs ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            self.remove_blob(digest)
+            total -= size
+
+    def remove_blob(self, digest):
+        self.connection.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+        self.connection.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        try:
+            os.remove(self.blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def quit(self):
+        LOGGER.info(f"html cache: {self.hits} hits, {self.misses} misses")
+        self.connection.close()
@@ -0,0 +1,313 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from src.parse import RealtorData
+
+# Upper bounds in seconds, from a cached page_source read up to a slow browser load
+STAGE_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+RSS_SAMPLE_SECONDS = 5
+METRIC_PREFIX = "scraper"
+
+LOGGER = logging.getLogger("scraper")
+
+
+class StageHistogram:
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        # One more than the buckets, for anything past the last bound
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket the quantile falls in, good enough to see
+        # which stage moved, without keeping every sample
+        if not self.count:
+            return 0.0
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            seen += bucket_count
+            if seen >= fraction * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 3),
+            "mean": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "max": round(self.max, 4),
+        }
+
+
+class RunMetrics:
+    # Timers, counters and the browser RSS for one run. Render workers in a
+    # pool all report into the same one
+    def __init__(self, fields=RealtorData._fields, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.stages = {}
+        self.pages = 0
+        self.cards = 0
+        self.missing_fields = Counter(dict.fromkeys(fields, 0))
+        self.rss_bytes = None
+        self.max_rss_bytes = None
+        self.rss_samples = 0
+        # Anything else worth a number at the end, e.g. the rate controller state
+        self.gauges = {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = StageHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count_page(self, page_data, fields=RealtorData._fields):
+        # Missing fields are written as "", whichever path parsed the page
+        missing = Counter(
+            field
+            for row in page_data
+            for field, value in zip(fields, row)
+            if value == ""
+        )
+        with self.lock:
+            self.pages += 1
+            self.cards += len(page_data)
+            self.missing_fields.update(missing)
+
+    def sample_rss(self, rss_bytes):
+        with self.lock:
+            self.rss_bytes = rss_bytes
+            self.max_rss_bytes = max(self.max_rss_bytes or 0, rss_bytes)
+            self.rss_samples += 1
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        with self.lock:
+            return {
+                "elapsed_seconds": round(elapsed, 3),
+                "pages": self.pages,
+                "cards": self.cards,
+                "pages_per_second": round(self.pages / elapsed, 2) if elapsed else 0.0,
+                "missing_fields": dict(self.missing_fields),
+                "stages": {
+                    stage: histogram.summary()
+                    for stage, histogram in self.stages.items()
+                },
+                "browser_rss_bytes": self.rss_bytes,
+                "max_browser_rss_bytes": self.max_rss_bytes,
+                "rss_samples": self.rss_samples,
+                "gauges": dict(self.gauges),
+            }
+
+    def prometheus_text(self):
+        name = METRIC_PREFIX
+        lines = [
+            f"# HELP {name}_stage_seconds Time spent in each stage of a page",
+            f"# TYPE {name}_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, histogram in self.stages.items():
+                cumulative = 0
+                for bound, bucket_count in zip(
+                    [*histogram.buckets, "+Inf"], histogram.bucket_counts
+                ):
+                    cumulative += bucket_count
+                    lines.append(
+                        f'{name}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} '
+                        f"{cumulative}"
+                    )
+                lines.append(
+                    f'{name}_stage_seconds_sum{{stage="{stage}"}} {histogram.total}'
+                )
+                lines.append(
+                    f'{name}_stage_seconds_count{{stage="{stage}"}} {histogram.count}'
+                )
+            lines += [
+                f"# HELP {name}_pages_total Pages handed to the output",
+                f"# TYPE {name}_pages_total counter",
+                f"{name}_pages_total {self.pages}",
+                f"# HELP {name}_cards_total Realtor cards handed to the output",
+                f"# TYPE {name}_cards_total counter",
+                f"{name}_cards_total {self.cards}",
+                f"# HELP {name}_missing_fields_total Cards written without a field",
+                f"# TYPE {name}_missing_fields_total counter",
+            ]
+            lines += [
+                f'{name}_missing_fields_total{{field="{field}"}} {missing}'
+                for field, missing in self.missing_fields.items()
+            ]
+            if self.rss_samples:
+                lines += [
+                    f"# HELP {name}_browser_rss_bytes RSS of every browser process",
+                    f"# TYPE {name}_browser_rss_bytes gauge",
+                    f"{name}_browser_rss_bytes {self.rss_bytes}",
+                    f"# HELP {name}_browser_rss_max_bytes Highest browser RSS sampled",
+                    f"# TYPE {name}_browser_rss_max_bytes gauge",
+                    f"{name}_browser_rss_max_bytes {self.max_rss_bytes}",
+                ]
+            for gauge, value in self.gauges.items():
+                lines += [f"# TYPE {name}_{gauge} gauge", f"{name}_{gauge} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path_prefix, **extra):
+        # <prefix>.prom for the node exporter textfile collector and
+        # <prefix>.metrics.json with the run summary
+        write_atomic(f"{path_prefix}.prom", self.prometheus_text())
+        summary = {**self.summary(), **extra}
+        write_atomic(f"{path_prefix}.metrics.json", json.dumps(summary, indent=2))
+        return summary
+
+
+def write_atomic(path, text):
+    # A collector reading the file mid-write would see half a scrape
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+class MetricsSink:
+    # Counts and times what goes to the sink it wraps
+    def __init__(self, sink, metrics):
+        self.sink = sink
+        self.metrics = metrics
+
+    def write_page(self, page_num, page_data):
+        self.metrics.count_page(page_data)
+        with self.metrics.time("write"):
+            self.sink.write_page(page_num, page_data)
+
+    def checkpoint(self, page_nums):
+        with self.metrics.time("checkpoint"):
+            self.sink.checkpoint(page_nums)
+
+    def close(self):
+        self.sink.close()
+
+
+def process_tree_rss_bytes(root_pid):
+    # Linux only, Chrome is a tree of processes under chromedriver and each
+    # one has its own RSS in /proc
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                # Field after the parenthesised command name is state, then ppid
+                ppid = int(file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total_kb = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as file:
+                for line in file:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb * 1024
+
+
+def driver_pid(driver):
+    # Only Chrome drivers have a process to sample, not http fetchers or the cache
+    service = getattr(driver, "service", None)
+    pid = getattr(getattr(service, "process", None), "pid", None)
+    return pid if isinstance(pid, int) else None
+
+
+class RssSampler:
+    # Samples the browsers in the background, reading /proc every page would
+    # cost more than it tells us
+    def __init__(self, metrics, drivers, interval=RSS_SAMPLE_SECONDS):
+        self.metrics = metrics
+        # Read again every sample, a pool swaps drivers as it recycles them
+        self.drivers = drivers
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        pids = [pid for pid in map(driver_pid, self.drivers) if pid is not None]
+        if pids:
+            self.metrics.sample_rss(sum(map(process_tree_rss_bytes, pids)))
+
+    def run(self):
+        while True:
+            try:
+                self.sample()
+            except OSError as e:
+                LOGGER.warning(f"Could not sample browser RSS: {e}")
+                return
+            if self.stop_event.wait(self.interval):
+                return
+
+    def start(self):
+        if os.path.isdir("/proc") and any(map(driver_pid, self.drivers)):
+            self.thread = threading.Thread(
+                target=self.run, name="rss-sampler", daemon=True
+            )
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,151 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+from src.parse import NON_DIGITS, RealtorData, sanitize
+
+# Offices and addresses repeat for every agent of an office, so only the
+# distinct ones are worked out. Per run and bounded, a long run sees offices
+# from every corner of the site
+DEFAULT_CACHE_SIZE = 4096
+# Canada and the US share the +1 plan, numbers on the site come without it
+DEFAULT_COUNTRY_CODE = "1"
+NATIONAL_DIGITS = 10
+# Shortest and longest E.164 numbers, country code included
+MIN_E164_DIGITS = 8
+MAX_E164_DIGITS = 15
+PHONE_EXTENSION = re.compile(r"\s*(?:ext\.?|extension|x)\s*(\d+)\s*$", re.IGNORECASE)
+COMMA_SPACING = re.compile(r"\s*,\s*")
+AMPERSAND_SPACING = re.compile(r"\s*&\s*")
+# INC. and INC are the same office
+ABBREVIATION_DOTS = re.compile(r"\b(INC|LTD|LLC|CORP|CO|ST|AVE|RD|DR|BLVD|STE)\.")
+STREET_WORDS = {
+    "STREET": "ST",
+    "AVENUE": "AVE",
+    "ROAD": "RD",
+    "DRIVE": "DR",
+    "BOULEVARD": "BLVD",
+    "SUITE": "STE",
+}
+STREET_WORD = re.compile(r"\b(" + "|".join(STREET_WORDS) + r")\b")
+# Canadian postal codes come with and without the space in the middle
+POSTAL_CODE = re.compile(r"\b([A-Z]\d[A-Z])\s*(\d[A-Z]\d)\b")
+
+
+def normalize_phone(number, country_code=DEFAULT_COUNTRY_CODE):
+    # E.164, with an extension after ;ext= like a tel: URI. None when the
+    # number doesn't look like one, the caller keeps what the site said
+    extension = PHONE_EXTENSION.search(number)
+    if extension is not None:
+        number = number[: extension.start()]
+    digits = NON_DIGITS.sub("", number)
+    # A number with its country code can have ten digits too, +49 89 123456
+    if number.lstrip().startswith("+"):
+        if not MIN_E164_DIGITS <= len(digits) <= MAX_E164_DIGITS:
+            return None
+    elif len(digits) == NATIONAL_DIGITS:
+        digits = country_code + digits
+    elif not (
+        len(digits) == NATIONAL_DIGITS + len(country_code)
+        and digits.startswith(country_code)
+    ):
+        return None
+    if extension is not None:
+        return f"+{digits};ext={extension.group(1)}"
+    return f"+{digits}"
+
+
+def canonical_text(text):
+    # NFKC folds the odd unicode the site uses, e.g. full width digits
+    text = sanitize(unicodedata.normalize("NFKC", text)).upper()
+    text = COMMA_SPACING.sub(", ", text)
+    text = AMPERSAND_SPACING.sub(" & ", text)
+    return text.strip(", ")
+
+
+def canonical_office(office):
+    return ABBREVIATION_DOTS.sub(r"\1", canonical_text(office))
+
+
+def canonical_address(address):
+    address = STREET_WORD.sub(
+        lambda match: STREET_WORDS[match[1]], canonical_text(address)
+    )
+    address = ABBREVIATION_DOTS.sub(r"\1", address)
+    return POSTAL_CODE.sub(r"\1 \2", address)
+
+
+class Normalizer:
+    # Holds the caches for one run, so the hit rates are that run's
+    def __init__(
+        self, cache_size=DEFAULT_CACHE_SIZE, country_code=DEFAULT_COUNTRY_CODE
+    ):
+        self.office = lru_cache(maxsize=cache_size)(canonical_office)
+        self.address = lru_cache(maxsize=cache_size)(canonical_address)
+        self.country_code = country_code
+        self.phones = 0
+        self.unparsed_phones = 0
+
+    def normalize_page(self, page_data):
+        # A page at a time, so the lookups below are done once per page
+        office = self.office
+        address = self.address
+        country_code = self.country_code
+        normalized_page = []
+        for name, role, company, office_address, number in page_data:
+            if number:
+                self.phones += 1
+                phone = normalize_phone(number, country_code)
+                if phone is None:
+                    self.unparsed_phones += 1
+                else:
+                    number = phone
+            normalized_page.append(
+                RealtorData(
+                    name,
+                    role,
+                    office(company) if company else company,
+                    address(office_address) if office_address else office_address,
+                    number,
+                )
+            )
+        return normalized_page
+
+    def summary(self):
+        summary = {}
+        for field, cache in [("company", self.office), ("address", self.address)]:
+            info = cache.cache_info()
+            lookups = info.hits + info.misses
+            summary[field] = {
+                "hits": info.hits,
+                "misses": info.misses,
+                "hit_rate": round(info.hits / lookups, 3) if lookups else 0.0,
+                "cached": info.currsize,
+            }
+        summary["number"] = {
+            "phones": self.phones,
+            "unparsed": self.unparsed_phones,
+        }
+        return summary
+
+
+class NormalizingSink:
+    # Normalizes each page on its way to the sink it wraps
+    def __init__(self, sink, normalizer, metrics=None):
+        self.sink = sink
+        self.normalizer = normalizer
+        self.metrics = metrics
+
+    def write_page(self, page_num, page_data):
+        if self.metrics is None:
+            page_data = self.normalizer.normalize_page(page_data)
+        else:
+            with self.metrics.time("normalize"):
+                page_data = self.normalizer.normalize_page(page_data)
+        self.sink.write_page(page_num, page_data)
+
+    def checkpoint(self, page_nums):
+        self.sink.checkpoint(page_nums)
+
+    def close(self):
+        self.sink.close()
@@ -0,0 +1,159 @@
+from collections import namedtuple
+from functools import cache, partial
+from importlib.util import find_spec
+import logging
+import re
+
+# Everything needed to turn listing page html into RealtorData, without
+# Selenium or the site config, so saved pages can be parsed on their own.
+# BeautifulSoup is only imported once there is a page to parse, so sanitize
+# and the names in here cost nothing to import
+
+RealtorData = namedtuple(
+    "RealtorData", ["name", "role", "company", "address", "number"]
+)
+
+# BeautifulSoup tree builders, lxml is optional and a lot faster
+PARSERS = ["html.parser", "lxml"]
+DEFAULT_PARSER = "html.parser"
+CARD_ID_PATTERN = re.compile("RealtorCard-[0-9]*")
+# CSS classes that mark each field inside a card, an element needs all of them
+CARD_FIELD_CLASSES = RealtorData(
+    name=["realtorCardName"],
+    role=["realtorCardTitle"],
+    company=["realtorCardOfficeName"],
+    address=["realtorCardOfficeAddress"],
+    number=["realtorCardContactNumber", "TelephoneNumber"],
+)
+# Where the listing page says how many pages of results there are, or failing
+# that how many results, which is divided by the cards on the page
+PAGE_COUNT_CLASS = "paginationTotalPagesNum"
+RESULT_COUNT_CLASS = "paginationTotalResultsNum"
+NON_DIGITS = re.compile(r"\D")
+# Keyed by the first class of each field, so one class lookup per element
+# finds the field it could be
+CARD_FIELD_SPECS = {
+    classes[0]: (field, frozenset(classes))
+    for field, classes in zip(RealtorData._fields, CARD_FIELD_CLASSES)
+}
+
+LOGGER = logging.getLogger("scraper")
+
+
+def sanitize(input_str):
+    return " ".join(input_str.split())
+
+
+def check_input_parser(input_parser):
+    if input_parser not in PARSERS:
+        LOGGER.error(f"Seems like you entered an invalid parser: {input_parser}")
+        LOGGER.error(f"Choose one of {PARSERS}, we'll use {DEFAULT_PARSER}")
+        return DEFAULT_PARSER
+    if find_spec(input_parser) is None and input_parser != DEFAULT_PARSER:
+        LOGGER.error(f"{input_parser} is not installed, we'll use {DEFAULT_PARSER}")
+        return DEFAULT_PARSER
+    return input_parser
+
+
+@cache
+def card_strainer():
+    from bs4 import SoupStrainer
+
+    # Only builds the card subtrees, the rest of the page is skipped while parsing
+    return SoupStrainer(id=CARD_ID_PATTERN)
+
+
+@cache
+def page_count_strainer():
+    from bs4 import SoupStrainer
+
+    return SoupStrainer(class_=[PAGE_COUNT_CLASS, RESULT_COUNT_CLASS])
+
+
+def extract_card_fields(card):
+    from bs4 import Tag
+
+    # One walk over the card fills every field, first match in document order wins
+    elements = {}
+    for element in card.descendants:
+        if not isinstance(element, Tag):
+            continue
+        classes = element.get("class")
+        if not classes:
+            continue
+        for css_class in classes:
+            spec = CARD_FIELD_SPECS.get(css_class)
+            if spec is None:
+                continue
+            field, required_classes = spec
+            if field not in elements and required_classes.issubset(classes):
+                elements[field] = element
+        if len(elements) == len(RealtorData._fields):
+            break
+    return elements
+
+
+def collect_realtor_data_from_page(soup):
+    realtor_card_divs = soup.find_all(id=CARD_ID_PATTERN)
+    # Past the last page there are no cards, the caller decides when to stop
+    if not realtor_card_divs:
+        LOGGER.warning("No realtor cards on the page")
+        return []
+
+    page_data = []
+
+    for card in realtor_card_divs:
+        elements = extract_card_fields(card)
+        values = []
+        for field in RealtorData._fields:
+            if field in elements:
+                values.append(sanitize(elements[field].get_text()))
+            else:
+                values.append("")
+                # Lazy, the card's whole html is only built if this is logged
+                LOGGER.error("Could not get %s for %s", field, card)
+
+        page_data.append(RealtorData(*values))
+
+    return page_data
+
+
+# Module level so it can be sent to the parse processes
+def parse_page_source(page_source, parser=DEFAULT_PARSER, strain_cards=False):
+    from bs4 import BeautifulSoup
+
+    if strain_cards:
+        soup = BeautifulSoup(page_source, parser, parse_only=card_strainer())
+    else:
+        soup = BeautifulSoup(page_source, parser)
+    return collect_realtor_data_from_page(soup)
+
+
+def read_count(element):
+    if element is None:
+        return None
+    digits = NON_DIGITS.sub("", element.get_text())
+    return int(digits) if digits else None
+
+
+def find_page_count(page_source, parser=DEFAULT_PARSER):
+    from bs4 import BeautifulSoup
+
+    # None when the page doesn't say
+    soup = BeautifulSoup(page_source, parser, parse_only=page_count_strainer())
+    page_count = read_count(soup.find(class_=PAGE_COUNT_CLASS))
+    if page_count is not None:
+        return page_count
+    result_count = read_count(soup.find(class_=RESULT_COUNT_CLASS))
+    if result_count is None:
+        return None
+    card_soup = BeautifulSoup(page_source, parser, parse_only=card_strainer())
+    cards = len(card_soup.find_all(id=CARD_ID_PATTERN))
+    if cards == 0:
+        return None
+    return -(-result_count // cards)
+
+
+def make_page_parser(parser=DEFAULT_PARSER, strain_cards=False):
+    # partial of a module level function, so it still pickles for the parse processes
+    return partial(parse_page_source, parser=parser, strain_cards=strain_cards)
@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty, Full, Queue
+
+DEFAULT_QUEUE_SIZE = 8
+# How often a blocked stage checks whether another stage has failed
+POLL_INTERVAL = 0.1
+
+LOGGER = logging.getLogger("scraper")
+
+# Sent down a queue once the stage feeding it has nothing left
+DONE = object()
+# Returned instead of an item once the pipeline is stopping because of an error
+STOPPED = object()
+
+
+def timed_call(func, arg):
+    # Runs in the parse processes, so the parse stage can report its busy time
+    start = time.perf_counter()
+    result = func(arg)
+    return time.perf_counter() - start, result
+
+
+class StageStats:
+    def __init__(self, name, capacity=1):
+        self.name = name
+        # How many things in the stage can be busy at once, e.g. parse processes
+        self.capacity = capacity
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.waiting_for_input_seconds = 0.0
+        self.blocked_on_output_seconds = 0.0
+        self.queue_depth_total = 0
+        self.queue_depth_max = 0
+        self.queue_samples = 0
+        self.started = None
+        self.finished = None
+
+    def sample_queue(self, queue):
+        depth = queue.qsize()
+        self.queue_depth_total += depth
+        self.queue_depth_max = max(self.queue_depth_max, depth)
+        self.queue_samples += 1
+
+    def summary(self):
+        wall = 0.0
+        if self.started is not None:
+            wall = (self.finished or time.perf_counter()) - self.started
+        occupancy = self.busy_seconds / (wall * self.capacity) if wall else 0.0
+        mean_depth = (
+            self.queue_depth_total / self.queue_samples if self.queue_samples else 0.0
+        )
+        return {
+            "items": self.items,
+            "occupancy": round(occupancy, 3),
+            "busy_seconds": round(self.busy_seconds, 3),
+            "waiting_for_input_seconds": round(self.waiting_for_input_seconds, 3),
+            "blocked_on_output_seconds": round(self.blocked_on_output_seconds, 3),
+            "mean_output_queue_depth": round(mean_depth, 2),
+            "max_output_queue_depth": self.queue_depth_max,
+        }
+
+
+class Pipeline:
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.errors = []
+        self.threads = []
+        self.stats = {}
+
+    def add_stage(self, name, target, capacity=1, stop_on_error=True):
+        # A stage that does not stop on error has to send DONE downstream itself,
+        # so the pages it already handed over still make it through
+        stats = StageStats(name, capacity)
+        self.stats[name] = stats
+
+        def run_stage():
+            stats.started = time.perf_counter()
+            try:
+                target(stats)
+            except BaseException as e:
+                LOGGER.error(f"Pipeline stage {name} failed: {e}")
+                self.errors.append(e)
+                if stop_on_error:
+                    self.stop_event.set()
+            finally:
+                stats.finished = time.perf_counter()
+
+        self.threads.append(threading.Thread(target=run_stage, name=name, daemon=True))
+        return stats
+
+    def put(self, queue, item, stats):
+        # Blocks while the next stage is behind, that wait is the backpressure
+        start = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    queue.put(item, timeout=POLL_INTERVAL)
+                    stats.sample_queue(queue)
+                    return True
+                except Full:
+                    continue
+            return False
+        finally:
+            stats.blocked_on_output_seconds += time.perf_counter() - start
+
+    def get(self, queue, stats):
+        start = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    return queue.get(timeout=POLL_INTERVAL)
+                except Empty:
+                    continue
+            return STOPPED
+        finally:
+            stats.waiting_for_input_seconds += time.perf_counter() - start
+
+    def run(self):
+        for thread in self.threads:
+            thread.start()
+        for thread in self.threads:
+            thread.join()
+
+        for name, stats in self.stats.items():
+            LOGGER.info(f"Stage {name} stats: {stats.summary()}")
+
+        if self.errors:
+            raise self.errors[0]
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+
+def run_pipeline(
+    pool,
+    render,
+    parse,
+    sink,
+    page_nums,
+    batch_size,
+    parse_workers,
+    queue_size=DEFAULT_QUEUE_SIZE,
+    metrics=None,
+    max_empty_pages=None,
+    on_early_stop=None,
+    on_empty_page=None,
+):
+    # render (driver pool) -> raw html -> parse (process pool) -> rows -> sink
+    # Every queue is bounded, so a slow stage holds back the ones before it
+    page_nums = list(page_nums)
+    pipeline = Pipeline()
+    html_queue = Queue(maxsize=queue_size)
+    parsed_queue = Queue(maxsize=queue_size)
+
+    render_lock = threading.Lock()
+
+    def render_stage(stats):
+        # Busy time is summed over every driver in the pool
+        def timed_render(driver, page_num):
+            start = time.perf_counter()
+            try:
+                return render(driver, page_num)
+            finally:
+                with render_lock:
+                    stats.busy_seconds += time.perf_counter() - start
+
+        rendered_pages = pool.map_pages(timed_render, page_nums)
+        try:
+            for page_num in page_nums:
+                start = time.perf_counter()
+                page_source = next(rendered_pages)
+                stats.waiting_for_input_seconds += time.perf_counter() - start
+                stats.items += 1
+                if not pipeline.put(html_queue, (page_num, page_source), stats):
+                    return
+        finally:
+            rendered_pages.close()
+            # Pages rendered before a failure still get parsed and written
+            pipeline.put(html_queue, DONE, stats)
+
+    def parse_stage(stats):
+        executor = ProcessPoolExecutor(max_workers=parse_workers)
+        try:
+            while True:
+                item = pipeline.get(html_queue, stats)
+                if item is DONE or item is STOPPED:
+                    break
+                page_num, page_source = item
+                future = executor.submit(timed_call, parse, page_source)
+                if not pipeline.put(parsed_queue, (page_num, future), stats):
+                    break
+            pipeline.put(parsed_queue, DONE, stats)
+        finally:
+            # Futures still queued are waited on by the writer before this returns
+            executor.shutdown(wait=True, cancel_futures=pipeline.stop_event.is_set())
+
+    def write_stage(stats):
+        batch_pages = []
+        empty_pages = 0
+
+        def timed_sink_call(method, *args):
+            start = time.perf_counter()
+            method(*args)
+            stats.busy_seconds += time.perf_counter() - start
+
+        while True:
+            item = pipeline.get(parsed_queue, stats)
+            if item is STOPPED:
+                return
+            if item is DONE:
+                break
+            page_num, future = item
+
+            start = time.perf_counter()
+            parse_seconds, page_data = future.result()
+            stats.waiting_for_input_seconds += time.perf_counter() - start
+            parse_stats.busy_seconds += parse_seconds
+            parse_stats.items += 1
+            if metrics is not None:
+                # Timed in the parse process, only the number comes back
+                metrics.observe("parse", parse_seconds)
+
+            # Pages go to the sink as they come, batches only mark checkpoints
+            timed_sink_call(sink.write_page, page_num, page_data)
+            stats.items += 1
+            batch_pages.append(page_num)
+            empty_pages = 0 if page_data else empty_pages + 1
+            if not page_data and on_empty_page is not None:
+                # Only known once parsed, the render stage just saw html
+                on_empty_page(page_num)
+            if empty_pages == max_empty_pages:
+                # Stops the other stages the same way an error would, minus the error
+                timed_sink_call(sink.checkpoint, batch_pages)
+                if on_early_stop is not None:
+                    on_early_stop(page_num, empty_pages)
+                pipeline.stop_event.set()
+                return
+            if len(batch_pages) == batch_size:
+                timed_sink_call(sink.checkpoint, batch_pages)
+                batch_pages = []
+
+        if batch_pages:
+            timed_sink_call(sink.checkpoint, batch_pages)
+
+    pipeline.add_stage("render", render_stage, capacity=len(pool), stop_on_error=False)
+    parse_stats = pipeline.add_stage("parse", parse_stage, capacity=parse_workers)
+    pipeline.add_stage("write", write_stage)
+    return pipeline.run()
@@ -0,0 +1,125 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from queue import Queue
+
+from src.supervisor import (
+    DEFAULT_BACKOFF,
+    DEFAULT_RETRIES,
+    DriverSupervisor,
+    quit_driver,
+)
+
+LOGGER = logging.getLogger("scraper")
+
+
+class DriverPool:
+    # Drivers are checked out by whichever worker thread picks up the next page,
+    # each driver is only ever used by one thread at a time.
+    # Every driver has a supervisor, which can swap it for a new one, see
+    # DriverSupervisor for when
+    def __init__(
+        self,
+        drivers,
+        restart_driver=None,
+        recycle_pages=None,
+        recycle_rss_bytes=None,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+    ):
+        self.supervisors = [
+            DriverSupervisor(
+                driver,
+                restart_driver,
+                recycle_pages,
+                recycle_rss_bytes,
+                retries,
+                backoff,
+            )
+            for driver in drivers
+        ]
+        self.idle_supervisors = Queue()
+        for supervisor in self.supervisors:
+            self.idle_supervisors.put(supervisor)
+
+    @classmethod
+    def provision(cls, size, provision_driver, **supervisor_options):
+        # Chrome takes a while to start, so bring them all up at once
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            futures = [executor.submit(provision_driver) for _ in range(size)]
+        drivers = []
+        errors = []
+        for future in futures:
+            try:
+                drivers.append(future.result())
+            except BaseException as e:
+                errors.append(e)
+        if errors:
+            # Drivers that did start would be left running otherwise
+            for driver in drivers:
+                quit_driver(driver)
+            raise errors[0]
+        LOGGER.info(f"Created pool of {size} drivers")
+        return cls(drivers, **supervisor_options)
+
+    @property
+    def drivers(self):
+        # The drivers right now, a recycled driver is replaced in place
+        return [
+            supervisor.driver
+            for supervisor in self.supervisors
+            if supervisor.driver is not None
+        ]
+
+    def __iter__(self):
+        return iter(self.drivers)
+
+    def __len__(self):
+        return len(self.supervisors)
+
+    @contextmanager
+    def checkout(self):
+        supervisor = self.idle_supervisors.get()
+        try:
+            yield supervisor
+        finally:
+            self.idle_supervisors.put(supervisor)
+
+    def map_pages(self, render, page_nums, lookahead=None):
+        # Workers pull page numbers off the executor's shared work queue as soon
+        # as they are free, results come back in page order regardless of
+        # which worker finished first.
+        # Only lookahead pages are queued up at once, so a slow consumer
+        # holds the renders back instead of piling up page sources in memory
+        if lookahead is None:
+            lookahead = 2 * len(self.supervisors)
+
+        def render_with_driver(page_num):
+            with self.checkout() as supervisor:
+                return supervisor.render(render, page_num)
+
+        executor = ThreadPoolExecutor(
+            max_workers=len(self.supervisors), thread_name_prefix="render"
+        )
+        pending = deque()
+        try:
+            for page_num in page_nums:
+                pending.append(executor.submit(render_with_driver, page_num))
+                if len(pending) >= lookahead:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def quit(self):
+        recycles = sum(supervisor.recycles for supervisor in self.supervisors)
+        restarts = sum(supervisor.restarts for supervisor in self.supervisors)
+        if recycles or restarts:
+            LOGGER.info(
+                f"Drivers were recycled {recycles} times "
+                f"and restarted {restarts} times after dying"
+            )
+        for supervisor in self.supervisors:
+            supervisor.quit()
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+
+# Seconds a page may take on average before we back off. Without one the
+# target is LATENCY_TOLERANCE times the run's lowest average, so a site that
+# is always slow isn't taken for one that is struggling
+DEFAULT_TARGET_LATENCY = None
+LATENCY_TOLERANCE = 2
+# Pages averaged before the lowest average counts as the run's baseline
+BASELINE_PAGES = 5
+# Least and most time between starting two pages
+DEFAULT_MIN_INTERVAL = 0
+DEFAULT_MAX_INTERVAL = 10
+# Fewest pages kept in flight, the most is the number of drivers
+DEFAULT_MIN_CONCURRENCY = 1
+# Taken off the spacing for every good page, and the least it grows to on a bad one
+INTERVAL_STEP = 0.25
+# Pages in flight are cut to this fraction on a bad page
+BACKOFF_FACTOR = 0.5
+# Weight of the newest page in the moving average latency
+LATENCY_SMOOTHING = 0.2
+LOG_EVERY_PAGES = 50
+
+LOGGER = logging.getLogger("scraper")
+
+
+class RateController:
+    # AIMD, like TCP: every good page adds a little rate back, first by
+    # shrinking the spacing between page starts, then by letting one more page
+    # be in flight per round of pages. An error, a page with no cards or the
+    # average latency going past the target halves the pages in flight and
+    # doubles the spacing. Pages that started before the last back off don't
+    # count towards another one, they were sent at the old rate.
+    # With one page in flight latency is left out, spacing the pages out
+    # can't make a single driver any faster
+    def __init__(
+        self,
+        max_concurrency,
+        target_latency=DEFAULT_TARGET_LATENCY,
+        min_interval=DEFAULT_MIN_INTERVAL,
+        max_interval=DEFAULT_MAX_INTERVAL,
+        min_concurrency=DEFAULT_MIN_CONCURRENCY,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.target_latency = target_latency
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        # Starts as fast as it is allowed to go, same as before there was one
+        self.concurrency = float(self.max_concurrency)
+        self.interval = float(min_interval)
+        self.latency = None
+        self.baseline_latency = None
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.last_backoff = None
+        self.pages = 0
+        self.errors = 0
+        self.empty_pages = 0
+        self.backoffs = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        # Blocks until another page may be in flight and the spacing since
+        # the last page started has passed, returns when this one started
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if self.in_flight >= int(self.concurrency):
+                    self.condition.wait()
+                elif now < self.next_start:
+                    self.condition.wait(self.next_start - now)
+                else:
+                    break
+            self.in_flight += 1
+            self.next_start = now + self.interval
+            return now
+
+    def release(self, started, latency, error=False, empty=False):
+        with self.condition:
+            self.in_flight -= 1
+            self.pages += 1
+            self.errors += error
+            self.empty_pages += empty
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+            if self.pages >= BASELINE_PAGES and (
+                self.baseline_latency is None or self.latency < self.baseline_latency
+            ):
+                self.baseline_latency = self.latency
+
+            if error or empty or self.too_slow():
+                if self.last_backoff is None or started >= self.last_backoff:
+                    self.back_off(error, empty)
+            elif self.interval > self.min_interval:
+                self.interval = max(self.min_interval, self.interval - INTERVAL_STEP)
+            else:
+                self.concurrency = min(
+                    self.max_concurrency, self.concurrency + 1 / self.concurrency
+                )
+
+            if self.pages % LOG_EVERY_PAGES == 0:
+                LOGGER.info(f"Rate controller: {self.summary()}")
+            self.condition.notify_all()
+
+    def report_empty(self, started):
+        # For a page only found to have no cards after it was released, e.g.
+        # parsed in another process from the html the controller saw
+        with self.condition:
+            self.empty_pages += 1
+            if self.last_backoff is None or started >= self.last_backoff:
+                self.back_off(error=False, empty=True)
+            self.condition.notify_all()
+
+    def latency_limit(self):
+        if self.target_latency is not None:
+            return self.target_latency
+        if self.baseline_latency is None:
+            return None
+        return LATENCY_TOLERANCE * self.baseline_latency
+
+    def too_slow(self):
+        limit = self.latency_limit()
+        return self.max_concurrency > 1 and limit is not None and self.latency > limit
+
+    def back_off(self, error, empty):
+        self.last_backoff = time.monotonic()
+        self.backoffs += 1
+        self.concurrency = max(self.min_concurrency, self.concurrency * BACKOFF_FACTOR)
+        self.interval = min(
+            self.max_interval, max(self.interval * 2, self.min_interval, INTERVAL_STEP)
+        )
+        reason = "error" if error else "empty page" if empty else "slow pages"
+        LOGGER.warning(
+            f"Backing off after {reason}: {int(self.concurrency)} pages in flight, "
+            f"{self.interval:.2f}s between pages, latency {self.latency:.2f}s"
+        )
+
+    def run(self, render, *args, **kwargs):
+        started = self.acquire()
+        try:
+            page_data = render(*args, **kwargs)
+        except Exception:
+            self.release(started, time.monotonic() - started, error=True)
+            raise
+        self.release(started, time.monotonic() - started, empty=not page_data)
+        return page_data
+
+    def summary(self):
+        limit = self.latency_limit()
+        return {
+            "concurrency": int(self.concurrency),
+            "interval_seconds": round(self.interval, 3),
+            "latency_seconds": round(self.latency or 0.0, 3),
+            "target_latency_seconds": None if limit is None else round(limit, 3),
+            "pages": self.pages,
+            "errors": self.errors,
+            "empty_pages": self.empty_pages,
+            "backoffs": self.backoffs,
+        }
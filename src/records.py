@@ -0,0 +1,87 @@
+from array import array
+
+from src.parse import RealtorData
+from src.sinks import BLANK_KEY, realtor_key
+
+# Fields the agents of one office share, each distinct value is kept once
+CODED_FIELDS = ("role", "company", "address")
+# Unsigned codes, 4 bytes a record for each coded field
+CODE_TYPE = "I"
+
+
+class FieldDictionary:
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class RecordStore:
+    # Holds realtors column by column instead of a namedtuple and five strings
+    # each. Coded fields keep an array of codes into their dictionary, the
+    # rest keep the strings as they came. Records come back out as RealtorData,
+    # sharing one string for every repeated value.
+    # With dedup a realtor whose name and number were already added is dropped,
+    # matched on realtor_key like the delta runs and SQLite match them
+    def __init__(self, dedup=False, coded_fields=CODED_FIELDS):
+        self.dictionaries = {field: FieldDictionary() for field in coded_fields}
+        self.columns = [
+            array(CODE_TYPE) if field in self.dictionaries else []
+            for field in RealtorData._fields
+        ]
+        self.decoders = [
+            self.dictionaries[field].values if field in self.dictionaries else None
+            for field in RealtorData._fields
+        ]
+        self.seen = set() if dedup else None
+        self.duplicates = 0
+
+    def add(self, realtor):
+        if self.seen is not None:
+            key = realtor_key(realtor.name, realtor.number)
+            if key != BLANK_KEY:
+                if key in self.seen:
+                    self.duplicates += 1
+                    return False
+                self.seen.add(key)
+        for field, column, value in zip(RealtorData._fields, self.columns, realtor):
+            dictionary = self.dictionaries.get(field)
+            column.append(value if dictionary is None else dictionary.encode(value))
+        return True
+
+    def extend(self, realtors):
+        return sum(self.add(realtor) for realtor in realtors)
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def __getitem__(self, index):
+        return RealtorData(
+            *(
+                column[index] if decoder is None else decoder[column[index]]
+                for column, decoder in zip(self.columns, self.decoders)
+            )
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def stats(self):
+        return {
+            "records": len(self),
+            "duplicates_dropped": self.duplicates,
+            "distinct_values": {
+                field: len(dictionary)
+                for field, dictionary in self.dictionaries.items()
+            },
+        }
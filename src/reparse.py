@@ -0,0 +1,173 @@
+import gzip
+import logging
+import os
+import re
+import sys
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.cli import check_input_positive_int, check_input_workers, split_cli_args
+from src.parse import DEFAULT_PARSER, RealtorData, check_input_parser, parse_page_source
+from src.sinks import StreamingCsvWriter
+
+# Parses saved listing pages again, a folder or a tarball of them, across
+# every core. Only needs src.parse, so no Selenium and no WEBSITE_URL.
+# Run from the top level dir of the project:
+#   python -m src.reparse saved_pages/ reparsed --workers=8
+DEFAULT_FILENAME = "reparsed_data"
+# Pages sent to a parse process at a time, big enough that pickling and
+# scheduling don't show up next to the parsing
+DEFAULT_CHUNK_PAGES = 16
+HTML_SUFFIXES = (".html", ".htm", ".html.gz")
+DIGITS = re.compile(r"(\d+)")
+CLI_OPTIONS = ["workers", "parser", "strain-cards", "chunk"]
+
+LOGGER = logging.getLogger("scraper")
+
+
+def natural_key(name):
+    # page_2.html comes before page_10.html
+    return [int(part) if part.isdigit() else part for part in DIGITS.split(name)]
+
+
+def iter_html_files(archive_path):
+    # Yields (name, source), source is a path to read for a folder and the
+    # file content for a tarball, which can only be read front to back
+    if os.path.isdir(archive_path):
+        paths = []
+        for root, _, names in os.walk(archive_path):
+            paths.extend(
+                os.path.join(root, name)
+                for name in names
+                if name.endswith(HTML_SUFFIXES)
+            )
+        for path in sorted(paths, key=natural_key):
+            yield path, path
+    elif tarfile.is_tarfile(archive_path):
+        with tarfile.open(archive_path, "r:*") as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith(HTML_SUFFIXES):
+                    yield member.name, tar.extractfile(member).read()
+    else:
+        LOGGER.critical(f"{archive_path} is not a folder or a tarball")
+        sys.exit()
+
+
+def chunked(items, chunk_pages):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_pages:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Module level so it can be sent to the parse processes
+def parse_chunk(chunk, parser=DEFAULT_PARSER, strain_cards=False):
+    results = []
+    for name, source in chunk:
+        try:
+            if isinstance(source, str):
+                with open(source, "rb") as file:
+                    source = file.read()
+            if name.endswith(".gz"):
+                source = gzip.decompress(source)
+            page_source = source.decode(errors="replace")
+            page_data = parse_page_source(page_source, parser, strain_cards)
+            if not page_data:
+                raise ValueError("no realtor cards on the page")
+            results.append((name, page_data))
+        except Exception as e:
+            # One bad page shouldn't take the chunk down with it
+            results.append((name, e))
+    return results
+
+
+def reparse_archive(
+    archive_path,
+    sink,
+    workers,
+    chunk_pages=DEFAULT_CHUNK_PAGES,
+    parser=DEFAULT_PARSER,
+    strain_cards=False,
+):
+    stats = {"pages": 0, "cards": 0, "failed": 0}
+
+    def write_chunk(results):
+        for name, page_data in results:
+            if isinstance(page_data, Exception):
+                LOGGER.error(f"Could not parse {name}, more info {page_data!r}")
+                stats["failed"] += 1
+                continue
+            stats["pages"] += 1
+            stats["cards"] += len(page_data)
+            sink.write_page(stats["pages"], page_data)
+
+    # Two chunks per process in flight keeps every core busy while the
+    # results are still written in file order
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunked(iter_html_files(archive_path), chunk_pages):
+            in_flight.append(executor.submit(parse_chunk, chunk, parser, strain_cards))
+            if len(in_flight) >= 2 * workers:
+                write_chunk(in_flight.popleft().result())
+        while in_flight:
+            write_chunk(in_flight.popleft().result())
+    return stats
+
+
+def main():
+    LOGGER.setLevel(logging.DEBUG)
+    if not LOGGER.handlers:
+        LOGGER.addHandler(logging.StreamHandler(sys.stdout))
+
+    args, options = split_cli_args(sys.argv, CLI_OPTIONS)
+    if len(args) not in (2, 3):
+        LOGGER.critical(
+            "Give the folder or tarball of saved pages, and optionally the name \
+            of the file to save to e.g saved_pages/ reparsed_data"
+        )
+        sys.exit()
+    archive_path = args[1]
+    filename = f"{args[2] if len(args) == 3 else DEFAULT_FILENAME}.csv"
+
+    workers = os.cpu_count() or 1
+    if "workers" in options:
+        workers = check_input_workers(options["workers"], workers)
+    chunk_pages = DEFAULT_CHUNK_PAGES
+    if "chunk" in options:
+        chunk_pages = check_input_positive_int(
+            options["chunk"], DEFAULT_CHUNK_PAGES, "number of pages per chunk"
+        )
+    parser = DEFAULT_PARSER
+    if "parser" in options:
+        parser = check_input_parser(options["parser"])
+
+    start = time.perf_counter()
+    sink = StreamingCsvWriter(filename, header=RealtorData._fields)
+    try:
+        stats = reparse_archive(
+            archive_path,
+            sink,
+            workers,
+            chunk_pages,
+            parser,
+            "strain-cards" in options,
+        )
+    finally:
+        sink.close()
+    elapsed = time.perf_counter() - start
+
+    LOGGER.info(
+        f"Parsed {stats['pages']} pages, {stats['cards']} cards, "
+        f"{stats['failed']} failed in {elapsed:.1f}s with {workers} processes: "
+        f"{stats['pages'] / elapsed:.1f} pages/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
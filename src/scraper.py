@@ -1,69 +1,298 @@
-from collections import namedtuple
+from functools import partial
 import re
-from bs4 import BeautifulSoup
-from selenium.webdriver import ChromeService, ChromeOptions, Chrome
-from selenium.common.exceptions import WebDriverException
-import time
+from importlib.util import find_spec
 import sys
+import time
 from csv import writer
 import logging
-from dotenv import load_dotenv
-from os import getenv
+from os import getenv, path
+from src.checkpoint import CheckpointJournal
+from src.cli import check_input_positive_int, check_input_workers, split_cli_args
 
-RealtorData = namedtuple(
-    "RealtorData", ["name", "role", "company", "address", "number"]
+# The parsing lives in src.parse so it can run without Selenium, the names
+# are still importable from here
+from src.parse import (  # noqa: F401
+    CARD_FIELD_CLASSES,
+    CARD_ID_PATTERN,
+    DEFAULT_PARSER,
+    PARSERS,
+    RealtorData,
+    check_input_parser,
+    collect_realtor_data_from_page,
+    extract_card_fields,
+    find_page_count,
+    make_page_parser,
+    parse_page_source,
+    sanitize,
+)
+from src.fingerprints import DeltaSink, PageFingerprints
+from src.html_cache import (
+    DEFAULT_CACHE_DAYS,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_CACHE_MB,
+    HtmlCache,
 )
+from src.http_fetch import HttpFetcher
+from src.metrics import MetricsSink, RssSampler, RunMetrics
+from src.normalize import NormalizingSink, Normalizer
+from src.pipeline import run_pipeline
+from src.pool import DriverPool
+from src.rate import (
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MIN_CONCURRENCY,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_TARGET_LATENCY,
+    RateController,
+)
+from src.supervisor import quit_driver
+from src.sinks import BatchSink, ParquetSink, SqliteSink, StreamingCsvWriter
+from src.wait import WaitStats, wait_for_cards, DEFAULT_WAIT_CEILING
 
 BATCH_SIZE = 8
 DEFAULT_PAGES_TO_SCRAPE = 1
+# Instead of a number of pages, reads it off the first page
+AUTO_PAGES = "auto"
+# When the first page doesn't say, scrape until the empty pages stop the run
+UNKNOWN_PAGE_COUNT = 10000
+# A run stops after this many pages in a row without cards
+DEFAULT_MAX_EMPTY_PAGES = 3
 DEFAULT_FILENAME = "realtor_data"
+DEFAULT_WORKERS = 1
+# A browser is swapped for a new one after this many pages, or once Chrome
+# uses more than this much memory, long runs keep growing otherwise
+DEFAULT_RECYCLE_PAGES = 200
+DEFAULT_RECYCLE_RSS_MB = 2048
+# 0 parses pages inline on the render thread instead of in a process pool
+DEFAULT_PARSE_WORKERS = 0
+# browser renders pages in Chrome, http fetches them with plain requests
+FETCH_MODES = ["browser", "http", "replay"]
+DEFAULT_FETCH_MODE = "browser"
+# full is a normal windowed Chrome, lean is headless and skips everything the
+# scraper does not read
+BROWSER_PROFILES = ["full", "lean"]
+DEFAULT_BROWSER_PROFILE = "full"
+LEAN_WINDOW_SIZE = "1024,768"
+# Images, fonts, media and stylesheets, blocked through DevTools in the lean profile
+BLOCKED_URL_PATTERNS = [
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.webp",
+    "*.svg",
+    "*.ico",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.eot",
+    "*.mp4",
+    "*.webm",
+    "*.mp3",
+    "*.css",
+]
+# soup parses page_source in Python, script pulls the fields out in the browser
+# and compare does both and logs where they differ
+EXTRACT_MODES = ["soup", "script", "compare"]
+DEFAULT_EXTRACT_MODE = "soup"
+# Same cards and fields as collect_realtor_data_from_page, as CSS selectors
+CARD_CSS_SELECTOR = "[id*='RealtorCard-']"
+CARD_FIELD_SELECTORS = ["." + ".".join(classes) for classes in CARD_FIELD_CLASSES]
+# Returns one array per card with the text of each field, null if it is missing
+EXTRACT_CARDS_SCRIPT = """
+var cardSelector = arguments[0];
+var fieldSelectors = arguments[1];
+return Array.from(document.querySelectorAll(cardSelector), function (card) {
+    return fieldSelectors.map(function (selector) {
+        var element = card.querySelector(selector);
+        return element === null ? null : element.textContent;
+    });
+});
+"""
+# csv is rewritten every run, sqlite keeps one row per realtor across runs
+# and parquet is columnar for big runs, it needs pyarrow
+OUTPUT_FORMATS = ["csv", "sqlite", "parquet"]
+DEFAULT_OUTPUT_FORMAT = "csv"
+# --delta only writes realtors that changed since the last run, and how
+DELTA_FIELDS = ["change", *RealtorData._fields]
+CLI_OPTIONS = [
+    "wait-ceiling",
+    "workers",
+    "parse-workers",
+    "fetch",
+    "profile",
+    "parser",
+    "strain-cards",
+    "extract",
+    "resume",
+    "output",
+    "delta",
+    "cache",
+    "cache-mb",
+    "cache-days",
+    "recycle-pages",
+    "recycle-rss-mb",
+    "target-latency",
+    "min-interval",
+    "max-interval",
+    "min-concurrency",
+    "stop-after-empty",
+    "normalize",
+]
+
+# Keys the listing data endpoint uses for each field, the same names the
+# cards use in their data-binding attributes
+RECORD_KEYS = RealtorData(
+    name="RealtorName",
+    role="RealtorPosition",
+    company="OfficeName",
+    address="OfficeAddress",
+    number="Phone",
+)
 
 LOGGER = logging.getLogger("scraper")
-LOGGER.setLevel(logging.DEBUG)
 
-STD_OUT_LOGGER = logging.StreamHandler(sys.stdout)
-STD_OUT_LOGGER.setLevel(logging.DEBUG)
+# Set by load_config, nothing is read from the environment on import
+URL = None
+# Optional, the endpoint the page's JS loads its listings from
+DATA_URL = None
 
-LOGGER.addHandler(STD_OUT_LOGGER)
 
-load_dotenv()
-URL = getenv("WEBSITE_URL")
-assert isinstance(URL, str)
+def setup_logging():
+    LOGGER.setLevel(logging.DEBUG)
+    if not LOGGER.handlers:
+        std_out_logger = logging.StreamHandler(sys.stdout)
+        std_out_logger.setLevel(logging.DEBUG)
+        LOGGER.addHandler(std_out_logger)
 
 
-def provision_webdriver():
-    try:
-        service = ChromeService()
-        options = ChromeOptions()
-        options.add_argument("--enable-javascript")
-        driver = Chrome(service=service, options=options)
-        LOGGER.info(f"Created driver: {driver}")
+def load_config():
+    # From the environment, or a .env in the working directory. Raises
+    # instead of exiting, the CLI and library callers handle it their own way
+    global URL, DATA_URL
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    URL = getenv("WEBSITE_URL")
+    DATA_URL = getenv("LISTING_DATA_URL")
+    if not URL:
+        raise LookupError("WEBSITE_URL is not set, add it to .env or the environment")
+
 
-    except (WebDriverException, Exception) as e:
+# Raises instead of exiting, so a driver that died mid run can be replaced.
+# Selenium is only imported here, http and replay runs never load it
+def start_webdriver(profile=DEFAULT_BROWSER_PROFILE):
+    from selenium.webdriver import Chrome, ChromeOptions, ChromeService
+
+    service = ChromeService()
+    options = ChromeOptions()
+    options.add_argument("--enable-javascript")
+    if profile == "lean":
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        options.add_argument(f"--window-size={LEAN_WINDOW_SIZE}")
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_argument("--mute-audio")
+    driver = Chrome(service=service, options=options)
+    if profile == "lean":
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd(
+                "Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS}
+            )
+        except Exception:
+            # Chrome is already running, don't leave it behind
+            quit_driver(driver)
+            raise
+    LOGGER.info(f"Created driver: {driver} profile: {profile}")
+    return driver
+
+
+def provision_webdriver(profile=DEFAULT_BROWSER_PROFILE):
+    try:
+        driver = start_webdriver(profile)
+    except Exception as e:
         LOGGER.critical(f"Something went wrong with Webdriver setup: {e}")
         sys.exit()
 
     return driver
 
 
-def sanitize(input_str):
-    return " ".join(input_str.split())
+def provision_http_fetcher():
+    fetcher = HttpFetcher()
+    LOGGER.info(f"Created http fetcher: {fetcher}")
+    return fetcher
 
 
 # TODO: Should force directory to be in a folder
 # called output in top level dir of project
-def initialize_csv(input_name):
+def initialize_csv(input_name, fields=RealtorData._fields):
     try:
         filename = f"{input_name}.csv"
         with open(filename, "w") as file:
             csv_writer = writer(file)
-            csv_writer.writerow(list(RealtorData._fields))
+            csv_writer.writerow(list(fields))
     except (FileNotFoundError, PermissionError, IOError, Exception) as e:
         LOGGER.critical(f"Can't write to file: {e}")
         sys.exit()
     return filename
 
 
+def resume_csv(input_name):
+    filename = f"{input_name}.csv"
+    journal = CheckpointJournal.for_output(filename)
+
+    if not path.exists(filename) and not journal.exists():
+        LOGGER.info(f"Nothing to resume for {filename}, starting a new run")
+        return initialize_csv(input_name), journal
+
+    if not journal.exists():
+        LOGGER.critical(
+            f"{filename} has no checkpoint journal, can't tell which pages are in it"
+        )
+        sys.exit()
+
+    try:
+        journal.load()
+        journal.restore_output()
+    except (FileNotFoundError, PermissionError, IOError, Exception) as e:
+        LOGGER.critical(f"Can't resume from checkpoint: {e}")
+        sys.exit()
+
+    LOGGER.info(
+        f"Resuming {filename}, {len(journal.completed_pages)} pages already done"
+    )
+    return filename, journal
+
+
+def open_output(
+    input_name,
+    output_format=DEFAULT_OUTPUT_FORMAT,
+    resume=False,
+    fields=RealtorData._fields,
+):
+    if output_format == "sqlite":
+        if resume:
+            LOGGER.warning("--resume is for csv, sqlite upserts so reruns are safe")
+        filename = f"{input_name}.db"
+        if list(fields) == DELTA_FIELDS:
+            # Delta rows have a change column, the full table can't hold them
+            filename = f"{input_name}.delta.db"
+        return filename, None, SqliteSink(filename, fields)
+    if output_format == "parquet":
+        if resume:
+            LOGGER.warning("--resume is for csv, the parquet file is written again")
+        filename = f"{input_name}.parquet"
+        return filename, None, ParquetSink(filename, fields)
+
+    if resume:
+        filename, journal = resume_csv(input_name)
+    else:
+        filename = initialize_csv(input_name, fields)
+        journal = CheckpointJournal.for_output(filename)
+    return filename, journal, StreamingCsvWriter(filename, journal)
+
+
 def write_to_csv(filename, pages_data):
     try:
         with open(filename, "a") as file:
@@ -77,6 +306,9 @@ def write_to_csv(filename, pages_data):
 
 
 def check_input_pages(input_pages):
+    # None means the page count is found once the browser is up
+    if input_pages == AUTO_PAGES:
+        return None
     if input_pages.isdigit() and int(input_pages) > 0:
         pages_to_scrape = int(input_pages)
     else:
@@ -86,6 +318,71 @@ def check_input_pages(input_pages):
     return pages_to_scrape
 
 
+def check_input_seconds(input_seconds, default):
+    try:
+        seconds = float(input_seconds)
+    except ValueError:
+        seconds = 0
+    if seconds > 0:
+        return seconds
+    LOGGER.error(
+        f"Seems like you entered an invalid number of seconds: {input_seconds}"
+    )
+    LOGGER.error(f"We'll set it to {default}")
+    return default
+
+
+def check_input_limit(input_limit, default):
+    try:
+        limit = float(input_limit)
+    except ValueError:
+        limit = 0
+    if limit > 0:
+        return limit
+    LOGGER.error(f"Seems like you entered an invalid limit: {input_limit}")
+    LOGGER.error(f"We'll set it to {default}")
+    return default
+
+
+def check_input_fetch_mode(input_mode):
+    if input_mode in FETCH_MODES:
+        return input_mode
+    LOGGER.error(f"Seems like you entered an invalid fetch mode: {input_mode}")
+    LOGGER.error(f"Choose one of {FETCH_MODES}, we'll use {DEFAULT_FETCH_MODE}")
+    return DEFAULT_FETCH_MODE
+
+
+def check_input_profile(input_profile):
+    if input_profile in BROWSER_PROFILES:
+        return input_profile
+    LOGGER.error(f"Seems like you entered an invalid profile: {input_profile}")
+    LOGGER.error(
+        f"Choose one of {BROWSER_PROFILES}, we'll use {DEFAULT_BROWSER_PROFILE}"
+    )
+    return DEFAULT_BROWSER_PROFILE
+
+
+def check_input_extract_mode(input_mode):
+    if input_mode in EXTRACT_MODES:
+        return input_mode
+    LOGGER.error(f"Seems like you entered an invalid extract mode: {input_mode}")
+    LOGGER.error(f"Choose one of {EXTRACT_MODES}, we'll use {DEFAULT_EXTRACT_MODE}")
+    return DEFAULT_EXTRACT_MODE
+
+
+def check_input_output_format(input_format):
+    if input_format not in OUTPUT_FORMATS:
+        LOGGER.error(f"Seems like you entered an invalid output format: {input_format}")
+        LOGGER.error(
+            f"Choose one of {OUTPUT_FORMATS}, we'll use {DEFAULT_OUTPUT_FORMAT}"
+        )
+        return DEFAULT_OUTPUT_FORMAT
+    if input_format == "parquet" and find_spec("pyarrow") is None:
+        LOGGER.error(f"pyarrow is not installed, we'll use {DEFAULT_OUTPUT_FORMAT}")
+        return DEFAULT_OUTPUT_FORMAT
+    return input_format
+
+
 def check_input_filename(input):
     properfilename = re.compile("^[a-zA-Z0-9_.-]*$")
     if properfilename.match(input):
@@ -99,111 +396,571 @@ def check_input_filename(input):
     return filename
 
 
-def collect_realtor_data_from_page(soup):
-    realtor_card_divs = soup.find_all(id=re.compile("RealtorCard-[0-9]*"))
-    assert len(realtor_card_divs) != 0
+def collect_realtor_data_from_script_rows(card_rows):
+    if not card_rows:
+        LOGGER.warning("No realtor cards on the page")
+        return []
 
     page_data = []
 
-    for card in realtor_card_divs:
-        try:
-            name = card.find(class_="realtorCardName").text
-            realtor_name = sanitize(name)
-        except (TypeError, AttributeError):
-            realtor_name = ""
-            LOGGER.error(f"Could not get name for {card}")
+    for card_index, card_row in enumerate(card_rows):
+        values = []
+        for field, text in zip(RealtorData._fields, card_row):
+            if text is None:
+                values.append("")
+                LOGGER.error(f"Could not get {field} for card {card_index}")
+            else:
+                values.append(sanitize(text))
 
-        try:
-            role = card.find(class_="realtorCardTitle").text
-            realtor_role = sanitize(role)
-        except (TypeError, AttributeError):
-            realtor_role = ""
-            LOGGER.error(f"Could not get role for {card}")
+        page_data.append(RealtorData(*values))
 
-        try:
-            company = card.find(class_="realtorCardOfficeName").text
-            realtor_company = sanitize(company)
-        except (TypeError, AttributeError):
-            realtor_company = ""
-            LOGGER.error(f"Could not get company for {card}")
+    return page_data
 
-        try:
-            address = card.find(class_="realtorCardOfficeAddress").text
-            realtor_address = sanitize(address)
-        except (TypeError, AttributeError):
-            realtor_address = ""
-            LOGGER.error(f"Could not get address for {card}")
 
-        try:
-            number = card.find(class_="realtorCardContactNumber TelephoneNumber").text
-            realtor_number = sanitize(number)
-        except (TypeError, AttributeError):
-            realtor_number = ""
-            LOGGER.error(f"Could not get number for {card}")
+def collect_realtor_data_from_records(records):
+    # Listing data endpoint returns either a list of records or {"Results": [...]}
+    if isinstance(records, dict):
+        records = records.get("Results", [])
+    if not records:
+        LOGGER.warning("No realtors in the listing data")
+        return []
 
-        realtor_data = RealtorData(
-            name=realtor_name,
-            role=realtor_role,
-            company=realtor_company,
-            address=realtor_address,
-            number=realtor_number,
-        )
+    page_data = []
 
-        page_data.append(realtor_data)
+    for record in records:
+        values = []
+        for field, key in zip(RealtorData._fields, RECORD_KEYS):
+            value = record.get(key)
+            if value is None:
+                values.append("")
+                # Lazy, so the record is only turned into a string if it is logged
+                LOGGER.error("Could not get %s for %s", field, record)
+            else:
+                values.append(sanitize(str(value)))
+
+        page_data.append(RealtorData(*values))
 
     return page_data
 
 
-def render_page(driver, url):
+def render_page_source(driver, url, wait_stats=None, html_cache=None, metrics=None):
+    if wait_stats is None:
+        wait_stats = WaitStats()
+    if metrics is None:
+        metrics = RunMetrics()
+
     try:
-        driver.get(url)
-        # Wait for webpage to load, may need to change this depending on internet speed and hardware specs
-        # This is also because the site is loading in JS and .get() above will not catch that
-        time.sleep(8)
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-    except (WebDriverException, Exception) as e:
+        with metrics.time("get"):
+            driver.get(url)
+        # The site loads the cards in with JS and .get() above will not catch that
+        # Wait until the cards have rendered and stopped changing, up to a ceiling
+        with metrics.time("wait"):
+            wait_for_cards(driver, wait_stats)
+        with metrics.time("page_source"):
+            page_source = driver.page_source
+    except Exception as e:
         LOGGER.error(f"Could not load page, more info {e}")
         raise e
 
-    page_data = collect_realtor_data_from_page(soup)
-    return page_data
+    if html_cache is not None:
+        html_cache.put(url, page_source)
+    return page_source
 
 
-def scrape_pages(
-    driver, filename, pages_to_scrape=DEFAULT_PAGES_TO_SCRAPE, batch_size=BATCH_SIZE
+def render_page(
+    driver,
+    url,
+    wait_stats=None,
+    page_parser=parse_page_source,
+    html_cache=None,
+    metrics=None,
+):
+    if metrics is None:
+        metrics = RunMetrics()
+    page_source = render_page_source(driver, url, wait_stats, html_cache, metrics)
+    with metrics.time("parse"):
+        return page_parser(page_source)
+
+
+# The html cache stands in for the driver, pages come from what it saved
+def replay_page_source(html_cache, url, wait_stats=None, metrics=None):
+    if metrics is None:
+        metrics = RunMetrics()
+    with metrics.time("replay"):
+        page_source = html_cache.get(url)
+    if page_source is None:
+        LOGGER.error(f"Could not replay page, {url} is not in the html cache")
+        raise LookupError(url)
+    return page_source
+
+
+def replay_page(
+    html_cache, url, wait_stats=None, page_parser=parse_page_source, metrics=None
+):
+    if metrics is None:
+        metrics = RunMetrics()
+    page_source = replay_page_source(html_cache, url, metrics=metrics)
+    with metrics.time("parse"):
+        return page_parser(page_source)
+
+
+def extract_page_in_browser(
+    driver,
+    url,
+    wait_stats=None,
+    page_parser=parse_page_source,
+    compare=False,
+    metrics=None,
 ):
-    for batch_start in range(1, pages_to_scrape + 1, batch_size):
-        # Choose where the batch ends
-        # pages_to_scrape + 1 will be the batch_end, once we reach the end of all pages to scrape
-        batch_end = min(batch_start + batch_size, pages_to_scrape + 1)
-        data_from_pages = []
+    if wait_stats is None:
+        wait_stats = WaitStats()
+    if metrics is None:
+        metrics = RunMetrics()
+
+    try:
+        with metrics.time("get"):
+            driver.get(url)
+        with metrics.time("wait"):
+            wait_for_cards(driver, wait_stats)
+        # Only the card text comes back over the wire, not the whole DOM
+        with metrics.time("script"):
+            card_rows = driver.execute_script(
+                EXTRACT_CARDS_SCRIPT, CARD_CSS_SELECTOR, CARD_FIELD_SELECTORS
+            )
+        page_source = None
+        if compare:
+            with metrics.time("page_source"):
+                page_source = driver.page_source
+    except Exception as e:
+        LOGGER.error(f"Could not load page, more info {e}")
+        raise e
+
+    page_data = collect_realtor_data_from_script_rows(card_rows)
+    if not compare:
+        return page_data
+
+    with metrics.time("parse"):
+        soup_page_data = page_parser(page_source)
+    log_page_data_differences(url, soup_page_data, page_data)
+    # Keep writing what the soup path found while the two are being compared
+    return soup_page_data
+
+
+def log_page_data_differences(url, soup_page_data, script_page_data):
+    if len(soup_page_data) != len(script_page_data):
+        LOGGER.warning(
+            f"{url}: soup found {len(soup_page_data)} cards, "
+            f"script found {len(script_page_data)}"
+        )
+    for card_index, (from_soup, from_script) in enumerate(
+        zip(soup_page_data, script_page_data)
+    ):
+        if from_soup != from_script:
+            LOGGER.warning(
+                f"{url} card {card_index}: soup {from_soup} script {from_script}"
+            )
+
+
+def fetch_response(fetcher, url):
+    try:
+        response = fetcher.get(url)
+    except Exception as e:
+        LOGGER.error(f"Could not fetch page, more info {e}")
+        raise e
+    return response
 
-        for page_num in range(batch_start, batch_end):
-            url = URL + str(page_num)
-            LOGGER.info(f"Rendering url: {url}")
 
-            page_data = render_page(driver, url)
-            data_from_pages.append(page_data)
+# wait_stats is unused, there is nothing to wait for without a browser,
+# it is there so this can stand in for render_page_source
+def fetch_page_source(fetcher, url, wait_stats=None, metrics=None):
+    if metrics is None:
+        metrics = RunMetrics()
+    with metrics.time("fetch"):
+        return fetch_response(fetcher, url).text
 
-        LOGGER.info(f"Writing batch for pages {batch_start} to {batch_end - 1}")
+
+def fetch_page(
+    fetcher, url, wait_stats=None, page_parser=parse_page_source, metrics=None
+):
+    if metrics is None:
+        metrics = RunMetrics()
+    with metrics.time("fetch"):
+        response = fetch_response(fetcher, url)
+    with metrics.time("parse"):
+        if "json" in response.headers.get("Content-Type", ""):
+            return collect_realtor_data_from_records(response.json())
+        return page_parser(response.text)
+
+
+def find_page_count_in_records(records):
+    # The listing data endpoint says how many pages there are next to the results
+    if not isinstance(records, dict):
+        return None
+    paging = records.get("Paging") or {}
+    if paging.get("TotalPages") is not None:
+        return int(paging["TotalPages"])
+    results = records.get("Results") or []
+    if paging.get("TotalRecords") is None or not results:
+        return None
+    return -(-int(paging["TotalRecords"]) // len(results))
+
+
+def discover_pages_to_scrape(
+    driver, fetch_mode=DEFAULT_FETCH_MODE, wait_ceiling=DEFAULT_WAIT_CEILING
+):
+    # Loads the first page once more than the run itself, to read how many
+    # pages there are off it
+    pool = driver if isinstance(driver, DriverPool) else DriverPool([driver])
+    wait_stats = WaitStats(ceiling=wait_ceiling)
+
+    def load_page_count(pool_driver, page_num):
+        if fetch_mode == "http" and DATA_URL:
+            response = fetch_response(pool_driver, DATA_URL + str(page_num))
+            if "json" in response.headers.get("Content-Type", ""):
+                return find_page_count_in_records(response.json())
+            return find_page_count(response.text)
+        url = URL + str(page_num)
+        if fetch_mode == "http":
+            page_source = fetch_page_source(pool_driver, url)
+        elif fetch_mode == "replay":
+            page_source = replay_page_source(pool_driver, url)
+        else:
+            page_source = render_page_source(pool_driver, url, wait_stats)
+        return find_page_count(page_source)
+
+    page_count = next(pool.map_pages(load_page_count, [1]))
+    if page_count is None:
+        LOGGER.warning(
+            "Could not find how many pages there are, scraping until the pages "
+            "run out of cards"
+        )
+        return UNKNOWN_PAGE_COUNT
+    LOGGER.info(f"Found {page_count} pages to scrape")
+    return page_count
+
+
+def scrape_pages(
+    driver,
+    filename,
+    pages_to_scrape=DEFAULT_PAGES_TO_SCRAPE,
+    batch_size=BATCH_SIZE,
+    wait_ceiling=DEFAULT_WAIT_CEILING,
+    parse_workers=DEFAULT_PARSE_WORKERS,
+    fetch_mode=DEFAULT_FETCH_MODE,
+    page_parser=parse_page_source,
+    extract_mode=DEFAULT_EXTRACT_MODE,
+    journal=None,
+    sink=None,
+    html_cache=None,
+    metrics=None,
+    metrics_path=None,
+    restart_driver=None,
+    recycle_pages=None,
+    recycle_rss_bytes=None,
+    rate_controller=None,
+    max_empty_pages=DEFAULT_MAX_EMPTY_PAGES,
+    first_page=1,
+    normalizer=None,
+):
+    wait_stats = WaitStats(ceiling=wait_ceiling)
+    if metrics is None:
+        metrics = RunMetrics()
+    # A shard scrapes first_page to pages_to_scrape, a whole run starts at 1
+    page_nums = list(range(first_page, pages_to_scrape + 1))
+    if journal is not None:
+        # Pages from a run being resumed are skipped
+        page_nums = [
+            page_num
+            for page_num in journal.pending_pages(pages_to_scrape)
+            if page_num >= first_page
+        ]
+        journal.start(pages_to_scrape)
+        LOGGER.info(f"{len(page_nums)} of {pages_to_scrape} pages left to scrape")
+
+    def write_batch(batch_pages, data_from_pages):
+        LOGGER.info(f"Writing batch for pages {batch_pages[0]} to {batch_pages[-1]}")
         write_to_csv(filename, data_from_pages)
+        if journal is not None:
+            journal.commit_batch(batch_pages)
         LOGGER.info("Wrote batch above to CSV")
 
+    # Without a sink each batch is written in one go once all its pages are in
+    if sink is None:
+        sink = BatchSink(write_batch)
+    sink = MetricsSink(sink, metrics)
+    if normalizer is not None:
+        # Before the delta and the output, so both see the canonical values
+        sink = NormalizingSink(sink, normalizer, metrics)
+
+    # A single driver is just a pool of one
+    pool = driver
+    if not isinstance(driver, DriverPool):
+        pool = DriverPool([driver], restart_driver, recycle_pages, recycle_rss_bytes)
+    if rate_controller is None:
+        rate_controller = RateController(len(pool))
+
+    if extract_mode != DEFAULT_EXTRACT_MODE and fetch_mode != "browser":
+        LOGGER.warning(f"--extract={extract_mode} needs the browser, using soup")
+        extract_mode = DEFAULT_EXTRACT_MODE
+    if extract_mode != DEFAULT_EXTRACT_MODE and parse_workers > 0:
+        LOGGER.warning(
+            f"--extract={extract_mode} extracts in the browser, not using parse workers"
+        )
+        parse_workers = 0
+
+    try:
+        with RssSampler(metrics, pool):
+            if parse_workers > 0:
+                scrape_pages_pipelined(
+                    pool,
+                    sink,
+                    page_nums,
+                    batch_size,
+                    wait_stats,
+                    parse_workers,
+                    fetch_mode,
+                    page_parser,
+                    html_cache,
+                    metrics,
+                    rate_controller,
+                    max_empty_pages,
+                )
+            else:
+                scrape_pages_serial(
+                    pool,
+                    sink,
+                    page_nums,
+                    batch_size,
+                    wait_stats,
+                    fetch_mode,
+                    page_parser,
+                    extract_mode,
+                    html_cache,
+                    metrics,
+                    rate_controller,
+                    max_empty_pages,
+                )
+    finally:
+        if pool is not driver:
+            # The caller quits the driver it passed in, any driver the pool
+            # swapped in for it is only known here
+            for supervisor in pool.supervisors:
+                if supervisor.driver is not driver:
+                    supervisor.quit()
+        # A failed run still leaves its numbers behind, they show where it got to
+        LOGGER.info(f"Page wait stats: {wait_stats.summary()}")
+        rate_summary = rate_controller.summary()
+        LOGGER.info(f"Rate controller: {rate_summary}")
+        for name in ["concurrency", "interval_seconds", "latency_seconds"]:
+            metrics.set_gauge(f"rate_{name}", rate_summary[name])
+        summary = metrics.summary()
+        LOGGER.info(
+            f"Run metrics: {summary['pages']} pages, {summary['cards']} cards, "
+            f"missing fields {summary['missing_fields']}"
+        )
+        for stage, stage_summary in summary["stages"].items():
+            LOGGER.info(f"Stage {stage} timings: {stage_summary}")
+        extra = {"wait": wait_stats.summary(), "rate": rate_summary}
+        if normalizer is not None:
+            extra["normalize"] = normalizer.summary()
+            LOGGER.info(f"Normalization: {extra['normalize']}")
+            for field in ["company", "address"]:
+                metrics.set_gauge(
+                    f"normalize_{field}_hit_rate",
+                    extra["normalize"][field]["hit_rate"],
+                )
+        if metrics_path is not None:
+            metrics.export(metrics_path, **extra)
+            LOGGER.info(f"Wrote metrics to {metrics_path}.prom and .metrics.json")
+
+
+def scrape_pages_serial(
+    pool,
+    sink,
+    page_nums,
+    batch_size,
+    wait_stats,
+    fetch_mode=DEFAULT_FETCH_MODE,
+    page_parser=parse_page_source,
+    extract_mode=DEFAULT_EXTRACT_MODE,
+    html_cache=None,
+    metrics=None,
+    rate_controller=None,
+    max_empty_pages=None,
+):
+    pages = iter_pages(
+        pool,
+        page_nums,
+        wait_stats,
+        fetch_mode,
+        page_parser,
+        extract_mode,
+        html_cache,
+        metrics,
+        rate_controller,
+        max_empty_pages,
+    )
+    batch_pages = []
+    try:
+        for page_num, page_data in pages:
+            sink.write_page(page_num, page_data)
+            batch_pages.append(page_num)
+            if len(batch_pages) == batch_size:
+                sink.checkpoint(batch_pages)
+                batch_pages = []
+        # The last batch is whatever is left over, or what was written before
+        # an early stop
+        if batch_pages:
+            sink.checkpoint(batch_pages)
+    finally:
+        pages.close()
+
+
+def iter_pages(
+    pool,
+    page_nums,
+    wait_stats,
+    fetch_mode=DEFAULT_FETCH_MODE,
+    page_parser=parse_page_source,
+    extract_mode=DEFAULT_EXTRACT_MODE,
+    html_cache=None,
+    metrics=None,
+    rate_controller=None,
+    max_empty_pages=None,
+):
+    # Yields (page_num, page_data) as each page is parsed, in page order.
+    # Only the pool's lookahead is rendered ahead of whoever is consuming
+    if rate_controller is None:
+        rate_controller = RateController(len(pool))
+    base_url = URL
+    render = render_page
+    if html_cache is not None:
+        render = partial(render_page, html_cache=html_cache)
+    if fetch_mode == "http":
+        # Prefer the data endpoint, fall back to the server rendered page
+        base_url = DATA_URL or URL
+        render = fetch_page
+    elif fetch_mode == "replay":
+        render = replay_page
+    elif extract_mode != DEFAULT_EXTRACT_MODE:
+        render = partial(extract_page_in_browser, compare=extract_mode == "compare")
+
+    def render_page_num(pool_driver, page_num):
+        url = base_url + str(page_num)
+        LOGGER.info(f"Rendering url: {url}")
+        return rate_controller.run(
+            render,
+            pool_driver,
+            url,
+            wait_stats,
+            page_parser=page_parser,
+            metrics=metrics,
+        )
+
+    rendered_pages = pool.map_pages(render_page_num, page_nums)
+    empty_pages = 0
+    try:
+        for page_num in page_nums:
+            page_data = next(rendered_pages)
+            yield page_num, page_data
+            empty_pages = 0 if page_data else empty_pages + 1
+            if empty_pages == max_empty_pages:
+                log_early_stop(page_num, empty_pages)
+                return
+    finally:
+        # Closing cancels the pages queued up past an early stop
+        rendered_pages.close()
+
+
+def log_early_stop(page_num, empty_pages):
+    LOGGER.info(
+        f"Stopping at page {page_num} after {empty_pages} pages in a row "
+        f"without cards, the last page with cards was {page_num - empty_pages}"
+    )
+
+
+def scrape_pages_pipelined(
+    pool,
+    sink,
+    page_nums,
+    batch_size,
+    wait_stats,
+    parse_workers,
+    fetch_mode=DEFAULT_FETCH_MODE,
+    page_parser=parse_page_source,
+    html_cache=None,
+    metrics=None,
+    rate_controller=None,
+    max_empty_pages=None,
+):
+    if rate_controller is None:
+        rate_controller = RateController(len(pool))
+    # Browsers keep rendering while earlier pages are parsed and written
+    # The parse processes work on page html, so http mode uses the
+    # server rendered page here rather than the data endpoint
+    render_source = render_page_source
+    if html_cache is not None:
+        render_source = partial(render_page_source, html_cache=html_cache)
+    if fetch_mode == "http":
+        render_source = fetch_page_source
+    elif fetch_mode == "replay":
+        render_source = replay_page_source
+
+    # The controller only sees html here, a page without cards is reported to
+    # it once parsed, with when it was sent so it backs off like in serial runs
+    render_started = {}
+
+    def render_page_num(pool_driver, page_num):
+        url = URL + str(page_num)
+        LOGGER.info(f"Rendering url: {url}")
+        render_started[page_num] = time.monotonic()
+        return rate_controller.run(
+            render_source, pool_driver, url, wait_stats, metrics=metrics
+        )
+
+    def report_empty_page(page_num):
+        started = render_started.pop(page_num, None)
+        if started is not None:
+            rate_controller.report_empty(started)
+
+    return run_pipeline(
+        pool,
+        render_page_num,
+        page_parser,
+        sink,
+        page_nums,
+        batch_size,
+        parse_workers,
+        metrics=metrics,
+        max_empty_pages=max_empty_pages,
+        on_early_stop=log_early_stop,
+        on_empty_page=report_empty_page,
+    )
+
 
 def main():
-    if len(sys.argv) == 3:
-        pages_to_scrape = check_input_pages(sys.argv[1])
-        filename = check_input_filename(sys.argv[2])
+    setup_logging()
+    try:
+        load_config()
+    except LookupError as e:
+        LOGGER.critical(f"Can't start: {e}")
+        sys.exit()
 
-    if len(sys.argv) == 2:
-        pages_to_scrape = check_input_pages(sys.argv[1])
+    args, options = split_cli_args(sys.argv, CLI_OPTIONS)
+
+    if len(args) == 3:
+        pages_to_scrape = check_input_pages(args[1])
+        filename = check_input_filename(args[2])
+
+    if len(args) == 2:
+        pages_to_scrape = check_input_pages(args[1])
         filename = DEFAULT_FILENAME
 
-    if len(sys.argv) == 1:
+    if len(args) == 1:
         pages_to_scrape = DEFAULT_PAGES_TO_SCRAPE
         filename = DEFAULT_FILENAME
 
-    if len(sys.argv) > 3:
+    if len(args) > 3:
         LOGGER.critical(
             "Looks like more than 3 arguments were supplied.\
             The first is number of pages to scrape, \
@@ -211,12 +968,201 @@ def main():
         )
         sys.exit()
 
-    LOGGER.info(f"pages input: {pages_to_scrape} filename: {filename}")
+    wait_ceiling = DEFAULT_WAIT_CEILING
+    if "wait-ceiling" in options:
+        wait_ceiling = check_input_seconds(
+            options["wait-ceiling"], DEFAULT_WAIT_CEILING
+        )
+
+    workers = DEFAULT_WORKERS
+    if "workers" in options:
+        workers = check_input_workers(options["workers"], DEFAULT_WORKERS)
+
+    parse_workers = DEFAULT_PARSE_WORKERS
+    if "parse-workers" in options:
+        parse_workers = check_input_workers(
+            options["parse-workers"], DEFAULT_PARSE_WORKERS
+        )
+
+    fetch_mode = DEFAULT_FETCH_MODE
+    if "fetch" in options:
+        fetch_mode = check_input_fetch_mode(options["fetch"])
+
+    LOGGER.info(
+        f"pages input: {pages_to_scrape or AUTO_PAGES} filename: {filename} workers: {workers}"
+    )
+
+    profile = DEFAULT_BROWSER_PROFILE
+    if "profile" in options:
+        profile = check_input_profile(options["profile"])
+
+    parser = DEFAULT_PARSER
+    if "parser" in options:
+        parser = check_input_parser(options["parser"])
+    strain_cards = "strain-cards" in options
+
+    extract_mode = DEFAULT_EXTRACT_MODE
+    if "extract" in options:
+        extract_mode = check_input_extract_mode(options["extract"])
+
+    output_format = DEFAULT_OUTPUT_FORMAT
+    if "output" in options:
+        output_format = check_input_output_format(options["output"])
+
+    html_cache = None
+    if "cache" in options or fetch_mode == "replay":
+        cache_mb = DEFAULT_CACHE_MB
+        if "cache-mb" in options:
+            cache_mb = check_input_limit(options["cache-mb"], DEFAULT_CACHE_MB)
+        cache_days = DEFAULT_CACHE_DAYS
+        if "cache-days" in options:
+            cache_days = check_input_limit(options["cache-days"], DEFAULT_CACHE_DAYS)
+        if fetch_mode == "http":
+            LOGGER.warning("--cache only saves pages rendered by the browser")
+        html_cache = HtmlCache(
+            options.get("cache") or DEFAULT_CACHE_DIR,
+            max_bytes=cache_mb * 1024 * 1024,
+            max_age=cache_days * 24 * 60 * 60,
+        )
+
+    recycle_pages = DEFAULT_RECYCLE_PAGES
+    if "recycle-pages" in options:
+        recycle_pages = check_input_positive_int(
+            options["recycle-pages"],
+            DEFAULT_RECYCLE_PAGES,
+            "number of pages before recycling a browser",
+        )
+    recycle_rss_mb = DEFAULT_RECYCLE_RSS_MB
+    if "recycle-rss-mb" in options:
+        recycle_rss_mb = check_input_limit(
+            options["recycle-rss-mb"], DEFAULT_RECYCLE_RSS_MB
+        )
+
+    target_latency = DEFAULT_TARGET_LATENCY
+    if "target-latency" in options:
+        target_latency = check_input_seconds(
+            options["target-latency"], DEFAULT_TARGET_LATENCY
+        )
+    min_interval = DEFAULT_MIN_INTERVAL
+    if "min-interval" in options:
+        min_interval = check_input_seconds(
+            options["min-interval"], DEFAULT_MIN_INTERVAL
+        )
+    max_interval = DEFAULT_MAX_INTERVAL
+    if "max-interval" in options:
+        max_interval = check_input_seconds(
+            options["max-interval"], DEFAULT_MAX_INTERVAL
+        )
+    min_concurrency = DEFAULT_MIN_CONCURRENCY
+    if "min-concurrency" in options:
+        min_concurrency = check_input_positive_int(
+            options["min-concurrency"],
+            DEFAULT_MIN_CONCURRENCY,
+            "number of pages in flight",
+        )
+    rate_controller = RateController(
+        workers, target_latency, min_interval, max_interval, min_concurrency
+    )
+
+    max_empty_pages = DEFAULT_MAX_EMPTY_PAGES
+    if "stop-after-empty" in options:
+        max_empty_pages = check_input_positive_int(
+            options["stop-after-empty"],
+            DEFAULT_MAX_EMPTY_PAGES,
+            "number of empty pages to stop after",
+        )
+
+    provision = partial(provision_webdriver, profile=profile)
+    # Only browsers are recycled and restarted, http fetchers don't grow or die
+    restart_driver = partial(start_webdriver, profile=profile)
+    if fetch_mode == "http":
+        provision = provision_http_fetcher
+        restart_driver = None
+    supervisor_options = {
+        "restart_driver": restart_driver,
+        "recycle_pages": recycle_pages,
+        "recycle_rss_bytes": recycle_rss_mb * 1024 * 1024,
+    }
 
-    driver = provision_webdriver()
-    filename = initialize_csv(filename)
-    scrape_pages(driver, filename, pages_to_scrape)
-    driver.quit()
+    if fetch_mode == "replay":
+        # Nothing to start, the cache hands out the saved pages
+        driver = html_cache
+        supervisor_options["restart_driver"] = None
+    else:
+        # One browser is a pool of one too, so the browser it is swapped for
+        # after a recycle or a restart is the one quit at the end
+        driver = DriverPool.provision(workers, provision, **supervisor_options)
+    try:
+        scrape_to_output(
+            driver,
+            input_name=filename,
+            pages_to_scrape=pages_to_scrape,
+            output_format=output_format,
+            resume="resume" in options,
+            delta="delta" in options,
+            wait_ceiling=wait_ceiling,
+            parse_workers=parse_workers,
+            fetch_mode=fetch_mode,
+            page_parser=make_page_parser(parser, strain_cards),
+            extract_mode=extract_mode,
+            html_cache=html_cache,
+            rate_controller=rate_controller,
+            max_empty_pages=max_empty_pages,
+            normalizer=Normalizer() if "normalize" in options else None,
+            **supervisor_options,
+        )
+    finally:
+        # Even a run that blew up closes its browsers, no Chrome left behind
+        driver.quit()
+        if html_cache is not None and html_cache is not driver:
+            html_cache.quit()
+
+
+# Everything between starting the browsers and quitting them, so main can
+# quit them whatever happens in here
+def scrape_to_output(
+    driver,
+    input_name,
+    pages_to_scrape,
+    output_format=DEFAULT_OUTPUT_FORMAT,
+    resume=False,
+    delta=False,
+    **scrape_options,
+):
+    if pages_to_scrape is None:
+        pages_to_scrape = discover_pages_to_scrape(
+            driver,
+            scrape_options.get("fetch_mode", DEFAULT_FETCH_MODE),
+            scrape_options.get("wait_ceiling", DEFAULT_WAIT_CEILING),
+        )
+    fields = RealtorData._fields
+    if delta:
+        if resume:
+            LOGGER.warning("--resume can't be used with --delta, starting over")
+            resume = False
+        fields = DELTA_FIELDS
+    filename, journal, sink = open_output(input_name, output_format, resume, fields)
+    if delta:
+        sink = DeltaSink(
+            sink,
+            PageFingerprints.for_output(input_name),
+            pages_to_scrape,
+            RealtorData._fields.index("name"),
+            RealtorData._fields.index("number"),
+        )
+    try:
+        scrape_pages(
+            driver,
+            filename,
+            pages_to_scrape,
+            journal=journal,
+            sink=sink,
+            metrics_path=input_name,
+            **scrape_options,
+        )
+    finally:
+        # Whatever rows made it to the sink are flushed to the file
+        sink.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,594 @@
+import csv
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+from src import scraper
+from src.cli import check_input_positive_int, check_input_workers, split_cli_args
+from src.parse import RealtorData
+from src.sinks import StreamingCsvWriter
+
+# Splits a crawl into page ranges that workers on any number of hosts lease
+# from one coordinator, a SQLite file on a shared volume or the same file
+# served over http. Run from the top level dir of the project:
+#   python -m src.shard plan coordinator.db 5000 --range-pages=50
+#   python -m src.shard work coordinator.db shards/ --workers=4
+#   python -m src.shard merge coordinator.db shards/ realtor_data
+#   python -m src.shard serve coordinator.db --port=8765
+# and workers elsewhere use http://host:8765 as the coordinator
+DEFAULT_RANGE_PAGES = 50
+# A worker that stops renewing for this long is taken to be dead and its
+# range goes back in the queue
+DEFAULT_LEASE_SECONDS = 300
+# Leases are renewed this many times per lease, so one slow renew is not fatal
+RENEWS_PER_LEASE = 3
+# A range that failed this many times is given up on instead of looping forever
+MAX_ATTEMPTS = 3
+# How often a worker with nothing to lease checks whether a lease expired
+POLL_SECONDS = 5
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+HTTP_TIMEOUT = 30
+SHARD_PREFIX = "shard"
+CLI_OPTIONS = [
+    "range-pages",
+    "worker",
+    "lease-seconds",
+    "poll-seconds",
+    "host",
+    "port",
+    "workers",
+    "fetch",
+    "profile",
+    "parser",
+    "strain-cards",
+    "wait-ceiling",
+]
+
+LOGGER = logging.getLogger("scraper")
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class LeaseCoordinator:
+    # One row per page range: pending, leased to a worker until lease_expires,
+    # done, or failed once it ran out of attempts
+    def __init__(self, path):
+        self.path = path
+        # The http server calls in from several threads on one connection
+        self.lock = threading.Lock()
+        try:
+            self.connection = sqlite3.connect(
+                path, isolation_level=None, check_same_thread=False, timeout=30
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS ranges ("
+                "range_id INTEGER PRIMARY KEY, first_page INTEGER, last_page INTEGER, "
+                "state TEXT DEFAULT 'pending', worker TEXT, lease_expires REAL, "
+                "attempts INTEGER DEFAULT 0)"
+            )
+        except sqlite3.Error as e:
+            LOGGER.critical(f"Can't open the coordinator: {e}")
+            sys.exit()
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can't
+        # both see a range as free and lease it
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def plan(self, pages_to_scrape, range_pages=DEFAULT_RANGE_PAGES):
+        # Planning twice is a no-op, so every host can run the same script
+        with self.transaction() as connection:
+            (planned,) = connection.execute("SELECT count(*) FROM ranges").fetchone()
+            if planned:
+                LOGGER.info(f"Already planned as {planned} ranges")
+                return planned
+            ranges = [
+                (first_page, min(first_page + range_pages - 1, pages_to_scrape))
+                for first_page in range(1, pages_to_scrape + 1, range_pages)
+            ]
+            connection.executemany(
+                "INSERT INTO ranges (first_page, last_page) VALUES (?, ?)", ranges
+            )
+        LOGGER.info(f"Planned {pages_to_scrape} pages as {len(ranges)} ranges")
+        return len(ranges)
+
+    def lease(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        # The first pending range, or one whose worker stopped renewing.
+        # None when there is nothing to lease right now
+        now = time.time()
+        with self.transaction() as connection:
+            expired = connection.execute(
+                "SELECT first_page, last_page, worker FROM ranges "
+                "WHERE state = 'leased' AND lease_expires < ?",
+                (now,),
+            ).fetchall()
+            for first_page, last_page, dead_worker in expired:
+                LOGGER.warning(
+                    f"Lease on pages {first_page} to {last_page} held by "
+                    f"{dead_worker} expired, putting them back in the queue"
+                )
+            connection.execute(
+                "UPDATE ranges SET state = 'pending', worker = NULL "
+                "WHERE state = 'leased' AND lease_expires < ?",
+                (now,),
+            )
+            connection.execute(
+                "UPDATE ranges SET state = 'failed' "
+                "WHERE state = 'pending' AND attempts >= ?",
+                (MAX_ATTEMPTS,),
+            )
+            row = connection.execute(
+                "SELECT range_id, first_page, last_page FROM ranges "
+                "WHERE state = 'pending' ORDER BY range_id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE ranges SET state = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE range_id = ?",
+                (worker, now + lease_seconds, row[0]),
+            )
+        return {"range_id": row[0], "first_page": row[1], "last_page": row[2]}
+
+    def update_lease(self, range_id, worker, assignments, values=()):
+        # Only the worker holding the lease can change it, False if that
+        # isn't this one any more
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                f"UPDATE ranges SET {assignments} "
+                "WHERE range_id = ? AND worker = ? AND state = 'leased'",
+                (*values, range_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, range_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return self.update_lease(
+            range_id, worker, "lease_expires = ?", (time.time() + lease_seconds,)
+        )
+
+    def complete(self, range_id, worker):
+        return self.update_lease(range_id, worker, "state = 'done'")
+
+    def release(self, range_id, worker):
+        # Handed back after a failure, the next lease counts as another attempt
+        return self.update_lease(range_id, worker, "state = 'pending', worker = NULL")
+
+    def ranges(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT range_id, first_page, last_page, state, worker, attempts "
+                "FROM ranges ORDER BY first_page"
+            ).fetchall()
+        fields = ["range_id", "first_page", "last_page", "state", "worker", "attempts"]
+        return [dict(zip(fields, row)) for row in rows]
+
+    def status(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT state, count(*) FROM ranges GROUP BY state"
+            ).fetchall()
+        return dict(rows)
+
+    def finished(self):
+        # Nothing pending and nothing leased, done or failed is all that's left
+        status = self.status()
+        return not status.get("pending") and not status.get("leased")
+
+    def close(self):
+        self.connection.close()
+
+
+class HttpCoordinator:
+    # Same methods as LeaseCoordinator, for hosts without the shared volume
+    def __init__(self, url):
+        # Only hosts without the shared volume need requests
+        import requests
+
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def call(self, method, **kwargs):
+        response = self.session.post(
+            f"{self.url}/{method}", json=kwargs, timeout=HTTP_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()["result"]
+
+    def plan(self, pages_to_scrape, range_pages=DEFAULT_RANGE_PAGES):
+        return self.call(
+            "plan", pages_to_scrape=pages_to_scrape, range_pages=range_pages
+        )
+
+    def lease(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return self.call("lease", worker=worker, lease_seconds=lease_seconds)
+
+    def renew(self, range_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return self.call(
+            "renew", range_id=range_id, worker=worker, lease_seconds=lease_seconds
+        )
+
+    def complete(self, range_id, worker):
+        return self.call("complete", range_id=range_id, worker=worker)
+
+    def release(self, range_id, worker):
+        return self.call("release", range_id=range_id, worker=worker)
+
+    def ranges(self):
+        return self.call("ranges")
+
+    def status(self):
+        return self.call("status")
+
+    def finished(self):
+        return self.call("finished")
+
+    def close(self):
+        self.session.close()
+
+
+# What the http coordinator lets clients call
+COORDINATOR_METHODS = [
+    "plan",
+    "lease",
+    "renew",
+    "complete",
+    "release",
+    "ranges",
+    "status",
+    "finished",
+]
+
+
+def make_coordinator_server(coordinator, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            method = self.path.strip("/")
+            if method not in COORDINATOR_METHODS:
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                kwargs = json.loads(self.rfile.read(length) or b"{}")
+                result = getattr(coordinator, method)(**kwargs)
+            except (TypeError, ValueError, sqlite3.Error) as e:
+                LOGGER.error(f"Coordinator call {method} failed: {e}")
+                self.send_error(400, str(e))
+                return
+            body = json.dumps({"result": result}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def open_coordinator(location):
+    if location.startswith(("http://", "https://")):
+        return HttpCoordinator(location)
+    return LeaseCoordinator(location)
+
+
+def shard_path(shard_dir, first_page, last_page):
+    # Zero padded, so the shards also sort in page order by name
+    return os.path.join(
+        shard_dir, f"{SHARD_PREFIX}-{first_page:07d}-{last_page:07d}.csv"
+    )
+
+
+class LeaseKeeper:
+    # Renews a lease in the background while its range is scraped
+    def __init__(self, coordinator, lease, worker, lease_seconds):
+        self.coordinator = coordinator
+        self.lease = lease
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="lease", daemon=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.lease_seconds / RENEWS_PER_LEASE):
+            try:
+                renewed = self.coordinator.renew(
+                    self.lease["range_id"], self.worker, self.lease_seconds
+                )
+            # requests' errors are OSErrors, so the http coordinator's are caught too
+            except (OSError, sqlite3.Error) as e:
+                # The lease may still be good, the next renew can tell
+                LOGGER.error(f"Could not renew lease: {e}")
+                continue
+            if not renewed:
+                LOGGER.warning(
+                    f"Lost the lease on pages {self.lease['first_page']} to "
+                    f"{self.lease['last_page']}, another worker has them"
+                )
+                self.lost = True
+                return
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+
+class LeaseSink:
+    # Stops the scrape at the next page once the lease is gone
+    def __init__(self, sink, lease_keeper):
+        self.sink = sink
+        self.lease_keeper = lease_keeper
+
+    def write_page(self, page_num, page_data):
+        if self.lease_keeper.lost:
+            raise LeaseLost(f"Lease lost before page {page_num}")
+        self.sink.write_page(page_num, page_data)
+
+    def checkpoint(self, page_nums):
+        self.sink.checkpoint(page_nums)
+
+    def close(self):
+        self.sink.close()
+
+
+def scrape_range(
+    scrape_pages,
+    driver,
+    coordinator,
+    lease,
+    worker,
+    shard_dir,
+    lease_seconds=DEFAULT_LEASE_SECONDS,
+    **scrape_options,
+):
+    # Written under a name of its own and only moved into place once every
+    # page is in, so a half done shard is never merged
+    path = shard_path(shard_dir, lease["first_page"], lease["last_page"])
+    temp_path = f"{path}.{worker}.tmp"
+    sink = StreamingCsvWriter(temp_path, header=RealtorData._fields)
+    lease_keeper = LeaseKeeper(coordinator, lease, worker, lease_seconds).start()
+    try:
+        try:
+            scrape_pages(
+                driver,
+                temp_path,
+                lease["last_page"],
+                first_page=lease["first_page"],
+                sink=LeaseSink(sink, lease_keeper),
+                **scrape_options,
+            )
+        finally:
+            sink.close()
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    finally:
+        lease_keeper.stop()
+    os.replace(temp_path, path)
+    return coordinator.complete(lease["range_id"], worker)
+
+
+def run_worker(
+    scrape_pages,
+    driver,
+    coordinator,
+    worker,
+    shard_dir,
+    lease_seconds=DEFAULT_LEASE_SECONDS,
+    poll_seconds=POLL_SECONDS,
+    **scrape_options,
+):
+    # Leases ranges until there are none left anywhere. While other workers
+    # still hold leases it keeps polling, one of them may die
+    os.makedirs(shard_dir, exist_ok=True)
+    ranges_done = 0
+    while True:
+        lease = coordinator.lease(worker, lease_seconds)
+        if lease is None:
+            if coordinator.finished():
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        LOGGER.info(
+            f"{worker} leased pages {lease['first_page']} to {lease['last_page']}"
+        )
+        try:
+            completed = scrape_range(
+                scrape_pages,
+                driver,
+                coordinator,
+                lease,
+                worker,
+                shard_dir,
+                lease_seconds,
+                **scrape_options,
+            )
+        except LeaseLost as e:
+            LOGGER.warning(f"{worker} gave up on pages: {e}")
+            continue
+        except Exception as e:
+            LOGGER.error(
+                f"Pages {lease['first_page']} to {lease['last_page']} failed on "
+                f"{worker}, handing them back: {e}"
+            )
+            coordinator.release(lease["range_id"], worker)
+            continue
+        if completed:
+            ranges_done += 1
+
+    LOGGER.info(f"{worker} is done after {ranges_done} ranges: {coordinator.status()}")
+    return ranges_done
+
+
+def merge_shards(coordinator, shard_dir, output_path):
+    ranges = coordinator.ranges()
+    not_done = [page_range for page_range in ranges if page_range["state"] != "done"]
+    if not_done:
+        LOGGER.critical(
+            f"{len(not_done)} of {len(ranges)} ranges are not done, "
+            f"starting with pages {not_done[0]['first_page']} to "
+            f"{not_done[0]['last_page']} ({not_done[0]['state']})"
+        )
+        sys.exit()
+
+    temp_path = f"{output_path}.tmp"
+    # newline="" copies the shards' \r\n line endings as they are, the header
+    # comes out of the csv module the same as theirs
+    with open(temp_path, "w", newline="") as output:
+        csv.writer(output).writerow(RealtorData._fields)
+        for page_range in ranges:
+            path = shard_path(
+                shard_dir, page_range["first_page"], page_range["last_page"]
+            )
+            with open(path, newline="") as shard:
+                # Every shard has its own header
+                shard.readline()
+                shutil.copyfileobj(shard, output)
+    os.replace(temp_path, output_path)
+    LOGGER.info(f"Merged {len(ranges)} shards into {output_path}")
+    return output_path
+
+
+def work(coordinator, shard_dir, options):
+    # Only workers need the site config, the coordinator host and the merge don't
+    try:
+        scraper.load_config()
+    except LookupError as e:
+        LOGGER.critical(f"Can't start the worker: {e}")
+        sys.exit()
+
+    worker = options.get("worker") or f"{socket.gethostname()}-{os.getpid()}"
+    lease_seconds = DEFAULT_LEASE_SECONDS
+    if "lease-seconds" in options:
+        lease_seconds = scraper.check_input_seconds(
+            options["lease-seconds"], DEFAULT_LEASE_SECONDS
+        )
+    poll_seconds = POLL_SECONDS
+    if "poll-seconds" in options:
+        poll_seconds = scraper.check_input_seconds(
+            options["poll-seconds"], POLL_SECONDS
+        )
+    workers = scraper.DEFAULT_WORKERS
+    if "workers" in options:
+        workers = check_input_workers(options["workers"], scraper.DEFAULT_WORKERS)
+    fetch_mode = scraper.DEFAULT_FETCH_MODE
+    if "fetch" in options:
+        fetch_mode = scraper.check_input_fetch_mode(options["fetch"])
+    profile = scraper.DEFAULT_BROWSER_PROFILE
+    if "profile" in options:
+        profile = scraper.check_input_profile(options["profile"])
+    parser = scraper.DEFAULT_PARSER
+    if "parser" in options:
+        parser = scraper.check_input_parser(options["parser"])
+    wait_ceiling = scraper.DEFAULT_WAIT_CEILING
+    if "wait-ceiling" in options:
+        wait_ceiling = scraper.check_input_seconds(
+            options["wait-ceiling"], scraper.DEFAULT_WAIT_CEILING
+        )
+
+    provision = partial(scraper.provision_webdriver, profile=profile)
+    restart_driver = partial(scraper.start_webdriver, profile=profile)
+    if fetch_mode == "http":
+        provision = scraper.provision_http_fetcher
+        restart_driver = None
+    driver = scraper.DriverPool.provision(
+        workers,
+        provision,
+        restart_driver=restart_driver,
+        recycle_pages=scraper.DEFAULT_RECYCLE_PAGES,
+        recycle_rss_bytes=scraper.DEFAULT_RECYCLE_RSS_MB * 1024 * 1024,
+    )
+    try:
+        return run_worker(
+            scraper.scrape_pages,
+            driver,
+            coordinator,
+            worker,
+            shard_dir,
+            lease_seconds,
+            poll_seconds,
+            wait_ceiling=wait_ceiling,
+            fetch_mode=fetch_mode,
+            page_parser=scraper.make_page_parser(parser, "strain-cards" in options),
+        )
+    finally:
+        driver.quit()
+
+
+def main():
+    args, options = split_cli_args(sys.argv, CLI_OPTIONS)
+    command = args[1] if len(args) > 1 else None
+    scraper.setup_logging()
+    usage = {
+        "plan": "plan <coordinator> <pages>",
+        "work": "work <coordinator> <shard dir>",
+        "merge": "merge <coordinator> <shard dir> <file name>",
+        "serve": "serve <coordinator file>",
+    }
+    expected_args = {"plan": 4, "work": 4, "merge": 5, "serve": 3}
+    if command not in usage or len(args) != expected_args[command]:
+        LOGGER.critical(f"Usage: one of {list(usage.values())}")
+        sys.exit()
+
+    coordinator = open_coordinator(args[2])
+    if command == "plan":
+        if not args[3].isdigit() or int(args[3]) == 0:
+            LOGGER.critical(f"Seems like you entered an invalid number: {args[3]}")
+            sys.exit()
+        range_pages = DEFAULT_RANGE_PAGES
+        if "range-pages" in options:
+            range_pages = check_input_positive_int(
+                options["range-pages"], DEFAULT_RANGE_PAGES, "number of pages per range"
+            )
+        coordinator.plan(int(args[3]), range_pages)
+    elif command == "work":
+        work(coordinator, args[3], options)
+    elif command == "merge":
+        merge_shards(coordinator, args[3], f"{args[4]}.csv")
+    elif command == "serve":
+        port = DEFAULT_PORT
+        if "port" in options:
+            port = check_input_positive_int(options["port"], DEFAULT_PORT, "port")
+        server = make_coordinator_server(
+            coordinator, options.get("host") or DEFAULT_HOST, port
+        )
+        LOGGER.info(f"Coordinator for {args[2]} on {server.server_address}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    coordinator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import io
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from csv import writer
+from datetime import datetime, timezone
+from queue import Empty, Full, Queue
+
+FLUSH_ROWS = 1000
+FLUSH_BYTES = 1024 * 1024
+FLUSH_SECONDS = 5
+QUEUE_PAGES = 16
+PUT_TIMEOUT = 0.5
+NON_DIGITS = re.compile(r"\D")
+ROW_GROUP_ROWS = 64 * 1024
+# Few distinct values across a whole run, stored once per row group
+DICTIONARY_FIELDS = ["change", "role", "company", "address"]
+
+LOGGER = logging.getLogger("scraper")
+
+
+class BatchSink:
+    # Holds pages until the checkpoint and hands the whole batch to
+    # write(batch_pages, batch_data), how the scraper wrote before streaming
+    def __init__(self, write):
+        self.write = write
+        self.batch_pages = []
+        self.batch_data = []
+
+    def write_page(self, page_num, page_data):
+        self.batch_pages.append(page_num)
+        self.batch_data.append(page_data)
+
+    def checkpoint(self, page_nums):
+        if self.batch_data:
+            self.write(self.batch_pages, self.batch_data)
+        self.batch_pages = []
+        self.batch_data = []
+
+    def close(self):
+        pass
+
+
+class StreamingCsvWriter:
+    # Keeps the output open for the whole run and writes rows from its own
+    # thread, so the scraper only holds the pages still queued here.
+    # Rows are buffered in memory and written out once there are flush_rows
+    # of them, flush_bytes of them, or flush_seconds have gone by. fsync only
+    # happens at checkpoints, right before the journal commits the batch
+    def __init__(
+        self,
+        filename,
+        journal=None,
+        header=None,
+        flush_rows=FLUSH_ROWS,
+        flush_bytes=FLUSH_BYTES,
+        flush_seconds=FLUSH_SECONDS,
+        queue_pages=QUEUE_PAGES,
+    ):
+        self.filename = filename
+        self.journal = journal
+        self.flush_rows = flush_rows
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        try:
+            # With a header the file is started over, otherwise rows are added
+            if header is None:
+                self.file = open(filename, "a")
+            else:
+                self.file = open(filename, "w")
+                writer(self.file).writerow(header)
+        except (FileNotFoundError, PermissionError, IOError, Exception) as e:
+            LOGGER.critical(f"Can't write to file: {e}")
+            sys.exit()
+        self.buffer = io.StringIO()
+        self.csv_writer = writer(self.buffer)
+        self.buffered_rows = 0
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+        self.flushes = 0
+        self.fsyncs = 0
+        self.error = None
+        self.queue = Queue(maxsize=queue_pages)
+        self.thread = threading.Thread(target=self.run, name="csv-writer", daemon=True)
+        self.thread.start()
+
+    def write_page(self, page_num, page_data):
+        self.put(("page", page_num, page_data))
+
+    def checkpoint(self, page_nums):
+        self.put(("checkpoint", list(page_nums)))
+
+    def close(self):
+        if self.thread.is_alive():
+            self.put(("close",))
+            self.thread.join()
+        self.file.close()
+        self.check_error()
+        LOGGER.info(
+            f"Wrote {self.rows_written} rows in {self.flushes} writes "
+            f"with {self.fsyncs} fsyncs"
+        )
+
+    def put(self, item):
+        # A full queue holds the scraper back, unless the writer thread died
+        while True:
+            self.check_error()
+            try:
+                self.queue.put(item, timeout=PUT_TIMEOUT)
+                return
+            except Full:
+                continue
+
+    def check_error(self):
+        if self.error is not None:
+            LOGGER.critical(f"Can't write to file: {self.error}")
+            sys.exit()
+
+    def run(self):
+        try:
+            while True:
+                timeout = None
+                if self.buffered_rows:
+                    elapsed = time.monotonic() - self.last_flush
+                    timeout = max(0, self.flush_seconds - elapsed)
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except Empty:
+                    self.flush()
+                    continue
+
+                if item[0] == "page":
+                    self.csv_writer.writerows(item[2])
+                    self.buffered_rows += len(item[2])
+                    if self.should_flush():
+                        self.flush()
+                elif item[0] == "checkpoint":
+                    self.commit(item[1])
+                else:
+                    self.flush()
+                    return
+        except Exception as e:
+            self.error = e
+
+    def should_flush(self):
+        return (
+            self.buffered_rows >= self.flush_rows
+            or self.buffer.tell() >= self.flush_bytes
+            or time.monotonic() - self.last_flush >= self.flush_seconds
+        )
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffered_rows:
+            return
+        self.file.write(self.buffer.getvalue())
+        self.file.flush()
+        self.rows_written += self.buffered_rows
+        self.flushes += 1
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.buffered_rows = 0
+
+    def commit(self, page_nums):
+        self.flush()
+        os.fsync(self.file.fileno())
+        self.fsyncs += 1
+        if self.journal is not None:
+            output_bytes = os.fstat(self.file.fileno()).st_size
+            self.journal.commit_batch(page_nums, output_bytes)
+        if page_nums:
+            LOGGER.info(f"Checkpointed pages {page_nums[0]} to {page_nums[-1]}")
+
+
+def realtor_key(name, number):
+    # Case, spacing and phone formatting differ between pages for the same person
+    return f"{' '.join(name.lower().split())}|{NON_DIGITS.sub('', number)}"
+
+
+# What a card missing both name and number keys to, it can't be told apart
+# from another so it is never matched on
+BLANK_KEY = realtor_key("", "")
+
+
+class SqliteSink:
+    # One row per realtor, keyed on their normalized name and number. Every
+    # batch is one transaction, and a realtor seen again, on another page or in
+    # a later run, is updated in place with a new last_seen. A card without a
+    # name or number gets a NULL key, a row of its own every time
+    def __init__(self, filename, fields):
+        self.filename = filename
+        self.fields = list(fields)
+        self.name_index = self.fields.index("name")
+        self.number_index = self.fields.index("number")
+        # Every row of a run gets the time it started, so a run is one last_seen
+        self.seen_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.rows_written = 0
+        self.in_transaction = False
+
+        columns = ", ".join(f"{field} TEXT" for field in self.fields)
+        updates = ", ".join(f"{field} = excluded.{field}" for field in self.fields)
+        self.upsert = (
+            f"INSERT INTO realtors ({', '.join(self.fields)}, realtor_key, page, "
+            f"first_seen, last_seen) VALUES ({', '.join('?' * len(self.fields))}, "
+            f"?, ?, ?, ?) ON CONFLICT (realtor_key) DO UPDATE SET {updates}, "
+            "page = excluded.page, last_seen = excluded.last_seen"
+        )
+        try:
+            # The pipeline writes from its own thread, one at a time
+            self.connection = sqlite3.connect(
+                filename, isolation_level=None, check_same_thread=False
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            # With WAL a power cut can lose the last batches but can't corrupt
+            # the file, so commits don't have to wait on a sync
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            existing_columns = list(
+                self.connection.execute("PRAGMA table_info(realtors)")
+            )
+            existing_fields = [column[1] for column in existing_columns]
+            # Older tables have a NOT NULL realtor_key, blank cards can't go in
+            if existing_columns and (
+                existing_fields[: len(self.fields)] != self.fields
+                or any(column[3] for column in existing_columns)
+            ):
+                LOGGER.critical(
+                    f"{filename} has the columns {existing_fields}, "
+                    f"this run writes {self.fields}, use another file name"
+                )
+                sys.exit()
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS realtors ({columns}, "
+                "realtor_key TEXT, page INTEGER, "
+                "first_seen TEXT, last_seen TEXT)"
+            )
+            self.connection.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS realtors_key "
+                "ON realtors (realtor_key)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS realtors_last_seen ON realtors (last_seen)"
+            )
+        except sqlite3.Error as e:
+            LOGGER.critical(f"Can't write to database: {e}")
+            sys.exit()
+
+    def write_page(self, page_num, page_data):
+        if not self.in_transaction:
+            self.connection.execute("BEGIN")
+            self.in_transaction = True
+        rows = []
+        for row in page_data:
+            key = realtor_key(row[self.name_index], row[self.number_index])
+            # NULLs never conflict in a unique index
+            if key == BLANK_KEY:
+                key = None
+            rows.append((*row, key, page_num, self.seen_at, self.seen_at))
+        self.connection.executemany(self.upsert, rows)
+        self.rows_written += len(page_data)
+
+    def checkpoint(self, page_nums):
+        if self.in_transaction:
+            self.connection.execute("COMMIT")
+            self.in_transaction = False
+        if page_nums:
+            LOGGER.info(f"Committed pages {page_nums[0]} to {page_nums[-1]}")
+
+    def close(self):
+        # Rows are only ever upserted, so a batch cut short is still kept
+        self.checkpoint([])
+        (realtors,) = self.connection.execute(
+            "SELECT count(*) FROM realtors"
+        ).fetchone()
+        self.connection.close()
+        LOGGER.info(f"Upserted {self.rows_written} rows, {realtors} realtors in total")
+
+
+class ParquetSink:
+    # Columnar output, rows are gathered into one list per field and written
+    # out as a row group every row_group_rows rows. pyarrow is only needed for
+    # this output, check_input_output_format makes sure it is installed
+    def __init__(self, filename, fields, row_group_rows=ROW_GROUP_ROWS):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.filename = filename
+        self.fields = list(fields)
+        self.row_group_rows = row_group_rows
+        self.columns = [[] for _ in self.fields]
+        self.buffered_rows = 0
+        self.rows_written = 0
+        self.row_groups = 0
+
+        # Repetitive columns load back as dictionary arrays too, not just
+        # dictionary encoded on disk
+        self.schema = pyarrow.schema(
+            [
+                (
+                    field,
+                    pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+                    if field in DICTIONARY_FIELDS
+                    else pyarrow.string(),
+                )
+                for field in self.fields
+            ]
+        )
+        try:
+            self.writer = pyarrow.parquet.ParquetWriter(
+                filename, self.schema, use_dictionary=True, compression="zstd"
+            )
+        except (OSError, pyarrow.ArrowException) as e:
+            LOGGER.critical(f"Can't write to file: {e}")
+            sys.exit()
+
+    def write_page(self, page_num, page_data):
+        for row in page_data:
+            for column, value in zip(self.columns, row):
+                column.append(value)
+        self.buffered_rows += len(page_data)
+        if self.buffered_rows >= self.row_group_rows:
+            self.write_row_group()
+
+    def checkpoint(self, page_nums):
+        # The file is only readable once its footer is written in close(), so
+        # batches don't cut row groups short
+        pass
+
+    def write_row_group(self):
+        if not self.buffered_rows:
+            return
+        table = self.pyarrow.Table.from_arrays(
+            [
+                self.pyarrow.array(column, type=field.type)
+                for column, field in zip(self.columns, self.schema)
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_table(table, row_group_size=self.buffered_rows)
+        self.rows_written += self.buffered_rows
+        self.row_groups += 1
+        self.columns = [[] for _ in self.fields]
+        self.buffered_rows = 0
+
+    def close(self):
+        self.write_row_group()
+        self.writer.close()
+        LOGGER.info(f"Wrote {self.rows_written} rows in {self.row_groups} row groups")
@@ -0,0 +1,122 @@
+import logging
+import time
+
+from src.metrics import driver_pid, process_tree_rss_bytes
+
+DEFAULT_RETRIES = 3
+# Seconds before the first retry of a page, doubled every retry after that
+DEFAULT_BACKOFF = 1
+# Reading the browser's RSS walks /proc, so only every this many pages
+RSS_CHECK_PAGES = 10
+
+LOGGER = logging.getLogger("scraper")
+
+
+def is_browser_error(error):
+    # Errors that can be the browser's fault rather than the page's. Only
+    # asked with a browser to restart, so http and replay runs never load Selenium
+    from selenium.common.exceptions import WebDriverException
+
+    return isinstance(error, WebDriverException)
+
+
+def session_alive(driver):
+    try:
+        driver.window_handles
+    except Exception:
+        return False
+    return True
+
+
+def quit_driver(driver):
+    # A dead session usually fails to quit too, that can't stop the run
+    try:
+        driver.quit()
+    except Exception as e:
+        LOGGER.error(f"Could not quit driver {driver}: {e}")
+
+
+class DriverSupervisor:
+    # Looks after one driver of a pool. Without restart_driver it only renders,
+    # with it a driver is swapped for a new one after recycle_pages pages,
+    # once its process tree is past recycle_rss_bytes, or when its session
+    # dies, and pages that failed in the browser are retried with backoff
+    def __init__(
+        self,
+        driver,
+        restart_driver=None,
+        recycle_pages=None,
+        recycle_rss_bytes=None,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+    ):
+        self.driver = driver
+        self.restart_driver = restart_driver
+        self.recycle_pages = recycle_pages
+        self.recycle_rss_bytes = recycle_rss_bytes
+        self.retries = retries
+        self.backoff = backoff
+        # Pages rendered by the current driver
+        self.pages = 0
+        self.recycles = 0
+        self.restarts = 0
+
+    def render(self, render, page_num):
+        for attempt in range(self.retries + 1):
+            try:
+                if self.driver is None:
+                    self.start_driver()
+                elif self.due_for_recycle():
+                    LOGGER.info(f"Recycling driver after {self.pages} pages")
+                    self.recycles += 1
+                    self.stop_driver()
+                    self.start_driver()
+                page_data = render(self.driver, page_num)
+            except Exception as e:
+                if (
+                    self.restart_driver is None
+                    or attempt == self.retries
+                    or not is_browser_error(e)
+                ):
+                    raise e
+                if self.driver is not None and not session_alive(self.driver):
+                    LOGGER.warning(f"Driver session died on page {page_num}: {e}")
+                    self.restarts += 1
+                    self.stop_driver()
+                delay = self.backoff * 2**attempt
+                LOGGER.warning(
+                    f"Retrying page {page_num} in {delay}s, "
+                    f"attempt {attempt + 2} of {self.retries + 1}"
+                )
+                time.sleep(delay)
+                continue
+            self.pages += 1
+            return page_data
+
+    def due_for_recycle(self):
+        if self.restart_driver is None or self.pages == 0:
+            return False
+        if self.recycle_pages is not None and self.pages >= self.recycle_pages:
+            return True
+        if self.recycle_rss_bytes is None or self.pages % RSS_CHECK_PAGES:
+            return False
+        pid = driver_pid(self.driver)
+        if pid is None:
+            return False
+        rss_bytes = process_tree_rss_bytes(pid)
+        if rss_bytes > self.recycle_rss_bytes:
+            LOGGER.info(f"Driver is using {rss_bytes / 1024 / 1024:.0f}MB")
+            return True
+        return False
+
+    def start_driver(self):
+        self.driver = self.restart_driver()
+        self.pages = 0
+
+    def stop_driver(self):
+        driver, self.driver = self.driver, None
+        quit_driver(driver)
+
+    def quit(self):
+        if self.driver is not None:
+            self.stop_driver()
@@ -0,0 +1,161 @@
+from collections import deque
+import logging
+import threading
+import time
+
+# Used to be a fixed time.sleep(8), so keep that as the upper bound
+DEFAULT_WAIT_CEILING = 8
+MIN_WAIT_CEILING = 1
+POLL_INTERVAL = 0.25
+STABLE_POLLS = 2
+# Ceiling only adapts once we have seen enough pages
+MIN_SAMPLES = 5
+SAMPLE_WINDOW = 100
+CEILING_HEADROOM = 2
+
+CARD_SELECTOR = "div[id^='RealtorCard-']"
+# The pager is server rendered, so it is there before any card is
+PAGER_CURRENT_SELECTOR = ".paginationCurrentPage"
+PAGER_TOTAL_SELECTOR = ".paginationTotalPagesNum"
+
+LOGGER = logging.getLogger("scraper")
+
+
+def read_pager_number(driver, by, selector):
+    for element in driver.find_elements(by, selector):
+        text = element.text.strip().replace(",", "")
+        if text.isdigit():
+            return int(text)
+    return None
+
+
+def past_last_page(driver, by):
+    # A page past the end never gets cards, there is nothing to wait for
+    current_page = read_pager_number(driver, by, PAGER_CURRENT_SELECTOR)
+    total_pages = read_pager_number(driver, by, PAGER_TOTAL_SELECTOR)
+    if current_page is None or total_pages is None:
+        return False
+    return current_page > total_pages
+
+
+class CardsSettled:
+    # Condition for WebDriverWait, true once cards exist and the count has not
+    # changed for stable_polls polls in a row, or straight away on a page the
+    # pager says is past the last one. The count is left in last_count
+    def __init__(self, stable_polls=STABLE_POLLS):
+        self.stable_polls = stable_polls
+        self.last_count = None
+        self.unchanged_polls = 0
+
+    def __call__(self, driver):
+        # Selenium is only imported once there is a browser to wait on
+        from selenium.webdriver.common.by import By
+
+        card_count = len(driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR))
+
+        if card_count > 0 and card_count == self.last_count:
+            self.unchanged_polls += 1
+        else:
+            self.unchanged_polls = 0
+        self.last_count = card_count
+
+        if card_count == 0:
+            return past_last_page(driver, By.CSS_SELECTOR)
+        return self.unchanged_polls >= self.stable_polls
+
+
+class WaitStats:
+    def __init__(
+        self,
+        ceiling=DEFAULT_WAIT_CEILING,
+        floor=MIN_WAIT_CEILING,
+        headroom=CEILING_HEADROOM,
+        window=SAMPLE_WINDOW,
+    ):
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.headroom = headroom
+        self.samples = deque(maxlen=window)
+        self.pages = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        # Shared by every render worker in a pool
+        self.lock = threading.Lock()
+
+    def record(self, seconds, timed_out=False):
+        with self.lock:
+            self.samples.append(seconds)
+            self.pages += 1
+            self.total_wait += seconds
+            if timed_out:
+                self.timeouts += 1
+
+    def percentile(self, fraction):
+        with self.lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(fraction * len(ordered)))
+        return ordered[index]
+
+    def current_ceiling(self):
+        # Until we have a few samples, wait as long as we are allowed to.
+        # After that, give the slow pages (p95) some headroom, a timed out page
+        # is recorded at the ceiling it hit so the ceiling grows back on its own
+        if len(self.samples) < MIN_SAMPLES:
+            return self.ceiling
+        adaptive = self.percentile(0.95) * self.headroom
+        return max(self.floor, min(self.ceiling, adaptive))
+
+    def summary(self):
+        return {
+            "pages": self.pages,
+            "timeouts": self.timeouts,
+            "mean": round(self.total_wait / self.pages, 3) if self.pages else 0.0,
+            "p50": round(self.percentile(0.5), 3),
+            "p95": round(self.percentile(0.95), 3),
+            "max": round(self.percentile(1), 3),
+            "ceiling": round(self.current_ceiling(), 3),
+        }
+
+
+def wait_for_cards(
+    driver, wait_stats, poll_interval=POLL_INTERVAL, stable_polls=STABLE_POLLS
+):
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.wait import WebDriverWait
+
+    timeout = wait_stats.current_ceiling()
+    condition = CardsSettled(stable_polls)
+    timed_out = False
+    start = time.perf_counter()
+
+    try:
+        settled = WebDriverWait(driver, timeout, poll_frequency=poll_interval).until(
+            condition
+        )
+    except TimeoutException:
+        settled = False
+    if not settled and timeout < wait_stats.ceiling:
+        # The adaptive ceiling is a guess from the pages before, a slower page
+        # gets the rest of the configured ceiling instead of being cut short
+        LOGGER.debug(f"Cards did not settle within {timeout:.2f}s, waiting longer")
+        remaining = wait_stats.ceiling - (time.perf_counter() - start)
+        try:
+            settled = WebDriverWait(
+                driver, max(remaining, poll_interval), poll_frequency=poll_interval
+            ).until(condition)
+        except TimeoutException:
+            pass
+    card_count = condition.last_count or 0
+    if not settled:
+        timed_out = True
+        LOGGER.warning(
+            f"Cards did not settle within {wait_stats.ceiling:.2f}s, "
+            "parsing what has rendered"
+        )
+
+    waited = time.perf_counter() - start
+    wait_stats.record(waited, timed_out)
+    LOGGER.debug(f"Waited {waited:.2f}s for {card_count} cards")
+    return card_count
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from benchmarks.standin_site import StandinSite
+from src.api import aiter_realtors, collect_realtors, iter_realtors, open_drivers
+from src.http_fetch import HttpFetcher
+from src.metrics import RunMetrics
+from src.normalize import Normalizer
+from src.parse import RealtorData, parse_page_source
+
+
+def expected_names(pages, cards_per_page):
+    return [
+        f"REALTOR {page_num}-{index}"
+        for page_num in pages
+        for index in range(cards_per_page)
+    ]
+
+
+def test_iter_realtors_yields_records_in_page_order():
+    with StandinSite(cards_per_page=3, js_delay_ms=None) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            realtors = list(iter_realtors(4, fetch_mode="http", workers=2))
+
+    assert all(isinstance(realtor, RealtorData) for realtor in realtors)
+    assert [realtor.name for realtor in realtors] == expected_names(range(1, 5), 3)
+
+
+def test_iter_realtors_is_lazy_and_quits_its_drivers_when_closed():
+    with StandinSite(cards_per_page=2, js_delay_ms=None) as site:
+        with (
+            patch("src.scraper.URL", site.url),
+            patch("src.scraper.DATA_URL", None),
+            patch.object(HttpFetcher, "quit", autospec=True) as quit_fetcher,
+        ):
+            realtors = iter_realtors(1000, fetch_mode="http")
+            first = next(realtors)
+            requests_served = site.requests_served
+            realtors.close()
+
+    assert first.name == "REALTOR 1-0"
+    # Only the pool's lookahead was loaded, not the thousand pages
+    assert requests_served <= 3
+    quit_fetcher.assert_called_once()
+
+
+def test_iter_realtors_uses_the_drivers_it_is_given():
+    with StandinSite(cards_per_page=2, js_delay_ms=None, total_pages=3) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            with open_drivers(fetch_mode="http") as drivers:
+                # No page count, read off the first page
+                first_run = [
+                    realtor.name
+                    for realtor in iter_realtors(None, drivers, fetch_mode="http")
+                ]
+                second_run = [
+                    realtor.name
+                    for realtor in iter_realtors(
+                        3, drivers, first_page=3, fetch_mode="http"
+                    )
+                ]
+                drivers.quit = Mock(wraps=drivers.quit)
+            drivers.quit.assert_called_once()
+
+    assert first_run == expected_names(range(1, 4), 2)
+    assert second_run == expected_names([3], 2)
+
+
+def test_collect_realtors_keeps_each_realtor_once():
+    with StandinSite(cards_per_page=2, js_delay_ms=None) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            with open_drivers(fetch_mode="http") as drivers:
+                store = collect_realtors(2, drivers, fetch_mode="http")
+                store.extend(iter_realtors(3, drivers, fetch_mode="http"))
+                deduped = collect_realtors(2, drivers, dedup=True, fetch_mode="http")
+                deduped.extend(iter_realtors(3, drivers, fetch_mode="http"))
+
+    assert [realtor.name for realtor in store] == (
+        expected_names(range(1, 3), 2) + expected_names(range(1, 4), 2)
+    )
+    assert [realtor.name for realtor in deduped] == expected_names(range(1, 4), 2)
+
+
+def test_iter_realtors_normalizes_pages():
+    metrics = RunMetrics()
+    with StandinSite(cards_per_page=2, js_delay_ms=None) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            realtors = list(
+                iter_realtors(
+                    1, fetch_mode="http", normalizer=Normalizer(), metrics=metrics
+                )
+            )
+
+    assert [realtor.number for realtor in realtors] == [
+        "+15550010000",
+        "+15550010001",
+    ]
+    assert metrics.summary()["stages"]["normalize"]["count"] == 1
+
+
+def test_aiter_realtors_yields_records():
+    async def collect():
+        return [realtor.name async for realtor in aiter_realtors(3, fetch_mode="http")]
+
+    with StandinSite(cards_per_page=2, js_delay_ms=None) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            names = asyncio.run(collect())
+
+    assert names == expected_names(range(1, 4), 2)
+
+
+def test_aiter_realtors_cancelled_mid_page_quits_its_drivers():
+    page_started = threading.Event()
+    finish_page = threading.Event()
+
+    def slow_parser(page_source):
+        page_started.set()
+        finish_page.wait(5)
+        return parse_page_source(page_source)
+
+    async def cancel_mid_page():
+        async def consume():
+            async for _ in aiter_realtors(
+                3, fetch_mode="http", page_parser=slow_parser
+            ):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.get_running_loop().run_in_executor(None, page_started.wait, 5)
+        task.cancel()
+        finish_page.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with StandinSite(cards_per_page=2, js_delay_ms=None) as site:
+        with (
+            patch("src.scraper.URL", site.url),
+            patch("src.scraper.DATA_URL", None),
+            patch.object(HttpFetcher, "quit", autospec=True) as quit_fetcher,
+        ):
+            asyncio.run(cancel_mid_page())
+
+    quit_fetcher.assert_called_once()
+
+
+def test_open_drivers_raises_instead_of_exiting():
+    with pytest.raises(ValueError):
+        with open_drivers(fetch_mode="carrier pigeon"):
+            pass
+    with pytest.raises(ValueError):
+        with open_drivers(fetch_mode="replay"):
+            pass
@@ -0,0 +1,67 @@
+import json
+
+from src.checkpoint import CheckpointJournal
+
+
+def test_commit_batch_records_pages_and_output_size(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("header\nrow1\n")
+    journal = CheckpointJournal.for_output(str(output))
+
+    journal.start(3)
+    journal.commit_batch([1, 2])
+
+    entries = [json.loads(line) for line in open(journal.path)]
+    assert [entry["event"] for entry in entries] == ["start", "batch"]
+    assert entries[1]["pages"] == [1, 2]
+    assert entries[1]["output_bytes"] == len("header\nrow1\n")
+    assert journal.pending_pages(3) == [3]
+
+
+def test_restore_output_before_first_batch_keeps_header(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("header\n")
+    CheckpointJournal.for_output(str(output)).start(2)
+    with open(output, "a") as file:
+        file.write("row1 uncommitted\n")
+
+    CheckpointJournal.for_output(str(output)).load().restore_output()
+
+    assert output.read_text() == "header\n"
+
+
+def test_fresh_start_replaces_old_journal(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("header\n")
+    old_journal = CheckpointJournal.for_output(str(output))
+    old_journal.start(2)
+    old_journal.commit_batch([1])
+
+    journal = CheckpointJournal.for_output(str(output))
+    journal.start(2)
+
+    assert CheckpointJournal.for_output(str(output)).load().completed_pages == set()
+
+
+def test_load_skips_torn_line_and_restores_output(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("header\nrow1\n")
+    journal = CheckpointJournal.for_output(str(output))
+    journal.start(3)
+    journal.commit_batch([1])
+    with open(output, "a") as file:
+        file.write("row2 uncommitted\n")
+    with open(journal.path, "a") as file:
+        file.write('{"event": "batch", "pag')
+
+    resumed = CheckpointJournal.for_output(str(output)).load()
+    resumed.restore_output()
+
+    assert resumed.resumed
+    assert resumed.completed_pages == {1}
+    assert output.read_text() == "header\nrow1\n"
+    assert resumed.pending_pages(3) == [2, 3]
+
+    resumed.start(3)
+    entries = [json.loads(line) for line in open(journal.path)]
+    assert [entry["event"] for entry in entries] == ["start", "batch", "start"]
@@ -0,0 +1,88 @@
+from unittest.mock import Mock
+
+from src.fingerprints import DeltaSink, PageFingerprints, page_hash
+from src.scraper import RealtorData
+
+
+def make_page(page_num, cards=2):
+    return [
+        RealtorData(f"name {page_num}-{i}", "role", "office", "1 St", f"555-{i}")
+        for i in range(cards)
+    ]
+
+
+def run_delta(path, pages):
+    sink = Mock()
+    delta = DeltaSink(sink, PageFingerprints(path), len(pages), 0, 4)
+    for page_num, page_data in enumerate(pages, 1):
+        delta.write_page(page_num, page_data)
+    delta.checkpoint(list(range(1, len(pages) + 1)))
+    delta.close()
+    written = [row for call in sink.write_page.call_args_list for row in call[0][1]]
+    return delta, written
+
+
+def test_page_hash_follows_page_content():
+    assert page_hash(make_page(1)) == page_hash(make_page(1))
+    assert page_hash(make_page(1)) != page_hash(make_page(2))
+
+
+def test_first_run_adds_every_realtor(tmp_path):
+    delta, written = run_delta(str(tmp_path / "out.pages.db"), [make_page(1)])
+
+    assert written == [("added", *row) for row in make_page(1)]
+    assert delta.counts == {"added": 2, "changed": 0, "removed": 0}
+
+
+def test_unchanged_pages_are_not_written(tmp_path):
+    path = str(tmp_path / "out.pages.db")
+    pages = [make_page(1), make_page(2)]
+    run_delta(path, pages)
+
+    delta, written = run_delta(path, pages)
+
+    assert written == []
+    assert delta.unchanged_pages == 2
+    assert delta.counts == {"added": 0, "changed": 0, "removed": 0}
+
+
+def test_delta_emits_added_changed_and_removed(tmp_path):
+    path = str(tmp_path / "out.pages.db")
+    run_delta(path, [make_page(1), make_page(2)])
+    moved = make_page(1)[0]._replace(company="new office")
+    new = RealtorData("new realtor", "role", "office", "1 St", "555-9")
+
+    delta, written = run_delta(path, [[moved, new], make_page(2)])
+
+    assert written == [
+        ("changed", *moved),
+        ("added", *new),
+        ("removed", *make_page(1)[1]),
+    ]
+    assert delta.unchanged_pages == 1
+
+
+def test_run_cut_short_does_not_remove_anyone(tmp_path):
+    path = str(tmp_path / "out.pages.db")
+    run_delta(path, [make_page(1), make_page(2)])
+
+    sink = Mock()
+    delta = DeltaSink(sink, PageFingerprints(path), 2, 0, 4)
+    delta.write_page(1, [])
+    delta.checkpoint([1])
+    delta.close()
+
+    assert not sink.write_page.called
+    assert delta.counts["removed"] == 0
+
+
+def test_blank_cards_are_not_diffed(tmp_path):
+    path = str(tmp_path / "out.pages.db")
+    blanks = [RealtorData("", "role", f"office {i}", "1 St", "") for i in range(3)]
+    run_delta(path, [make_page(1) + blanks])
+    moved = make_page(1)[0]._replace(company="new office")
+
+    delta, written = run_delta(path, [[moved, make_page(1)[1], *blanks]])
+
+    assert written == [("changed", *moved)]
+    assert delta.counts == {"added": 0, "changed": 1, "removed": 0}
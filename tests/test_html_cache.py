@@ -0,0 +1,72 @@
+import os
+from unittest.mock import patch
+
+from src.html_cache import HtmlCache
+
+
+def test_put_then_get_round_trips(tmp_path):
+    cache = HtmlCache(str(tmp_path))
+
+    cache.put("url/1", "<html>page 1</html>")
+
+    assert cache.get("url/1") == "<html>page 1</html>"
+    assert cache.get("url/2") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_same_html_under_two_urls_is_stored_once(tmp_path):
+    cache = HtmlCache(str(tmp_path))
+
+    cache.put("url/1", "<html>same</html>")
+    cache.put("url/2", "<html>same</html>")
+
+    blobs = [name for _, _, names in os.walk(tmp_path / "objects") for name in names]
+    assert len(blobs) == 1
+    assert cache.get("url/2") == "<html>same</html>"
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    cache = HtmlCache(str(tmp_path))
+    pages = {f"url/{page_num}": os.urandom(2000).hex() for page_num in range(3)}
+    with patch("src.html_cache.time.time", side_effect=range(1, 100)):
+        cache.put("url/0", pages["url/0"])
+        blob_size = cache.size()
+        # Room for two pages, the blobs differ by a few bytes
+        cache.max_bytes = 2.5 * blob_size
+        cache.put("url/1", pages["url/1"])
+        # Using url/0 makes url/1 the least recently used
+        cache.get("url/0")
+        cache.put("url/2", pages["url/2"])
+
+        assert cache.get("url/1") is None
+        assert cache.get("url/0") == pages["url/0"]
+        assert cache.get("url/2") == pages["url/2"]
+    assert cache.size() <= 2.5 * blob_size
+
+
+def test_pages_older_than_max_age_are_missing(tmp_path):
+    cache = HtmlCache(str(tmp_path), max_age=60)
+    with patch("src.html_cache.time.time", return_value=1000):
+        cache.put("url/1", "<html>old</html>")
+
+    with patch("src.html_cache.time.time", return_value=1061):
+        assert cache.get("url/1") is None
+        cache.put("url/2", "<html>new</html>")
+
+    assert cache.size() == os.path.getsize(cache.blob_path(next(iter_digests(cache))))
+
+
+def test_unreadable_blob_is_a_miss(tmp_path):
+    cache = HtmlCache(str(tmp_path))
+    cache.put("url/1", "<html>page 1</html>")
+    for digest in iter_digests(cache):
+        with open(cache.blob_path(digest), "wb") as file:
+            file.write(b"not gzip")
+
+    assert cache.get("url/1") is None
+
+
+def iter_digests(cache):
+    return (
+        digest for (digest,) in cache.connection.execute("SELECT digest FROM blobs")
+    )
@@ -0,0 +1,31 @@
+import pytest
+from requests.exceptions import HTTPError
+
+from benchmarks.standin_site import StandinSite
+from src.http_fetch import HttpFetcher
+
+
+@pytest.fixture
+def site():
+    with StandinSite(cards_per_page=3, js_delay_ms=None) as standin_site:
+        yield standin_site
+
+
+def test_http_fetcher_reuses_connection(site):
+    fetcher = HttpFetcher()
+
+    for page_num in range(1, 6):
+        response = fetcher.get(site.url + str(page_num))
+        assert response.status_code == 200
+    fetcher.quit()
+
+    assert site.requests_served == 5
+    assert site.connections_opened == 1
+
+
+def test_http_fetcher_raises_on_bad_status(site):
+    fetcher = HttpFetcher(retries=0)
+
+    with pytest.raises(HTTPError):
+        fetcher.get(site.url.replace("?page=", "/missing"))
+    fetcher.quit()
@@ -0,0 +1,92 @@
+import json
+import os
+from unittest.mock import Mock
+
+from src.metrics import (
+    MetricsSink,
+    RssSampler,
+    RunMetrics,
+    StageHistogram,
+    process_tree_rss_bytes,
+)
+from src.parse import RealtorData
+
+
+def test_stage_histogram_buckets_and_quantiles():
+    histogram = StageHistogram(buckets=(0.1, 1, 10))
+    for seconds in [0.05, 0.05, 0.5, 20]:
+        histogram.observe(seconds)
+
+    assert histogram.bucket_counts == [2, 1, 0, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1
+    assert histogram.quantile(1) == 20
+    assert histogram.summary()["count"] == 4
+
+
+def test_metrics_sink_counts_pages_cards_and_missing_fields():
+    metrics = RunMetrics()
+    sink = MetricsSink(Mock(), metrics)
+
+    sink.write_page(1, [RealtorData("A", "", "C", "D", "")])
+    sink.write_page(2, [RealtorData("A", "", "C", "D", "E")] * 2)
+    sink.checkpoint([1, 2])
+
+    summary = metrics.summary()
+    assert (summary["pages"], summary["cards"]) == (2, 3)
+    assert summary["missing_fields"] == {
+        "name": 0,
+        "role": 3,
+        "company": 0,
+        "address": 0,
+        "number": 1,
+    }
+    assert summary["stages"]["write"]["count"] == 2
+    assert summary["stages"]["checkpoint"]["count"] == 1
+    assert sink.sink.write_page.call_count == 2
+
+
+def test_export_writes_prometheus_text_and_json(tmp_path):
+    metrics = RunMetrics(buckets=(0.1, 1))
+    metrics.observe("get", 0.05)
+    metrics.observe("get", 2)
+    metrics.count_page([RealtorData("A", "", "C", "D", "E")])
+    metrics.sample_rss(2048)
+
+    metrics.export(str(tmp_path / "run"), wait={"pages": 1})
+
+    with open(tmp_path / "run.prom") as file:
+        lines = file.read().splitlines()
+    assert "# TYPE scraper_stage_seconds histogram" in lines
+    assert 'scraper_stage_seconds_bucket{stage="get",le="0.1"} 1' in lines
+    assert 'scraper_stage_seconds_bucket{stage="get",le="+Inf"} 2' in lines
+    assert 'scraper_stage_seconds_count{stage="get"} 2' in lines
+    assert "scraper_pages_total 1" in lines
+    assert 'scraper_missing_fields_total{field="role"} 1' in lines
+    assert "scraper_browser_rss_bytes 2048" in lines
+    with open(tmp_path / "run.metrics.json") as file:
+        summary = json.load(file)
+    assert summary["cards"] == 1
+    assert summary["wait"] == {"pages": 1}
+    assert not os.path.exists(tmp_path / "run.prom.tmp")
+
+
+def test_process_tree_rss_includes_this_process():
+    assert process_tree_rss_bytes(os.getpid()) > 0
+
+
+def test_rss_sampler_only_samples_drivers_with_a_process():
+    metrics = RunMetrics()
+    driver = Mock()
+    driver.service.process.pid = os.getpid()
+
+    with RssSampler(metrics, [driver, Mock()], interval=60):
+        pass
+
+    assert metrics.rss_samples == 1
+    assert metrics.rss_bytes > 0
+
+    metrics = RunMetrics()
+    with RssSampler(metrics, [Mock()]) as sampler:
+        assert sampler.thread is None
+    assert metrics.rss_samples == 0
@@ -0,0 +1,83 @@
+from unittest.mock import Mock
+
+import pytest
+
+from src.metrics import RunMetrics
+from src.normalize import (
+    Normalizer,
+    NormalizingSink,
+    canonical_address,
+    canonical_office,
+    normalize_phone,
+)
+from src.parse import RealtorData
+
+
+@pytest.mark.parametrize(
+    "number, expected",
+    [
+        ("402-555-0123", "+14025550123"),
+        ("(402) 555 0123", "+14025550123"),
+        ("1 402.555.0123", "+14025550123"),
+        ("+44 20 7946 0958", "+442079460958"),
+        ("+49 89 123456", "+4989123456"),
+        ("+33 1 23 45 67 8", "+3312345678"),
+        ("+1 402 555 0123", "+14025550123"),
+        ("402-555-0123 ext. 12", "+14025550123;ext=12"),
+        ("402-555-0123 x7", "+14025550123;ext=7"),
+        ("555-0123", None),
+        ("call the office", None),
+    ],
+)
+def test_normalize_phone(number, expected):
+    assert normalize_phone(number) == expected
+
+
+def test_canonical_office_and_address():
+    assert canonical_office("Keller  Williams Realty ,Inc.") == (
+        "KELLER WILLIAMS REALTY, INC"
+    )
+    assert canonical_office("Smith&Co. Brokerage") == "SMITH & CO BROKERAGE"
+    assert canonical_address("12 Main Street ,Suite 4, Toronto, Ontario m5v2t6") == (
+        "12 MAIN ST, STE 4, TORONTO, ONTARIO M5V 2T6"
+    )
+    assert canonical_address("12 MAIN ST., TORONTO") == "12 MAIN ST, TORONTO"
+
+
+def test_normalizer_caches_repeated_offices_per_run():
+    normalizer = Normalizer(cache_size=2)
+    page = [
+        RealtorData(f"AGENT {index}", "REALTOR", "Office A", "1 Main Street", "")
+        for index in range(4)
+    ] + [RealtorData("AGENT 5", "REALTOR", "", "", "not a number")]
+
+    normalized = normalizer.normalize_page(page)
+
+    assert normalized[0] == RealtorData(
+        "AGENT 0", "REALTOR", "OFFICE A", "1 MAIN ST", ""
+    )
+    # Missing values stay missing, numbers that aren't one are kept
+    assert normalized[4] == page[4]
+    assert normalizer.summary() == {
+        "company": {"hits": 3, "misses": 1, "hit_rate": 0.75, "cached": 1},
+        "address": {"hits": 3, "misses": 1, "hit_rate": 0.75, "cached": 1},
+        "number": {"phones": 1, "unparsed": 1},
+    }
+    assert Normalizer().summary()["company"]["hits"] == 0
+
+
+def test_normalizing_sink_times_each_page():
+    sink = Mock()
+    metrics = RunMetrics()
+    normalizing_sink = NormalizingSink(sink, Normalizer(), metrics)
+
+    normalizing_sink.write_page(1, [RealtorData("A", "", "x", "", "4025550123")])
+    normalizing_sink.checkpoint([1])
+    normalizing_sink.close()
+
+    sink.write_page.assert_called_once_with(
+        1, [RealtorData("A", "", "X", "", "+14025550123")]
+    )
+    sink.checkpoint.assert_called_once_with([1])
+    sink.close.assert_called_once()
+    assert metrics.summary()["stages"]["normalize"]["count"] == 1
@@ -0,0 +1,140 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from src.metrics import RunMetrics
+from src.pipeline import STOPPED, Pipeline, StageStats, run_pipeline
+from src.pool import DriverPool
+from src.sinks import BatchSink
+
+
+# Module level so the parse processes can unpickle it
+def parse_fake_page(page_source):
+    return [page_source.upper()]
+
+
+def render_fake_page(driver, page_num):
+    return f"page{page_num}"
+
+
+def test_run_pipeline_writes_batches_in_page_order():
+    pool = DriverPool([Mock(), Mock()])
+    writes = []
+
+    def write(batch_pages, batch_data):
+        writes.append(batch_data)
+
+    stats = run_pipeline(
+        pool, render_fake_page, parse_fake_page, BatchSink(write), range(1, 6), 2, 2
+    )
+
+    assert writes == [
+        [["PAGE1"], ["PAGE2"]],
+        [["PAGE3"], ["PAGE4"]],
+        [["PAGE5"]],
+    ]
+    assert stats["render"]["items"] == 5
+    assert stats["parse"]["items"] == 5
+    assert stats["write"]["items"] == 5
+
+
+# Pages past 3 have no cards
+def parse_fake_listing(page_source):
+    return [] if int(page_source[4:]) > 3 else [page_source]
+
+
+def test_run_pipeline_stops_after_empty_pages():
+    pool = DriverPool([Mock()])
+    writes = []
+    stops = []
+
+    run_pipeline(
+        pool,
+        render_fake_page,
+        parse_fake_listing,
+        BatchSink(lambda batch_pages, batch_data: writes.append(batch_pages)),
+        range(1, 40),
+        2,
+        1,
+        max_empty_pages=2,
+        on_early_stop=lambda page_num, empty_pages: stops.append(page_num),
+    )
+
+    assert writes == [[1, 2], [3, 4], [5]]
+    assert stops == [5]
+
+
+def test_run_pipeline_reports_parse_times_to_metrics():
+    pool = DriverPool([Mock()])
+    metrics = RunMetrics()
+
+    run_pipeline(
+        pool,
+        render_fake_page,
+        parse_fake_page,
+        BatchSink(lambda batch_pages, batch_data: None),
+        range(1, 4),
+        2,
+        1,
+        metrics=metrics,
+    )
+
+    assert metrics.summary()["stages"]["parse"]["count"] == 3
+
+
+def test_run_pipeline_slow_writer_applies_backpressure():
+    pool = DriverPool([Mock()])
+
+    def slow_write(batch_pages, batch_data):
+        time.sleep(0.05)
+
+    stats = run_pipeline(
+        pool,
+        render_fake_page,
+        parse_fake_page,
+        BatchSink(slow_write),
+        range(1, 9),
+        1,
+        1,
+        queue_size=1,
+    )
+
+    assert stats["parse"]["blocked_on_output_seconds"] > 0
+    assert stats["parse"]["max_output_queue_depth"] == 1
+    assert stats["write"]["occupancy"] > 0
+
+
+def test_run_pipeline_stage_error_stops_pipeline():
+    pool = DriverPool([Mock()])
+    writes = []
+
+    def write(batch_pages, batch_data):
+        writes.append(batch_pages)
+
+    def render(driver, page_num):
+        if page_num == 3:
+            raise ValueError("could not render")
+        return f"page{page_num}"
+
+    with pytest.raises(ValueError):
+        run_pipeline(pool, render, parse_fake_page, BatchSink(write), range(1, 6), 1, 1)
+
+    assert writes == [[1], [2]]
+
+
+def test_stage_stats_occupancy():
+    stats = StageStats("parse", capacity=2)
+    stats.started = 0.0
+    stats.finished = 10.0
+    stats.busy_seconds = 5.0
+
+    assert stats.summary()["occupancy"] == 0.25
+
+
+def test_pipeline_get_returns_stopped_once_stopping():
+    pipeline = Pipeline()
+    pipeline.stop_event.set()
+
+    assert pipeline.get(Mock(), StageStats("write")) is STOPPED
+    assert pipeline.put(Mock(), "item", StageStats("write")) is False
@@ -0,0 +1,119 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.pool import DriverPool
+
+
+def test_map_pages_returns_results_in_page_order():
+    pool = DriverPool([Mock(), Mock(), Mock()])
+
+    def render(driver, page_num):
+        # Early pages finish last
+        time.sleep(0.01 * (6 - page_num))
+        return page_num
+
+    assert list(pool.map_pages(render, range(1, 6))) == [1, 2, 3, 4, 5]
+
+
+def test_map_pages_never_shares_a_driver():
+    drivers = [Mock(), Mock()]
+    pool = DriverPool(drivers)
+    in_use = set()
+    lock = threading.Lock()
+    used = []
+
+    def render(driver, page_num):
+        with lock:
+            assert driver not in in_use
+            in_use.add(driver)
+            used.append(driver)
+        time.sleep(0.01)
+        with lock:
+            in_use.remove(driver)
+        return page_num
+
+    list(pool.map_pages(render, range(10)))
+
+    assert set(used) <= set(drivers)
+    assert pool.idle_supervisors.qsize() == 2
+
+
+def test_map_pages_reraises_worker_errors():
+    pool = DriverPool([Mock(), Mock()])
+
+    def render(driver, page_num):
+        if page_num == 2:
+            raise ValueError("bad page")
+        return page_num
+
+    pages = pool.map_pages(render, range(1, 5))
+
+    assert next(pages) == 1
+    try:
+        next(pages)
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+    assert pool.idle_supervisors.qsize() == 2
+
+
+def test_provision_creates_requested_size():
+    provision_driver = Mock(side_effect=[Mock(), Mock(), Mock()])
+
+    pool = DriverPool.provision(3, provision_driver)
+
+    assert len(pool) == 3
+    assert provision_driver.call_count == 3
+
+
+def test_provision_quits_started_drivers_if_one_fails():
+    started = Mock()
+    provision_driver = Mock(side_effect=[started, SystemExit()])
+
+    with pytest.raises(SystemExit):
+        DriverPool.provision(2, provision_driver)
+
+    assert started.quit.called
+
+
+@patch("src.pool.LOGGER.error")
+def test_quit_quits_every_driver(logger):
+    drivers = [Mock(), Mock()]
+    drivers[0].quit.side_effect = Exception("already dead")
+    pool = DriverPool(drivers)
+
+    pool.quit()
+
+    assert drivers[0].quit.called
+    assert drivers[1].quit.called
+    assert logger.called
+
+
+def test_map_pages_only_renders_lookahead_ahead_of_consumer():
+    pool = DriverPool([Mock(), Mock()])
+    rendered = []
+
+    def render(driver, page_num):
+        rendered.append(page_num)
+        return page_num
+
+    pages = pool.map_pages(render, range(1, 20), lookahead=3)
+    assert next(pages) == 1
+    time.sleep(0.05)
+
+    assert len(rendered) <= 4
+    assert list(pages) == list(range(2, 20))
+
+
+def test_recycled_drivers_replace_the_old_ones_in_the_pool():
+    old_driver = Mock()
+    new_driver = Mock()
+    pool = DriverPool([old_driver], Mock(return_value=new_driver), recycle_pages=2)
+
+    list(pool.map_pages(lambda driver, page_num: page_num, range(1, 4)))
+
+    assert old_driver.quit.called
+    assert pool.drivers == [new_driver]
@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+
+from src.rate import INTERVAL_STEP, RateController
+
+
+def release_pages(controller, count, latency=0.1, **signals):
+    for _ in range(count):
+        started = controller.acquire()
+        controller.release(started, latency, **signals)
+
+
+def test_starts_at_full_speed_and_stays_there():
+    controller = RateController(4, target_latency=1)
+
+    release_pages(controller, 10)
+
+    assert controller.summary()["concurrency"] == 4
+    assert controller.interval == 0
+    assert controller.backoffs == 0
+
+
+def test_error_halves_concurrency_and_spaces_pages_out():
+    controller = RateController(8, target_latency=1, min_concurrency=3)
+
+    release_pages(controller, 1, error=True)
+
+    assert controller.concurrency == 4
+    assert controller.interval == INTERVAL_STEP
+    release_pages(controller, 1, error=True)
+    # Never below the floor
+    assert controller.concurrency == 3
+    assert controller.errors == 2
+
+
+def test_pages_in_flight_before_a_back_off_dont_back_off_again():
+    controller = RateController(8, target_latency=1)
+    in_flight = [controller.acquire() for _ in range(4)]
+
+    for started in in_flight:
+        controller.release(started, 0.1, error=True)
+
+    assert controller.backoffs == 1
+    assert controller.concurrency == 4
+
+
+def test_slow_pages_back_off_then_recover():
+    controller = RateController(4, target_latency=1, max_interval=0.5)
+    controller.interval = 0.01
+
+    release_pages(controller, 1, latency=5)
+
+    assert controller.concurrency == 2
+    assert controller.interval == INTERVAL_STEP
+    assert controller.summary()["latency_seconds"] == 5
+
+    controller.latency = 0.1
+    controller.next_start = 0
+    controller.interval = 0
+    release_pages(controller, 6)
+    assert controller.summary()["concurrency"] == 4
+
+
+def test_without_a_target_only_slower_than_usual_pages_back_off():
+    controller = RateController(4)
+
+    # Always slow is just how the site is
+    release_pages(controller, 20, latency=9)
+    assert controller.backoffs == 0
+    assert controller.summary()["target_latency_seconds"] == 18
+
+    release_pages(controller, 1, latency=60)
+    assert controller.backoffs == 1
+    assert controller.concurrency == 2
+
+
+def test_one_driver_doesnt_back_off_on_latency():
+    controller = RateController(1, target_latency=1)
+
+    release_pages(controller, 10, latency=5)
+
+    assert controller.backoffs == 0
+    assert controller.interval == 0
+
+
+def test_empty_pages_back_off():
+    controller = RateController(2, target_latency=1)
+
+    assert controller.run(lambda: []) == []
+
+    assert controller.empty_pages == 1
+    assert controller.concurrency == 1
+
+
+def test_empty_pages_reported_after_release_back_off_once():
+    controller = RateController(4, target_latency=1)
+    started = [controller.acquire() for _ in range(2)]
+    for page_started in started:
+        controller.release(page_started, 0.1)
+
+    for page_started in started:
+        controller.report_empty(page_started)
+
+    assert controller.empty_pages == 2
+    assert controller.backoffs == 1
+    assert controller.concurrency == 2
+
+
+def test_run_records_errors_and_reraises():
+    controller = RateController(2, target_latency=1)
+
+    def render():
+        raise ValueError("bad page")
+
+    with pytest.raises(ValueError):
+        controller.run(render)
+
+    assert controller.errors == 1
+    assert controller.in_flight == 0
+
+
+def test_acquire_waits_for_a_free_slot():
+    controller = RateController(1)
+    started = controller.acquire()
+    acquired = threading.Event()
+
+    thread = threading.Thread(target=lambda: (controller.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+
+    controller.release(started, 0.1)
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_acquire_keeps_the_spacing_between_pages():
+    controller = RateController(2, min_interval=0.05)
+
+    first = controller.acquire()
+    second = controller.acquire()
+
+    assert second - first >= 0.05
+    assert time.monotonic() - first >= 0.05
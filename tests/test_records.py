@@ -0,0 +1,46 @@
+from src.parse import RealtorData
+from src.records import RecordStore
+
+
+def realtor(name, company="OFFICE 1", number="402-555-0000"):
+    return RealtorData(name, "REALTOR®", company, f"{company} MAIN ST", number)
+
+
+def test_record_store_gives_back_what_was_added():
+    realtors = [realtor("A"), realtor("B", "OFFICE 2"), RealtorData("", "", "", "", "")]
+    store = RecordStore()
+
+    assert store.extend(realtors) == 3
+    assert len(store) == 3
+    assert list(store) == realtors
+    assert store[1] == realtors[1]
+
+
+def test_record_store_keeps_repeated_values_once():
+    store = RecordStore()
+    # Built apart, so they are different string objects going in
+    store.extend(
+        realtor(f"AGENT {index}", "".join(["OFFICE", " 1"])) for index in range(50)
+    )
+
+    first, last = store[0], store[49]
+    assert first.company is last.company
+    assert first.address is last.address
+    assert store.stats() == {
+        "records": 50,
+        "duplicates_dropped": 0,
+        "distinct_values": {"role": 1, "company": 1, "address": 1},
+    }
+
+
+def test_record_store_dedup_drops_realtors_already_seen():
+    store = RecordStore(dedup=True)
+    blank = RealtorData("", "", "", "", "")
+
+    assert store.extend([realtor("A"), realtor("B"), blank]) == 3
+    # Same name at another number is someone else, blank cards are all kept
+    assert store.extend([realtor("A"), realtor("A", number="1"), blank]) == 2
+    # Case, spacing and phone formatting don't make someone new
+    assert store.add(realtor(" b ", number="(402) 555 0000")) is False
+    assert [row.name for row in store] == ["A", "B", "", "A", ""]
+    assert store.stats()["duplicates_dropped"] == 2
@@ -0,0 +1,87 @@
+import gzip
+import os
+import subprocess
+import sys
+import tarfile
+from unittest.mock import Mock, patch
+
+from benchmarks.standin_site import render_listing_page, write_listing_pages
+from src.reparse import natural_key, reparse_archive
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def written_names(sink):
+    return [row.name for call in sink.write_page.call_args_list for row in call[0][1]]
+
+
+def expected_names(pages):
+    return [f"REALTOR {page_num}-{index}" for page_num in pages for index in range(2)]
+
+
+def test_natural_key_sorts_page_numbers():
+    names = ["page_10.html", "page_2.html", "page_1.html"]
+    assert sorted(names, key=natural_key) == [
+        "page_1.html",
+        "page_2.html",
+        "page_10.html",
+    ]
+
+
+@patch("src.reparse.LOGGER.error")
+def test_reparse_folder_writes_pages_in_order(logger, tmp_path):
+    directory = str(tmp_path / "saved")
+    write_listing_pages(directory, 11, cards_per_page=2)
+    with open(os.path.join(directory, "page_12.html.gz"), "wb") as file:
+        file.write(gzip.compress(render_listing_page(12, 2).encode()))
+    with open(os.path.join(directory, "page_13.html"), "w") as file:
+        file.write("<html>no cards</html>")
+    sink = Mock()
+
+    stats = reparse_archive(directory, sink, workers=2, chunk_pages=3)
+
+    assert written_names(sink) == expected_names(range(1, 13))
+    assert stats == {"pages": 12, "cards": 24, "failed": 1}
+    assert "page_13.html" in logger.call_args_list[0][0][0]
+
+
+def test_reparse_tarball(tmp_path):
+    directory = str(tmp_path / "saved")
+    write_listing_pages(directory, 3, cards_per_page=2)
+    archive_path = str(tmp_path / "saved.tar.gz")
+    with tarfile.open(archive_path, "w:gz") as tar:
+        for page_num in range(1, 4):
+            tar.add(os.path.join(directory, f"page_{page_num}.html"))
+    sink = Mock()
+
+    stats = reparse_archive(archive_path, sink, workers=2, chunk_pages=2)
+
+    assert written_names(sink) == expected_names(range(1, 4))
+    assert stats["pages"] == 3
+
+
+def test_reparse_cli_runs_without_selenium_or_site(tmp_path):
+    write_listing_pages(str(tmp_path / "saved"), 3, cards_per_page=2)
+    env = {key: value for key, value in os.environ.items() if key != "WEBSITE_URL"}
+    env["PYTHONPATH"] = PROJECT_DIR
+    # Fails on import if anything pulls Selenium in
+    code = (
+        "import sys; sys.modules['selenium'] = None; "
+        "sys.argv = ['reparse', 'saved', 'out', '--workers=2']; "
+        "from src.reparse import main; main()"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "pages/s" in result.stdout
+    with open(tmp_path / "out.csv") as file:
+        lines = file.read().splitlines()
+    assert lines[0] == "name,role,company,address,number"
+    assert len(lines) == 1 + 3 * 2
@@ -1,27 +1,92 @@
-from unittest.mock import Mock, PropertyMock, patch, mock_open
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from importlib.util import find_spec
+from unittest.mock import Mock, patch, mock_open
 import pytest
-from src.final_scraper import (
+from src.scraper import (
     collect_realtor_data_from_page,
     initialize_csv,
     main,
+    collect_realtor_data_from_records,
+    fetch_page,
+    check_input_fetch_mode,
+    check_input_profile,
+    BLOCKED_URL_PATTERNS,
+    check_input_parser,
+    make_page_parser,
+    extract_card_fields,
+    extract_page_in_browser,
+    collect_realtor_data_from_script_rows,
+    check_input_extract_mode,
+    check_input_output_format,
+    check_input_limit,
+    open_output,
+    resume_csv,
+    CARD_FIELD_CLASSES,
+    CARD_ID_PATTERN,
+    parse_page_source,
     render_page,
+    replay_page,
     sanitize,
     check_input_pages,
     DEFAULT_PAGES_TO_SCRAPE,
     check_input_filename,
+    check_input_seconds,
+    check_input_workers,
+    split_cli_args,
+    CLI_OPTIONS,
     DEFAULT_FILENAME,
     RealtorData,
     provision_webdriver,
+    discover_pages_to_scrape,
+    find_page_count,
+    find_page_count_in_records,
+    UNKNOWN_PAGE_COUNT,
+    start_webdriver,
     scrape_pages,
     write_to_csv,
 )
 from bs4 import BeautifulSoup
 from selenium.common.exceptions import WebDriverException
+from src.cli import check_input_positive_int
+from src.pool import DriverPool
+from src.rate import RateController
+from src.checkpoint import CheckpointJournal
+from src.http_fetch import HttpFetcher
+from src.normalize import Normalizer
+from src.pipeline import DEFAULT_QUEUE_SIZE
+from src.sinks import StreamingCsvWriter
+from benchmarks.standin_site import (
+    StandinSite,
+    cards_on_page,
+    expected_page_data,
+    render_listing_page,
+)
+from src.wait import CARD_SELECTOR, PAGER_CURRENT_SELECTOR
+from src.html_cache import HtmlCache
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
+@pytest.fixture(autouse=True)
+def streaming_writer(request, monkeypatch):
+    # main() would open a real writer on whatever initialize_csv returned,
+    # and needs a site to scrape
+    if not request.node.name.startswith("test_main"):
+        yield None
+        return
+    monkeypatch.setenv("WEBSITE_URL", "url/")
+    with patch("src.scraper.StreamingCsvWriter") as mock_writer:
+        yield mock_writer
 
-@patch("src.final_scraper.Chrome")
-@patch("src.final_scraper.ChromeOptions")
-@patch("src.final_scraper.ChromeService")
+
+@patch("selenium.webdriver.Chrome")
+@patch("selenium.webdriver.ChromeOptions")
+@patch("selenium.webdriver.ChromeService")
 def test_provision_webdriver(mock_service, mock_options, mock_chrome):
     # mock Service(), means mocking the Service/Options object
     # Then set the objects return value (mocks instantiation of Service/Options object)
@@ -40,10 +105,58 @@ def test_provision_webdriver(mock_service, mock_options, mock_chrome):
     assert mock_chrome.call_args[1]["options"] == mock_options_instance
 
 
-@patch("src.final_scraper.LOGGER.critical")
-@patch("src.final_scraper.Chrome")
-@patch("src.final_scraper.ChromeOptions")
-@patch("src.final_scraper.ChromeService")
+@patch("selenium.webdriver.Chrome")
+@patch("selenium.webdriver.ChromeOptions")
+@patch("selenium.webdriver.ChromeService")
+def test_provision_webdriver_lean_profile(mock_service, mock_options, mock_chrome):
+    mock_options_add_argument_call = mock_options.return_value.add_argument
+
+    driver = provision_webdriver("lean")
+
+    arguments = [call[0][0] for call in mock_options_add_argument_call.call_args_list]
+    assert "--headless=new" in arguments
+    assert "--disable-gpu" in arguments
+    assert any(argument.startswith("--window-size=") for argument in arguments)
+
+    cdp_calls = [call[0] for call in driver.execute_cdp_cmd.call_args_list]
+    assert cdp_calls[0] == ("Network.enable", {})
+    assert cdp_calls[1] == ("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
+
+@patch("selenium.webdriver.Chrome")
+@patch("selenium.webdriver.ChromeOptions")
+@patch("selenium.webdriver.ChromeService")
+def test_provision_webdriver_full_profile_is_not_headless(
+    mock_service, mock_options, mock_chrome
+):
+    mock_options_add_argument_call = mock_options.return_value.add_argument
+
+    driver = provision_webdriver()
+
+    arguments = [call[0][0] for call in mock_options_add_argument_call.call_args_list]
+    assert arguments == ["--enable-javascript"]
+    assert not driver.execute_cdp_cmd.called
+
+
+@patch("selenium.webdriver.Chrome")
+@patch("selenium.webdriver.ChromeOptions")
+@patch("selenium.webdriver.ChromeService")
+def test_start_webdriver_quits_chrome_when_setup_fails(
+    mock_service, mock_options, mock_chrome
+):
+    driver = mock_chrome.return_value
+    driver.execute_cdp_cmd.side_effect = WebDriverException("mock exception msg")
+
+    with pytest.raises(WebDriverException):
+        start_webdriver("lean")
+
+    assert driver.quit.called
+
+
+@patch("src.scraper.LOGGER.critical")
+@patch("selenium.webdriver.Chrome")
+@patch("selenium.webdriver.ChromeOptions")
+@patch("selenium.webdriver.ChromeService")
 def test_provision_webdriver_throws_exception_and_exits(
     mock_service, mock_options, mock_chrome, logger
 ):
@@ -67,7 +180,7 @@ def test_sanitize():
 
 
 # TODO Write tests that deal with exception path of below 2 tests
-@patch("src.final_scraper.writer")
+@patch("src.scraper.writer")
 def test_initialize_csv(csv_writer):
     csv_writer_obj = csv_writer.return_value
 
@@ -87,7 +200,7 @@ def test_initialize_csv(csv_writer):
         assert created_csv_filename == "myfile.csv"
 
 
-@patch("src.final_scraper.writer")
+@patch("src.scraper.writer")
 def test_write_to_csv(csv_writer):
     csv_writer_obj = csv_writer.return_value
 
@@ -111,6 +224,83 @@ def test_check_input_pages():
     assert check_input_pages(bad_input) == DEFAULT_PAGES_TO_SCRAPE
     assert check_input_pages(bad_input_2) == DEFAULT_PAGES_TO_SCRAPE
     assert check_input_pages(good_input) == 6
+    assert check_input_pages("auto") is None
+
+
+@patch("src.cli.LOGGER.error")
+def test_check_input_positive_int(logger):
+    assert check_input_positive_int("12", 5, "chunk size") == 12
+    assert check_input_positive_int("0", 5, "chunk size") == 5
+    assert check_input_positive_int("BAD", 5, "chunk size") == 5
+    assert logger.call_args_list[-2][0][0] == (
+        "Seems like you entered an invalid chunk size: BAD"
+    )
+    assert logger.call_args_list[-1][0][0] == "We'll set it to 5"
+
+
+def test_check_input_workers():
+    assert check_input_workers("BAD") == 1
+    assert check_input_workers("0") == 1
+    assert check_input_workers("4") == 4
+    assert check_input_workers("BAD", 0) == 0
+
+
+def test_check_input_fetch_mode():
+    assert check_input_fetch_mode("http") == "http"
+    assert check_input_fetch_mode("BAD") == "browser"
+
+
+def test_check_input_profile():
+    assert check_input_profile("lean") == "lean"
+    assert check_input_profile("BAD") == "full"
+
+
+def test_check_input_parser():
+    # Whether or not lxml is installed here
+    with patch("src.parse.find_spec", return_value=Mock()):
+        assert check_input_parser("lxml") == "lxml"
+    assert check_input_parser("BAD") == "html.parser"
+
+    with patch("src.parse.find_spec", return_value=None):
+        assert check_input_parser("lxml") == "html.parser"
+
+
+def test_check_input_extract_mode():
+    assert check_input_extract_mode("compare") == "compare"
+    assert check_input_extract_mode("BAD") == "soup"
+
+
+def test_check_input_limit():
+    assert check_input_limit("10", 5) == 10
+    assert check_input_limit("0", 5) == 5
+    assert check_input_limit("BAD", 5) == 5
+
+
+def test_check_input_output_format():
+    assert check_input_output_format("sqlite") == "sqlite"
+    assert check_input_output_format("BAD") == "csv"
+
+
+@patch("src.scraper.find_spec")
+def test_check_input_output_format_parquet_without_pyarrow(mock_find_spec):
+    mock_find_spec.return_value = None
+    assert check_input_output_format("parquet") == "csv"
+
+
+def test_check_input_seconds():
+    assert check_input_seconds("BAD", 8) == 8
+    assert check_input_seconds("-1", 8) == 8
+    assert check_input_seconds("2.5", 8) == 2.5
+
+
+def test_split_cli_args():
+    args, options = split_cli_args(
+        ["scraper_file.py", "3", "--wait-ceiling=4", "test_filename", "--bogus"],
+        CLI_OPTIONS,
+    )
+
+    assert args == ["scraper_file.py", "3", "test_filename"]
+    assert options == {"wait-ceiling": "4"}
 
 
 def test_check_input_filename():
@@ -208,6 +398,157 @@ def test_collect_realtor_data_from_page():
     assert data[0].role == "HEAD GOOFER"
 
 
+def test_parse_page_source():
+    data = parse_page_source(REALTOR_DATA_FULL)
+
+    assert data == [VALID_RESULTS]
+
+
+def test_parse_page_source_without_cards_is_empty():
+    assert parse_page_source("<html><body>No results</body></html>") == []
+
+
+def test_find_page_count():
+    assert find_page_count(render_listing_page(1, 2, total_pages=14)) == 14
+    assert find_page_count(render_listing_page(1, 2)) is None
+
+
+def test_find_page_count_from_result_count():
+    page_source = render_listing_page(1, 4).replace(
+        "<body>", '<body><span class="paginationTotalResultsNum">1,001</span>'
+    )
+
+    assert find_page_count(page_source) == 251
+
+
+def test_parse_page_source_with_missing_fields():
+    page_source = render_listing_page(1, cards_per_page=20, missing_rate=0.3)
+
+    with patch("src.scraper.LOGGER.error"):
+        assert parse_page_source(page_source) == expected_page_data(1, 20, 0.3)
+
+
+@pytest.mark.parametrize(
+    "parser",
+    [
+        "html.parser",
+        pytest.param(
+            "lxml",
+            marks=pytest.mark.skipif(
+                find_spec("lxml") is None, reason="lxml is not installed"
+            ),
+        ),
+    ],
+)
+@pytest.mark.parametrize("strain_cards", [False, True])
+def test_page_parsers_give_identical_data(parser, strain_cards):
+    page_parser = make_page_parser(parser, strain_cards)
+    page_source = (
+        f"<html><body><div id='nav'>menu</div>{REALTOR_DATA_FULL * 3}</body></html>"
+    )
+
+    assert page_parser(page_source) == [VALID_RESULTS] * 3
+    assert page_parser(page_source) == parse_page_source(page_source)
+
+
+VALID_SCRIPT_ROW = [
+    "JOKER JOKINGTON",
+    "\n  HEAD GOOFER \n",
+    "GOOFY OFFICE",
+    "GOOFEY GOOBER ST, OMAHA, NEBRASKA",
+    "000-000-9898",
+]
+
+
+@patch("src.scraper.LOGGER.error")
+def test_collect_realtor_data_from_script_rows(logger):
+    missing_number = VALID_SCRIPT_ROW[:4] + [None]
+
+    data = collect_realtor_data_from_script_rows([VALID_SCRIPT_ROW, missing_number])
+
+    assert data == [VALID_RESULTS, VALID_RESULTS._replace(number="")]
+    assert logger.call_args_list[0][0][0] == "Could not get number for card 1"
+
+
+@patch("src.scraper.wait_for_cards")
+def test_extract_page_in_browser(mock_wait):
+    driver = Mock()
+    driver.execute_script.return_value = [VALID_SCRIPT_ROW]
+
+    data = extract_page_in_browser(driver, "mock_url")
+
+    assert data == [VALID_RESULTS]
+    assert driver.get.call_args_list[0][0][0] == "mock_url"
+    assert mock_wait.called
+    script_args = driver.execute_script.call_args_list[0][0]
+    assert script_args[2] == [
+        ".realtorCardName",
+        ".realtorCardTitle",
+        ".realtorCardOfficeName",
+        ".realtorCardOfficeAddress",
+        ".realtorCardContactNumber.TelephoneNumber",
+    ]
+
+
+@patch("src.scraper.LOGGER.warning")
+@patch("src.scraper.wait_for_cards")
+def test_extract_page_in_browser_compare_logs_differences(mock_wait, logger):
+    driver = Mock()
+    driver.page_source = REALTOR_DATA_FULL
+    driver.execute_script.return_value = [VALID_SCRIPT_ROW]
+
+    data = extract_page_in_browser(driver, "mock_url", compare=True)
+
+    assert data == [VALID_RESULTS]
+    assert not logger.called
+
+    driver.execute_script.return_value = [VALID_SCRIPT_ROW[:4] + ["111"]]
+
+    data = extract_page_in_browser(driver, "mock_url", compare=True)
+
+    # Soup data is what gets written while comparing
+    assert data == [VALID_RESULTS]
+    assert "mock_url card 0" in logger.call_args_list[0][0][0]
+
+
+VALID_RECORD = {
+    "RealtorName": " JOKER  JOKINGTON",
+    "RealtorPosition": "HEAD GOOFER \n",
+    "OfficeName": "GOOFY OFFICE",
+    "OfficeAddress": "GOOFEY GOOBER ST, OMAHA, NEBRASKA",
+    "Phone": "000-000-9898",
+}
+
+
+def test_collect_realtor_data_from_records():
+    assert collect_realtor_data_from_records([VALID_RECORD]) == [VALID_RESULTS]
+    assert collect_realtor_data_from_records({"Results": [VALID_RECORD]}) == [
+        VALID_RESULTS
+    ]
+
+
+@patch("src.scraper.LOGGER.error")
+def test_collect_realtor_data_from_records_missing_field(logger):
+    record = dict(VALID_RECORD)
+    del record["Phone"]
+
+    data = collect_realtor_data_from_records([record])
+
+    assert data == [VALID_RESULTS._replace(number="")]
+    assert logger.called
+
+
+def test_fetch_page_json_and_html_give_same_data():
+    fetcher = HttpFetcher()
+    with StandinSite(cards_per_page=4, js_delay_ms=None) as site:
+        from_json = fetch_page(fetcher, site.data_url + "2")
+        from_html = fetch_page(fetcher, site.url + "2")
+    fetcher.quit()
+
+    assert len(from_json) == 4
+    assert from_json == from_html
+
+
 VALID_RESULTS = RealtorData(
     name="JOKER JOKINGTON",
     role="HEAD GOOFER",
@@ -217,32 +558,21 @@ VALID_RESULTS = RealtorData(
 )
 
 
-@patch("src.final_scraper.BeautifulSoup")
-def test_collect_realtor_data_from_page_missing_name(bs_patch):
-    for i, _ in enumerate(RealtorData._fields):
-        realtor_data_key_errors = list(VALID_RESULTS).copy()
+@patch("src.scraper.LOGGER.error")
+def test_collect_realtor_data_from_page_missing_name(logger):
+    for i, field in enumerate(RealtorData._fields):
         expected_values = list(VALID_RESULTS).copy()
 
-        # For each place in VALID_RESULTS, replace it with a TypeError
-        # This simulates an error being thrown when bs4 method .find() happens
-
-        # When an error is thrown for a particular field, we should default to ""
+        # Take each field out of the card in turn
+        # When a field is missing, we should default to ""
         # This is what expected_values array is checking for
-
-        # We want to do this for each field in RealtorData
-        realtor_data_key_errors[i] = TypeError
+        soup = BeautifulSoup(REALTOR_DATA_FULL, "html.parser")
+        card = soup.find(id=CARD_ID_PATTERN)
+        classes = CARD_FIELD_CLASSES[i]
+        soup.find(class_=lambda css_class: css_class == classes[0]).decompose()
         expected_values[i] = ""
 
-        mock_card = Mock(spec=BeautifulSoup)
-        mock_card_obj = mock_card.return_value
-        type(mock_card_obj.find.return_value).text = PropertyMock(
-            side_effect=realtor_data_key_errors
-        )
-
-        mock_realtor_card_divs_obj = bs_patch.return_value
-        mock_realtor_card_divs_obj.find_all.return_value = [mock_card_obj]
-
-        data = collect_realtor_data_from_page(mock_realtor_card_divs_obj)
+        data = collect_realtor_data_from_page(soup)
 
         assert len(data) == 1
         assert isinstance(data[0], RealtorData)
@@ -251,20 +581,39 @@ def test_collect_realtor_data_from_page_missing_name(bs_patch):
         assert data[0].company == expected_values[2]
         assert data[0].address == expected_values[3]
         assert data[0].number == expected_values[4]
+        # Logged lazily, the card is only formatted if the message is emitted
+        assert logger.call_args_list[-1][0] == ("Could not get %s for %s", field, card)
 
 
-@patch("src.final_scraper.time.sleep")
-@patch("src.final_scraper.collect_realtor_data_from_page")
-@patch("src.final_scraper.BeautifulSoup")
-def test_render_page(mock_soup, mock_collect, mock_time_sleep):
-    mock_time_sleep.return_value = None
+def test_extract_card_fields_matches_classes_in_any_order():
+    card = BeautifulSoup(
+        """<div id="RealtorCard-1">
+            <span class="realtorCardContactNumber">not a phone number</span>
+            <span class="TelephoneNumber extra realtorCardContactNumber">555</span>
+            <span class="realtorCardName">FIRST</span>
+            <span class="realtorCardName">SECOND</span>
+        </div>""",
+        "html.parser",
+    ).div
 
+    elements = extract_card_fields(card)
+
+    assert elements["number"].text == "555"
+    assert elements["name"].text == "FIRST"
+    assert "role" not in elements
+
+
+@patch("src.scraper.wait_for_cards")
+@patch("src.parse.collect_realtor_data_from_page")
+@patch("bs4.BeautifulSoup")
+def test_render_page(mock_soup, mock_collect, mock_wait):
     driver = Mock()
     driver.page_source = "mock html via beautifulsoup"
 
     render_page(driver, "mock_url")
 
     assert driver.get.call_args_list[0][0][0] == "mock_url"
+    assert mock_wait.call_args_list[0][0][0] == driver
 
     assert mock_soup.call_args_list[0][0][0] == "mock html via beautifulsoup"
     assert mock_soup.call_args_list[0][0][1] == "html.parser"
@@ -272,11 +621,9 @@ def test_render_page(mock_soup, mock_collect, mock_time_sleep):
     assert mock_collect.call_args_list[0][0][0] == mock_soup.return_value
 
 
-@patch("src.final_scraper.time.sleep")
-@patch("src.final_scraper.LOGGER.error")
-def test_render_page_throws_error_and_logs(logger, mock_time_sleep):
-    mock_time_sleep.return_value = None
-
+@patch("src.scraper.wait_for_cards")
+@patch("src.scraper.LOGGER.error")
+def test_render_page_throws_error_and_logs(logger, mock_wait):
     driver = Mock()
     driver.get.side_effect = Exception("EXCEPTION INFO")
 
@@ -289,8 +636,45 @@ def test_render_page_throws_error_and_logs(logger, mock_time_sleep):
     )
 
 
-@patch("src.final_scraper.write_to_csv")
-@patch("src.final_scraper.render_page")
+@patch("src.scraper.wait_for_cards")
+def test_render_page_saves_to_html_cache(mock_wait, tmp_path):
+    driver = Mock()
+    driver.page_source = render_listing_page(1, cards_per_page=2)
+    html_cache = HtmlCache(str(tmp_path))
+
+    page_data = render_page(driver, "url/1", html_cache=html_cache)
+
+    assert html_cache.get("url/1") == driver.page_source
+    assert replay_page(html_cache, "url/1") == page_data
+
+
+@patch("src.scraper.LOGGER.error")
+def test_replay_page_not_in_cache_raises(logger, tmp_path):
+    with pytest.raises(LookupError):
+        replay_page(HtmlCache(str(tmp_path)), "url/1")
+
+    assert logger.called
+
+
+@patch("src.scraper.URL", "url/")
+def test_scrape_pages_replay_mode_writes_cached_pages(tmp_path):
+    html_cache = HtmlCache(str(tmp_path / "cache"))
+    for page_num in range(1, 4):
+        html_cache.put(f"url/{page_num}", render_listing_page(page_num, 2))
+    filename = initialize_csv(str(tmp_path / "replayed"))
+
+    scrape_pages(html_cache, filename, 3, 2, fetch_mode="replay")
+
+    with open(filename) as file:
+        names = [line.split(",")[0] for line in file.read().splitlines()]
+    assert names[1:] == [
+        f"REALTOR {page_num}-{index}" for page_num in range(1, 4) for index in range(2)
+    ]
+
+
+@patch("src.scraper.URL", "url/")
+@patch("src.scraper.write_to_csv")
+@patch("src.scraper.render_page")
 def test_scrape_pages(mock_render, mock_write_csv):
     BATCH_SIZE = 2
     fake_driver = Mock()
@@ -315,9 +699,739 @@ def test_scrape_pages(mock_render, mock_write_csv):
     assert mock_write_csv.call_args_list[1][0][1] == expected_data[2:]
 
 
-@patch("src.final_scraper.scrape_pages")
-@patch("src.final_scraper.initialize_csv")
-@patch("src.final_scraper.provision_webdriver")
+@patch("src.scraper.URL", "url/")
+@patch("src.scraper.write_to_csv")
+@patch("src.scraper.render_page")
+def test_scrape_pages_with_driver_pool(mock_render, mock_write_csv):
+    pool = DriverPool([Mock(), Mock(), Mock()])
+    mock_render.side_effect = lambda driver, url, wait_stats, page_parser, metrics: [
+        url
+    ]
+
+    scrape_pages(pool, "fake_file.csv", 5, 2)
+
+    # Same batches in the same order as a serial run
+    assert [call[0][1] for call in mock_write_csv.call_args_list] == [
+        [["url/1"], ["url/2"]],
+        [["url/3"], ["url/4"]],
+        [["url/5"]],
+    ]
+
+
+@patch("src.scraper.URL", "url/")
+@patch("src.scraper.write_to_csv")
+@patch("src.scraper.render_page")
+def test_scrape_pages_quits_drivers_swapped_in_for_its_driver(
+    mock_render, mock_write_csv
+):
+    driver = Mock()
+    new_drivers = [Mock(), Mock()]
+    mock_render.return_value = [["fake", "data"]]
+
+    scrape_pages(
+        driver,
+        "fake_file.csv",
+        5,
+        2,
+        restart_driver=Mock(side_effect=new_drivers),
+        recycle_pages=2,
+    )
+
+    # Recycled after pages 2 and 4, the caller still quits the one it passed in
+    assert driver.quit.call_count == 1
+    assert [new_driver.quit.call_count for new_driver in new_drivers] == [1, 1]
+
+
+@patch("src.scraper.render_page")
+@patch("src.scraper.start_webdriver")
+@patch("src.scraper.provision_webdriver")
+def test_main_quits_recycled_browsers(
+    mock_prov_driver, mock_start_driver, mock_render, tmp_path, monkeypatch
+):
+    new_drivers = [Mock(), Mock()]
+    mock_start_driver.side_effect = new_drivers
+    mock_render.return_value = [["fake", "data"]]
+    # The output, checkpoint and metrics files land next to each other
+    monkeypatch.chdir(tmp_path)
+    argv = ["scraper_file.py", "5", "run", "--recycle-pages=2"]
+    with patch("sys.argv", argv), patch("src.scraper.URL", "url/"):
+        main()
+
+    assert mock_prov_driver.return_value.quit.call_count == 1
+    assert [new_driver.quit.call_count for new_driver in new_drivers] == [1, 1]
+
+
+def test_scrape_pages_http_mode_matches_csv_rows(tmp_path):
+    filename = initialize_csv(str(tmp_path / "http"))
+    fetcher = HttpFetcher()
+    with StandinSite(cards_per_page=3, js_delay_ms=None) as site:
+        with (
+            patch("src.scraper.URL", site.url),
+            patch("src.scraper.DATA_URL", site.data_url),
+        ):
+            scrape_pages(fetcher, filename, 3, 2, fetch_mode="http")
+    fetcher.quit()
+
+    with open(filename) as file:
+        lines = file.read().splitlines()
+
+    assert len(lines) == 1 + 3 * 3
+    assert lines[1].startswith("REALTOR 1-0,")
+    assert lines[-1].startswith("REALTOR 3-2,")
+
+
+@pytest.mark.parametrize("parse_workers", [0, 2])
+def test_scrape_pages_stops_after_empty_pages(parse_workers, tmp_path):
+    filename = initialize_csv(str(tmp_path / "early_stop"))
+    fetcher = HttpFetcher()
+    rate_controller = RateController(1)
+    with StandinSite(cards_per_page=2, js_delay_ms=None, total_pages=3) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            scrape_pages(
+                fetcher,
+                filename,
+                50,
+                2,
+                parse_workers=parse_workers,
+                fetch_mode="http",
+                rate_controller=rate_controller,
+                max_empty_pages=2,
+            )
+        requests_served = site.requests_served
+    fetcher.quit()
+
+    with open(filename) as file:
+        names = [line.split(",")[0] for line in file.read().splitlines()[1:]]
+    assert names == [
+        f"REALTOR {page}-{index}" for page in range(1, 4) for index in range(2)
+    ]
+    # Only the pages already queued up past the stop were loaded. With parse
+    # workers that is at most both pipeline queues full, a page held by the
+    # render and parse stages each and the pool's lookahead of 2
+    assert requests_served <= 5 + 2 * DEFAULT_QUEUE_SIZE + 2 + 2
+    # The pages without cards back off, parsed in this process or not
+    assert rate_controller.empty_pages >= 2
+    assert rate_controller.backoffs >= 1
+
+
+class StandinBrowser:
+    # Stands in for Chrome on the stand-in site, every page already rendered
+    def __init__(self, cards_per_page, total_pages):
+        self.cards_per_page = cards_per_page
+        self.total_pages = total_pages
+        self.page_num = None
+
+    def get(self, url):
+        self.page_num = int(url.rsplit("/", 1)[1])
+
+    def find_elements(self, by, selector):
+        if selector == CARD_SELECTOR:
+            cards = cards_on_page(self.page_num, self.cards_per_page, self.total_pages)
+            return ["card"] * cards
+        if selector == PAGER_CURRENT_SELECTOR:
+            return [Mock(text=str(self.page_num))]
+        return [Mock(text=str(self.total_pages))]
+
+    @property
+    def page_source(self):
+        return render_listing_page(
+            self.page_num, self.cards_per_page, total_pages=self.total_pages
+        )
+
+
+@patch("src.scraper.URL", "url/")
+@patch("src.wait.LOGGER.warning")
+def test_scrape_pages_browser_stops_after_empty_pages_without_waiting(logger, tmp_path):
+    filename = initialize_csv(str(tmp_path / "early_stop"))
+
+    start = time.perf_counter()
+    scrape_pages(
+        StandinBrowser(cards_per_page=2, total_pages=3),
+        filename,
+        50,
+        2,
+        wait_ceiling=5,
+        parse_workers=0,
+        max_empty_pages=2,
+    )
+    elapsed = time.perf_counter() - start
+
+    with open(filename) as file:
+        names = [line.split(",")[0] for line in file.read().splitlines()[1:]]
+    assert names == [
+        f"REALTOR {page}-{index}" for page in range(1, 4) for index in range(2)
+    ]
+    # The empty pages settle on the pager, no wait timed out at the ceiling
+    assert not any("did not settle" in call[0][0] for call in logger.call_args_list)
+    assert elapsed < 5
+
+
+def test_discover_pages_to_scrape_http(tmp_path):
+    fetcher = HttpFetcher()
+    with StandinSite(cards_per_page=2, js_delay_ms=None, total_pages=7) as site:
+        with patch("src.scraper.URL", site.url):
+            with patch("src.scraper.DATA_URL", site.data_url):
+                from_json = discover_pages_to_scrape(fetcher, "http")
+            with patch("src.scraper.DATA_URL", None):
+                from_html = discover_pages_to_scrape(fetcher, "http")
+    with StandinSite(cards_per_page=2, js_delay_ms=None) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            unknown = discover_pages_to_scrape(fetcher, "http")
+    fetcher.quit()
+
+    assert (from_json, from_html) == (7, 7)
+    assert unknown == UNKNOWN_PAGE_COUNT
+
+
+def test_find_page_count_in_records():
+    assert find_page_count_in_records({"Paging": {"TotalPages": "5"}}) == 5
+    records = {"Results": [{}, {}], "Paging": {"TotalRecords": 9}}
+    assert find_page_count_in_records(records) == 5
+    assert find_page_count_in_records([{}]) is None
+
+
+def test_scrape_pages_exports_metrics(tmp_path):
+    filename = initialize_csv(str(tmp_path / "measured"))
+    fetcher = HttpFetcher()
+    with StandinSite(cards_per_page=3, js_delay_ms=None, missing_rate=0.3) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            with patch("src.parse.LOGGER.error"):
+                scrape_pages(
+                    fetcher,
+                    filename,
+                    3,
+                    2,
+                    fetch_mode="http",
+                    metrics_path=str(tmp_path / "measured"),
+                )
+    fetcher.quit()
+
+    with open(tmp_path / "measured.metrics.json") as file:
+        summary = json.load(file)
+    expected_rows = [
+        row for page in range(1, 4) for row in expected_page_data(page, 3, 0.3)
+    ]
+    assert (summary["pages"], summary["cards"]) == (3, 9)
+    assert sum(summary["missing_fields"].values()) == sum(
+        value == "" for row in expected_rows for value in row
+    )
+    assert summary["stages"]["fetch"]["count"] == 3
+    assert summary["stages"]["parse"]["count"] == 3
+    assert summary["stages"]["checkpoint"]["count"] == 2
+    assert summary["rate"]["pages"] == 3
+    assert summary["gauges"]["rate_concurrency"] == 1
+    assert os.path.exists(tmp_path / "measured.prom")
+
+
+def test_scrape_pages_normalizes_and_reports_hit_rates(tmp_path):
+    filename = initialize_csv(str(tmp_path / "normalized"))
+    fetcher = HttpFetcher()
+    with StandinSite(cards_per_page=8, js_delay_ms=None) as site:
+        with patch("src.scraper.URL", site.url), patch("src.scraper.DATA_URL", None):
+            scrape_pages(
+                fetcher,
+                filename,
+                2,
+                2,
+                fetch_mode="http",
+                metrics_path=str(tmp_path / "normalized"),
+                normalizer=Normalizer(),
+            )
+    fetcher.quit()
+
+    with open(filename) as file:
+        lines = file.read().splitlines()
+    assert lines[1] == (
+        'REALTOR 1-0,SALESPERSON,OFFICE 0,"0 MAIN ST, OMAHA, NEBRASKA",+15550010000'
+    )
+    with open(tmp_path / "normalized.metrics.json") as file:
+        summary = json.load(file)
+    # Four offices across sixteen cards
+    assert summary["normalize"]["company"]["hit_rate"] == 0.75
+    assert summary["gauges"]["normalize_company_hit_rate"] == 0.75
+    assert summary["stages"]["normalize"]["count"] == 2
+
+
+@patch("src.scraper.URL", "url/")
+@patch("src.scraper.render_page")
+def test_scrape_pages_resumes_after_a_failed_page(mock_render, tmp_path):
+    input_name = str(tmp_path / "resumable")
+    failing_pages = {3}
+
+    def render(driver, url, wait_stats, page_parser, metrics):
+        page_num = int(url.split("/")[-1])
+        if page_num in failing_pages:
+            raise Exception("EXCEPTION INFO")
+        return [RealtorData(f"name {page_num}", "", "", "", "")]
+
+    mock_render.side_effect = render
+
+    filename = initialize_csv(input_name)
+    journal = CheckpointJournal.for_output(filename)
+    with pytest.raises(Exception):
+        scrape_pages(Mock(), filename, 5, 2, journal=journal)
+
+    failing_pages.clear()
+    mock_render.reset_mock()
+    filename, journal = resume_csv(input_name)
+    scrape_pages(Mock(), filename, 5, 2, journal=journal)
+
+    rendered_urls = [call[0][1] for call in mock_render.call_args_list]
+    assert rendered_urls == ["url/3", "url/4", "url/5"]
+    with open(filename) as file:
+        names = [line.split(",")[0] for line in file.read().splitlines()]
+    assert names == ["name", "name 1", "name 2", "name 3", "name 4", "name 5"]
+
+
+@patch("src.scraper.URL", "url/")
+@patch("src.scraper.render_page")
+def test_scrape_pages_streaming_resumes_after_a_failed_page(mock_render, tmp_path):
+    input_name = str(tmp_path / "streamed")
+    failing_pages = {4}
+
+    def render(driver, url, wait_stats, page_parser, metrics):
+        page_num = int(url.split("/")[-1])
+        if page_num in failing_pages:
+            raise Exception("EXCEPTION INFO")
+        return [RealtorData(f"name {page_num}", "", "", "", "")]
+
+    mock_render.side_effect = render
+
+    filename = initialize_csv(input_name)
+    journal = CheckpointJournal.for_output(filename)
+    sink = StreamingCsvWriter(filename, journal)
+    with pytest.raises(Exception):
+        scrape_pages(Mock(), filename, 5, 2, journal=journal, sink=sink)
+    # Page 3 is in the file but its batch never got a checkpoint
+    sink.close()
+
+    failing_pages.clear()
+    filename, journal = resume_csv(input_name)
+    sink = StreamingCsvWriter(filename, journal)
+    scrape_pages(Mock(), filename, 5, 2, journal=journal, sink=sink)
+    sink.close()
+
+    with open(filename) as file:
+        names = [line.split(",")[0] for line in file.read().splitlines()]
+    assert names == ["name", "name 1", "name 2", "name 3", "name 4", "name 5"]
+
+
+def test_resume_csv_drops_rows_after_last_checkpoint(tmp_path):
+    input_name = str(tmp_path / "partial")
+    filename = initialize_csv(input_name)
+    journal = CheckpointJournal.for_output(filename)
+    journal.start(4)
+    write_to_csv(filename, [[VALID_RESULTS]])
+    journal.commit_batch([1])
+    # Crash after the rows of the next batch but before its checkpoint
+    write_to_csv(filename, [[VALID_RESULTS._replace(name="UNCOMMITTED")]])
+
+    filename, journal = resume_csv(input_name)
+
+    with open(filename) as file:
+        assert "UNCOMMITTED" not in file.read()
+    assert journal.pending_pages(4) == [2, 3, 4]
+
+
+@patch("src.scraper.LOGGER.critical")
+def test_resume_csv_without_journal_exits(logger, tmp_path):
+    input_name = str(tmp_path / "no_journal")
+    initialize_csv(input_name)
+
+    with pytest.raises(SystemExit):
+        resume_csv(input_name)
+
+    assert logger.called
+
+
+def test_resume_csv_with_nothing_to_resume_starts_new_file(tmp_path):
+    input_name = str(tmp_path / "new_run")
+
+    filename, journal = resume_csv(input_name)
+
+    assert filename == f"{input_name}.csv"
+    assert journal.pending_pages(2) == [1, 2]
+
+
+@patch("src.scraper.URL", "url/")
+@patch("src.scraper.write_to_csv")
+@patch("src.scraper.scrape_pages_pipelined")
+@patch("src.scraper.extract_page_in_browser")
+def test_scrape_pages_script_extract_mode(mock_extract, mock_pipelined, mock_write_csv):
+    mock_extract.return_value = ["data"]
+
+    scrape_pages(Mock(), "fake_file.csv", 2, 2, parse_workers=2, extract_mode="script")
+
+    assert not mock_pipelined.called
+    assert mock_extract.call_count == 2
+    assert mock_extract.call_args_list[0][1]["compare"] is False
+
+
+@patch("src.scraper.scrape_pages_pipelined")
+@patch("src.scraper.render_page")
+def test_scrape_pages_with_parse_workers_uses_pipeline(mock_render, mock_pipelined):
+    fake_driver = Mock()
+
+    scrape_pages(fake_driver, "fake_file.csv", 4, 2, parse_workers=3)
+
+    assert not mock_render.called
+    assert mock_pipelined.call_args_list[0][0][0].drivers == [fake_driver]
+    assert mock_pipelined.call_args_list[0][0][2] == [1, 2, 3, 4]
+    assert mock_pipelined.call_args_list[0][0][5] == 3
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_exports_metrics_next_to_output(
+    mock_prov_driver, mock_init_csv, mock_scrape_pages
+):
+    with patch("sys.argv", ["scraper_file.py", "3", "my_run"]):
+        main()
+
+    assert mock_scrape_pages.call_args_list[0][1]["metrics_path"] == "my_run"
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_parse_workers_option(mock_prov_driver, mock_init_csv, mock_scrape_pages):
+    with patch("sys.argv", ["scraper_file.py", "3", "--parse-workers=2"]):
+        main()
+
+    assert mock_scrape_pages.call_args_list[0][1]["parse_workers"] == 2
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+@patch("src.scraper.provision_http_fetcher")
+def test_main_fetch_http_option(
+    mock_prov_fetcher, mock_prov_driver, mock_init_csv, mock_scrape_pages
+):
+    with patch("sys.argv", ["scraper_file.py", "3", "--fetch=http"]):
+        main()
+
+    assert not mock_prov_driver.called
+    assert isinstance(mock_scrape_pages.call_args_list[0][0][0], DriverPool)
+    assert mock_scrape_pages.call_args_list[0][1]["fetch_mode"] == "http"
+    assert mock_prov_fetcher.return_value.quit.called
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_profile_option(mock_prov_driver, mock_init_csv, mock_scrape_pages):
+    with patch("sys.argv", ["scraper_file.py", "--profile=lean"]):
+        main()
+
+    assert mock_prov_driver.call_args_list[0][1]["profile"] == "lean"
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_parser_options(mock_prov_driver, mock_init_csv, mock_scrape_pages):
+    argv = ["scraper_file.py", "--parser=lxml", "--strain-cards"]
+    with patch("sys.argv", argv), patch("src.parse.find_spec", return_value=Mock()):
+        main()
+
+    page_parser = mock_scrape_pages.call_args_list[0][1]["page_parser"]
+    assert page_parser.keywords == {"parser": "lxml", "strain_cards": True}
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_extract_option(mock_prov_driver, mock_init_csv, mock_scrape_pages):
+    with patch("sys.argv", ["scraper_file.py", "--extract=compare"]):
+        main()
+
+    assert mock_scrape_pages.call_args_list[0][1]["extract_mode"] == "compare"
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.SqliteSink")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_sqlite_output_option(
+    mock_prov_driver, mock_init_csv, mock_sqlite_sink, mock_scrape_pages
+):
+    with patch(
+        "sys.argv", ["scraper_file.py", "3", "test_filename", "--output=sqlite"]
+    ):
+        main()
+
+    assert not mock_init_csv.called
+    assert mock_sqlite_sink.call_args_list[0][0][0] == "test_filename.db"
+    assert mock_scrape_pages.call_args_list[0][1]["sink"] == (
+        mock_sqlite_sink.return_value
+    )
+    assert mock_scrape_pages.call_args_list[0][1]["journal"] is None
+    assert mock_sqlite_sink.return_value.close.called
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.PageFingerprints")
+@patch("src.scraper.provision_webdriver")
+def test_main_sqlite_delta_goes_to_its_own_database(
+    mock_prov_driver, mock_fingerprints, mock_scrape_pages, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    with patch("sys.argv", ["scraper_file.py", "3", "mix", "--output=sqlite"]):
+        main()
+    argv = ["scraper_file.py", "3", "mix", "--output=sqlite", "--delta"]
+    with patch("sys.argv", argv):
+        main()
+
+    assert mock_scrape_pages.call_args_list[1][0][1] == "mix.delta.db"
+    connection = sqlite3.connect(tmp_path / "mix.delta.db")
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(realtors)")]
+    connection.close()
+    assert columns[0] == "change"
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.PageFingerprints")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_delta_option(
+    mock_prov_driver,
+    mock_init_csv,
+    mock_fingerprints,
+    mock_scrape_pages,
+    streaming_writer,
+):
+    with patch("sys.argv", ["scraper_file.py", "3", "test_filename", "--delta"]):
+        main()
+
+    assert mock_init_csv.call_args_list[0][0][1][0] == "change"
+    assert mock_fingerprints.for_output.call_args_list[0][0][0] == "test_filename"
+    sink = mock_scrape_pages.call_args_list[0][1]["sink"]
+    assert sink.sink == streaming_writer.return_value
+    assert sink.pages_to_scrape == 3
+    assert mock_fingerprints.for_output.return_value.close.called
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.HtmlCache")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_replay_option(
+    mock_prov_driver, mock_init_csv, mock_html_cache, mock_scrape_pages
+):
+    with patch("sys.argv", ["scraper_file.py", "3", "--fetch=replay", "--cache=saved"]):
+        main()
+
+    assert not mock_prov_driver.called
+    assert mock_html_cache.call_args_list[0][0][0] == "saved"
+    assert mock_scrape_pages.call_args_list[0][0][0] == mock_html_cache.return_value
+    assert mock_scrape_pages.call_args_list[0][1]["fetch_mode"] == "replay"
+    assert mock_html_cache.return_value.quit.call_count == 1
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.HtmlCache")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_cache_option(
+    mock_prov_driver, mock_init_csv, mock_html_cache, mock_scrape_pages
+):
+    with patch("sys.argv", ["scraper_file.py", "3", "--cache", "--cache-mb=10"]):
+        main()
+
+    assert mock_html_cache.call_args_list[0][0][0] == "html_cache"
+    assert mock_html_cache.call_args_list[0][1]["max_bytes"] == 10 * 1024 * 1024
+    assert mock_scrape_pages.call_args_list[0][1]["html_cache"] == (
+        mock_html_cache.return_value
+    )
+    assert mock_prov_driver.return_value.quit.called
+    assert mock_html_cache.return_value.quit.called
+
+
+@patch("src.scraper.ParquetSink")
+def test_open_output_parquet(mock_parquet_sink):
+    filename, journal, sink = open_output("test_filename", "parquet")
+
+    assert filename == "test_filename.parquet"
+    assert journal is None
+    assert sink == mock_parquet_sink.return_value
+    assert mock_parquet_sink.call_args_list[0][0][1] == RealtorData._fields
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.resume_csv")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_resume_option(
+    mock_prov_driver, mock_init_csv, mock_resume_csv, mock_scrape_pages
+):
+    mock_resume_csv.return_value = ("test_filename.csv", Mock())
+    with patch("sys.argv", ["scraper_file.py", "3", "test_filename", "--resume"]):
+        main()
+
+    assert not mock_init_csv.called
+    assert mock_resume_csv.call_args_list[0][0][0] == "test_filename"
+    assert mock_scrape_pages.call_args_list[0][0][1] == "test_filename.csv"
+    assert (
+        mock_scrape_pages.call_args_list[0][1]["journal"]
+        == (mock_resume_csv.return_value[1])
+    )
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_streams_to_csv_writer(
+    mock_prov_driver, mock_init_csv, mock_scrape_pages, streaming_writer
+):
+    mock_scrape_pages.side_effect = Exception("EXCEPTION INFO")
+    with patch("sys.argv", ["scraper_file.py", "3"]):
+        with pytest.raises(Exception):
+            main()
+
+    assert streaming_writer.call_args_list[0][0][0] == mock_init_csv.return_value
+    assert mock_scrape_pages.call_args_list[0][1]["sink"] == (
+        streaming_writer.return_value
+    )
+    assert streaming_writer.return_value.close.called
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_quits_driver_when_scrape_fails(
+    mock_prov_driver, mock_init_csv, mock_scrape_pages
+):
+    mock_scrape_pages.side_effect = Exception("EXCEPTION INFO")
+
+    with patch("sys.argv", ["scraper_file.py", "3"]):
+        with pytest.raises(Exception):
+            main()
+
+    assert mock_prov_driver.return_value.quit.called
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+@patch("src.scraper.discover_pages_to_scrape", return_value=7)
+def test_main_auto_pages(
+    mock_discover, mock_prov_driver, mock_init_csv, mock_scrape_pages
+):
+    with patch("sys.argv", ["scraper_file.py", "auto", "--stop-after-empty=5"]):
+        main()
+
+    assert isinstance(mock_discover.call_args_list[0][0][0], DriverPool)
+    assert mock_prov_driver.return_value.quit.called
+    assert mock_scrape_pages.call_args_list[0][0][2] == 7
+    assert mock_scrape_pages.call_args_list[0][1]["max_empty_pages"] == 5
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_rate_options(mock_prov_driver, mock_init_csv, mock_scrape_pages):
+    argv = [
+        "scraper_file.py",
+        "3",
+        "--workers=1",
+        "--target-latency=2.5",
+        "--min-interval=0.5",
+        "--max-interval=4",
+    ]
+    with patch("sys.argv", argv):
+        main()
+
+    rate_controller = mock_scrape_pages.call_args_list[0][1]["rate_controller"]
+    assert rate_controller.target_latency == 2.5
+    assert rate_controller.interval == 0.5
+    assert rate_controller.max_interval == 4
+    assert rate_controller.max_concurrency == 1
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_recycle_options(mock_prov_driver, mock_init_csv, mock_scrape_pages):
+    argv = ["scraper_file.py", "3", "--recycle-pages=50", "--recycle-rss-mb=512"]
+    with patch("sys.argv", argv):
+        main()
+
+    kwargs = mock_scrape_pages.call_args_list[0][1]
+    assert kwargs["recycle_pages"] == 50
+    assert kwargs["recycle_rss_bytes"] == 512 * 1024 * 1024
+    assert kwargs["restart_driver"].func == start_webdriver
+
+
+def test_import_has_no_side_effects_and_leaves_selenium_out(tmp_path):
+    env = {key: value for key, value in os.environ.items() if key != "WEBSITE_URL"}
+    env["PYTHONPATH"] = PROJECT_DIR
+    # No .env in tmp_path, and Selenium fails if anything imports it
+    code = (
+        "import logging, sys; sys.modules['selenium'] = None; "
+        "import src.scraper, src.api; "
+        "assert not logging.getLogger('scraper').handlers; "
+        "assert src.scraper.URL is None; "
+        "assert not {'bs4', 'dotenv', 'requests'} & set(sys.modules); "
+        "import src.shard; "
+        "from benchmarks.standin_site import render_listing_page; "
+        "print(len(src.scraper.parse_page_source(render_listing_page(1, 3))))"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "3"
+
+
+@patch("src.scraper.LOGGER.critical")
+def test_main_without_website_url(logger, monkeypatch):
+    monkeypatch.delenv("WEBSITE_URL")
+    with (
+        patch("sys.argv", ["scraper_file.py", "3"]),
+        patch("dotenv.load_dotenv"),
+        pytest.raises(SystemExit),
+    ):
+        main()
+
+    assert "WEBSITE_URL" in logger.call_args[0][0]
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_normalize_option(mock_prov_driver, mock_init_csv, mock_scrape_pages):
+    with patch("sys.argv", ["scraper_file.py", "3"]):
+        main()
+    with patch("sys.argv", ["scraper_file.py", "3", "--normalize"]):
+        main()
+
+    assert mock_scrape_pages.call_args_list[0][1]["normalizer"] is None
+    assert isinstance(mock_scrape_pages.call_args_list[1][1]["normalizer"], Normalizer)
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.DriverPool.provision")
+def test_main_workers_option(mock_provision, mock_init_csv, mock_scrape_pages):
+    with patch("sys.argv", ["scraper_file.py", "3", "--workers=4"]):
+        main()
+
+    assert mock_provision.call_args_list[0][0][0] == 4
+    assert mock_scrape_pages.call_args_list[0][0][0] == mock_provision.return_value
+    assert mock_provision.return_value.quit.called
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
 def test_main_one_arg(mock_prov_driver, mock_init_csv, mock_scrape_pages):
     with patch("sys.argv", ["scraper_file.py"]):
         main()
@@ -328,14 +1442,15 @@ def test_main_one_arg(mock_prov_driver, mock_init_csv, mock_scrape_pages):
     assert mock_init_csv.call_args_list[0][0][0] == DEFAULT_FILENAME
 
     assert mock_scrape_pages.called
-    assert mock_scrape_pages.call_args_list[0][0][0] == mock_prov_driver.return_value
+    assert isinstance(mock_scrape_pages.call_args_list[0][0][0], DriverPool)
+    assert mock_prov_driver.return_value.quit.called
     assert mock_scrape_pages.call_args_list[0][0][1] == mock_init_csv.return_value
     assert mock_scrape_pages.call_args_list[0][0][2] == DEFAULT_PAGES_TO_SCRAPE
 
 
-@patch("src.final_scraper.scrape_pages")
-@patch("src.final_scraper.initialize_csv")
-@patch("src.final_scraper.provision_webdriver")
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
 def test_main_two_arg(mock_prov_driver, mock_init_csv, mock_scrape_pages):
     with patch("sys.argv", ["scraper_file.py", "3"]):
         main()
@@ -346,14 +1461,15 @@ def test_main_two_arg(mock_prov_driver, mock_init_csv, mock_scrape_pages):
     assert mock_init_csv.call_args_list[0][0][0] == DEFAULT_FILENAME
 
     assert mock_scrape_pages.called
-    assert mock_scrape_pages.call_args_list[0][0][0] == mock_prov_driver.return_value
+    assert isinstance(mock_scrape_pages.call_args_list[0][0][0], DriverPool)
+    assert mock_prov_driver.return_value.quit.called
     assert mock_scrape_pages.call_args_list[0][0][1] == mock_init_csv.return_value
     assert mock_scrape_pages.call_args_list[0][0][2] == 3
 
 
-@patch("src.final_scraper.scrape_pages")
-@patch("src.final_scraper.initialize_csv")
-@patch("src.final_scraper.provision_webdriver")
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
 def test_main_three_arg(mock_prov_driver, mock_init_csv, mock_scrape_pages):
     with patch("sys.argv", ["scraper_file.py", "3", "test_filename"]):
         main()
@@ -364,12 +1480,13 @@ def test_main_three_arg(mock_prov_driver, mock_init_csv, mock_scrape_pages):
     assert mock_init_csv.call_args_list[0][0][0] == "test_filename"
 
     assert mock_scrape_pages.called
-    assert mock_scrape_pages.call_args_list[0][0][0] == mock_prov_driver.return_value
+    assert isinstance(mock_scrape_pages.call_args_list[0][0][0], DriverPool)
+    assert mock_prov_driver.return_value.quit.called
     assert mock_scrape_pages.call_args_list[0][0][1] == mock_init_csv.return_value
     assert mock_scrape_pages.call_args_list[0][0][2] == 3
 
 
-@patch("src.final_scraper.LOGGER.critical")
+@patch("src.scraper.LOGGER.critical")
 def test_main_too_many_args(logger):
     with pytest.raises(SystemExit):
         with patch(
@@ -383,3 +1500,14 @@ def test_main_too_many_args(logger):
             The first is number of pages to scrape, \
             second argument should be the name of the file you want to save to e.g myfile, data_file"
     )
+
+
+@patch("src.scraper.scrape_pages")
+@patch("src.scraper.initialize_csv")
+@patch("src.scraper.provision_webdriver")
+def test_main_wait_ceiling_option(mock_prov_driver, mock_init_csv, mock_scrape_pages):
+    with patch("sys.argv", ["scraper_file.py", "3", "--wait-ceiling=2.5"]):
+        main()
+
+    assert mock_scrape_pages.call_args_list[0][0][2] == 3
+    assert mock_scrape_pages.call_args_list[0][1]["wait_ceiling"] == 2.5
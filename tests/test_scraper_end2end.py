@@ -1,22 +1,28 @@
 import pytest
-from src.final_scraper import RealtorData, main
+from src.scraper import RealtorData, main
 from unittest.mock import patch
 from csv import reader
 import os
+import time
+from benchmarks.standin_site import StandinSite
 
 TEST_FILENAME = "test_filename"
+# main writes a checkpoint journal and the run metrics next to the CSV
+OUTPUT_SUFFIXES = [".csv", ".csv.checkpoint", ".metrics.json", ".prom"]
 
 
 @pytest.fixture(autouse=True)
 def cleanup_test_csv_file():
     yield
-    os.remove(f"{TEST_FILENAME}.csv")
+    for suffix in OUTPUT_SUFFIXES:
+        if os.path.exists(f"{TEST_FILENAME}{suffix}"):
+            os.remove(f"{TEST_FILENAME}{suffix}")
 
 
 # Run a test with batching
 # We already tested that batching works via unit tests
 # Now just need to ensure we get expected results for batching
-@patch("src.final_scraper.BATCH_SIZE", 2)
+@patch("src.scraper.BATCH_SIZE", 2)
 def test_scraper_e2e_with_batching():
     with patch("sys.argv", ["scraper_file.py", "3", TEST_FILENAME]):
         main()
@@ -52,3 +58,56 @@ def test_scraper_e2e_no_batching():
         for row in csv_reader:
             assert len(row) == 5
             assert all(isinstance(item, str) for item in row)
+
+
+# Stand-in site renders its cards via JS after a delay
+# The old fixed 8 second sleep would take at least 16 seconds for 2 pages
+def test_scraper_e2e_standin_site_waits_for_cards(monkeypatch):
+    with StandinSite(cards_per_page=6, js_delay_ms=600) as site:
+        # main reads the site from the environment, like a real run
+        monkeypatch.setenv("WEBSITE_URL", site.url)
+        with patch("sys.argv", ["scraper_file.py", "2", TEST_FILENAME]):
+            start = time.perf_counter()
+            main()
+            elapsed = time.perf_counter() - start
+
+    with open(f"{TEST_FILENAME}.csv", "r") as file:
+        rows = list(reader(file))
+
+    assert rows[0] == list(RealtorData._fields)
+    assert len(rows) == 1 + 2 * 6
+    assert elapsed < 16
+
+
+def test_scraper_e2e_lean_profile_skips_assets(monkeypatch):
+    with StandinSite(cards_per_page=6, js_delay_ms=300) as site:
+        # main reads the site from the environment, like a real run
+        monkeypatch.setenv("WEBSITE_URL", site.url)
+        with patch(
+            "sys.argv", ["scraper_file.py", "2", TEST_FILENAME, "--profile=lean"]
+        ):
+            main()
+        assets_served = site.assets_served
+
+    with open(f"{TEST_FILENAME}.csv", "r") as file:
+        rows = list(reader(file))
+
+    assert len(rows) == 1 + 2 * 6
+    assert assets_served == 0
+
+
+@patch("src.scraper.LOGGER.warning")
+def test_scraper_e2e_script_extract_matches_soup(logger, monkeypatch):
+    with StandinSite(cards_per_page=6, js_delay_ms=300) as site:
+        # main reads the site from the environment, like a real run
+        monkeypatch.setenv("WEBSITE_URL", site.url)
+        with patch(
+            "sys.argv", ["scraper_file.py", "2", TEST_FILENAME, "--extract=compare"]
+        ):
+            main()
+
+    with open(f"{TEST_FILENAME}.csv", "r") as file:
+        rows = list(reader(file))
+
+    assert len(rows) == 1 + 2 * 6
+    assert not logger.called
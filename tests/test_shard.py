@@ -0,0 +1,264 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from benchmarks.standin_site import StandinSite
+from src.parse import RealtorData
+from src.shard import (
+    MAX_ATTEMPTS,
+    HttpCoordinator,
+    LeaseCoordinator,
+    LeaseLost,
+    make_coordinator_server,
+    merge_shards,
+    run_worker,
+    scrape_range,
+    shard_path,
+)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def expected_names(pages, cards_per_page=2):
+    return [
+        f"REALTOR {page_num}-{index}"
+        for page_num in pages
+        for index in range(cards_per_page)
+    ]
+
+
+def merged_names(path):
+    with open(path) as file:
+        lines = file.read().splitlines()
+    assert lines[0] == ",".join(RealtorData._fields)
+    return [line.split(",")[0] for line in lines[1:]]
+
+
+def fake_scrape_pages(driver, filename, last_page, first_page, sink, **options):
+    for page_num in range(first_page, last_page + 1):
+        sink.write_page(
+            page_num,
+            [RealtorData(name, "", "", "", "") for name in expected_names([page_num])],
+        )
+
+
+def test_plan_splits_pages_into_ranges_once(tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / "coordinator.db"))
+
+    assert coordinator.plan(23, 10) == 3
+    assert coordinator.plan(50, 5) == 3
+    assert [
+        (page_range["first_page"], page_range["last_page"])
+        for page_range in coordinator.ranges()
+    ] == [(1, 10), (11, 20), (21, 23)]
+    assert coordinator.status() == {"pending": 3}
+
+
+def test_lease_hands_each_range_to_one_worker(tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / "coordinator.db"))
+    coordinator.plan(4, 2)
+
+    first = coordinator.lease("a")
+    second = coordinator.lease("b")
+
+    assert (first["first_page"], second["first_page"]) == (1, 3)
+    assert coordinator.lease("c") is None
+    assert not coordinator.finished()
+    assert not coordinator.complete(first["range_id"], "b")
+    assert coordinator.complete(first["range_id"], "a")
+    assert coordinator.complete(second["range_id"], "b")
+    assert coordinator.finished()
+
+
+@patch("src.shard.LOGGER.warning")
+def test_expired_lease_is_requeued(logger, tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / "coordinator.db"))
+    coordinator.plan(2, 2)
+    now = time.time()
+
+    with patch("src.shard.time.time", return_value=now):
+        dead = coordinator.lease("dead", lease_seconds=10)
+    with patch("src.shard.time.time", return_value=now + 5):
+        assert coordinator.lease("alive", lease_seconds=10) is None
+    with patch("src.shard.time.time", return_value=now + 11):
+        taken_over = coordinator.lease("alive", lease_seconds=10)
+
+    assert taken_over["range_id"] == dead["range_id"]
+    assert "held by dead expired" in logger.call_args[0][0]
+    # The dead worker can neither keep nor finish a range it lost
+    assert not coordinator.renew(dead["range_id"], "dead")
+    assert not coordinator.complete(dead["range_id"], "dead")
+    assert coordinator.complete(taken_over["range_id"], "alive")
+
+
+def test_range_fails_after_max_attempts(tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / "coordinator.db"))
+    coordinator.plan(1, 1)
+
+    for _ in range(MAX_ATTEMPTS):
+        lease = coordinator.lease("a")
+        coordinator.release(lease["range_id"], "a")
+
+    assert coordinator.lease("a") is None
+    assert coordinator.status() == {"failed": 1}
+    assert coordinator.finished()
+
+
+def test_http_coordinator_serves_the_same_calls(tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / "coordinator.db"))
+    server = make_coordinator_server(coordinator, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = HttpCoordinator(f"http://127.0.0.1:{server.server_address[1]}")
+    try:
+        assert client.plan(3, 2) == 2
+        lease = client.lease("remote", lease_seconds=30)
+        assert lease == {"range_id": 1, "first_page": 1, "last_page": 2}
+        assert client.renew(lease["range_id"], "remote", 30)
+        assert client.complete(lease["range_id"], "remote")
+        assert client.status() == {"done": 1, "pending": 1}
+        assert not client.finished()
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_run_worker_writes_shards_and_merge_keeps_page_order(tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / "coordinator.db"))
+    coordinator.plan(7, 3)
+    shard_dir = str(tmp_path / "shards")
+
+    ranges_done = run_worker(
+        fake_scrape_pages, Mock(), coordinator, "w", shard_dir, poll_seconds=0
+    )
+    merged = merge_shards(coordinator, shard_dir, str(tmp_path / "merged.csv"))
+
+    assert ranges_done == 3
+    assert sorted(os.listdir(shard_dir)) == [
+        os.path.basename(shard_path(shard_dir, first, last))
+        for first, last in [(1, 3), (4, 6), (7, 7)]
+    ]
+    assert merged_names(merged) == expected_names(range(1, 8))
+    # One line ending throughout, the same as a csv written in one go
+    with open(merged, "rb") as file:
+        merged_bytes = file.read()
+    assert merged_bytes.count(b"\n") == merged_bytes.count(b"\r\n") == 1 + 7 * 2
+
+
+@patch("src.shard.LOGGER.error")
+def test_run_worker_hands_back_failed_ranges(logger, tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / "coordinator.db"))
+    coordinator.plan(2, 1)
+    shard_dir = str(tmp_path / "shards")
+
+    def flaky_scrape_pages(driver, filename, last_page, first_page, sink, **options):
+        if first_page == 2:
+            raise ValueError("site broke")
+        fake_scrape_pages(driver, filename, last_page, first_page, sink)
+
+    run_worker(flaky_scrape_pages, Mock(), coordinator, "w", shard_dir, poll_seconds=0)
+
+    assert [page_range["state"] for page_range in coordinator.ranges()] == [
+        "done",
+        "failed",
+    ]
+    assert logger.call_count == MAX_ATTEMPTS
+    # Nothing half written is left to be merged
+    assert os.listdir(shard_dir) == [os.path.basename(shard_path(shard_dir, 1, 1))]
+    with pytest.raises(SystemExit), patch("src.shard.LOGGER.critical"):
+        merge_shards(coordinator, shard_dir, str(tmp_path / "merged.csv"))
+
+
+@patch("src.shard.LOGGER.warning")
+def test_worker_stops_writing_once_its_lease_is_lost(logger, tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / "coordinator.db"))
+    coordinator.plan(3, 3)
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+
+    def stuck_scrape_pages(driver, filename, last_page, first_page, sink, **options):
+        # Another worker takes the range over while this one is stuck
+        coordinator.connection.execute("UPDATE ranges SET worker = 'other'")
+        for page_num in range(first_page, last_page + 1):
+            time.sleep(0.2)
+            sink.write_page(page_num, [])
+
+    with pytest.raises(LeaseLost):
+        scrape_range(
+            stuck_scrape_pages,
+            Mock(),
+            coordinator,
+            coordinator.lease("w", lease_seconds=0.3),
+            "w",
+            str(shard_dir),
+            lease_seconds=0.3,
+        )
+
+    assert "Lost the lease" in logger.call_args[0][0]
+    assert os.listdir(shard_dir) == []
+
+
+def test_workers_in_separate_processes_share_the_pages(tmp_path):
+    coordinator_path = str(tmp_path / "coordinator.db")
+    coordinator = LeaseCoordinator(coordinator_path)
+    coordinator.plan(12, 2)
+    # A worker that died holding pages 1 and 2, the others pick them up
+    # once its lease runs out
+    coordinator.lease("dead", lease_seconds=1)
+
+    with StandinSite(cards_per_page=2, js_delay_ms=None) as site:
+        env = {**os.environ, "PYTHONPATH": PROJECT_DIR, "WEBSITE_URL": site.url}
+        env.pop("LISTING_DATA_URL", None)
+        workers = [
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "src.shard",
+                    "work",
+                    coordinator_path,
+                    "shards",
+                    "--fetch=http",
+                    f"--worker=node-{index}",
+                    "--poll-seconds=0.2",
+                ],
+                cwd=tmp_path,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            )
+            for index in range(3)
+        ]
+        outputs = [worker.communicate(timeout=60)[0] for worker in workers]
+
+    assert [worker.returncode for worker in workers] == [0, 0, 0], outputs
+    assert "held by dead expired" in "".join(outputs)
+    ranges = coordinator.ranges()
+    assert {page_range["state"] for page_range in ranges} == {"done"}
+    assert ranges[0]["worker"] != "dead"
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "src.shard",
+            "merge",
+            coordinator_path,
+            "shards",
+            "merged",
+        ],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": PROJECT_DIR},
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert merged_names(tmp_path / "merged.csv") == expected_names(range(1, 13))
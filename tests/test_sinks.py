@@ -0,0 +1,211 @@
+import json
+import sqlite3
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.checkpoint import CheckpointJournal
+from src.scraper import RealtorData, initialize_csv, write_to_csv
+from src.sinks import (
+    BatchSink,
+    ParquetSink,
+    SqliteSink,
+    StreamingCsvWriter,
+    realtor_key,
+)
+
+
+def make_page(page_num, cards=3):
+    return [
+        RealtorData(f"name {page_num}-{i}", "role", "office", "1 St, City", "555")
+        for i in range(cards)
+    ]
+
+
+def test_streaming_writer_matches_write_to_csv(tmp_path):
+    pages = [make_page(page_num) for page_num in range(1, 4)]
+    expected = initialize_csv(str(tmp_path / "batch"))
+    write_to_csv(expected, pages)
+
+    filename = initialize_csv(str(tmp_path / "streamed"))
+    sink = StreamingCsvWriter(filename)
+    for page_num, page_data in enumerate(pages, 1):
+        sink.write_page(page_num, page_data)
+    sink.close()
+
+    with open(expected) as expected_file, open(filename) as file:
+        assert file.read() == expected_file.read()
+
+
+def test_streaming_writer_flushes_on_row_threshold(tmp_path):
+    filename = initialize_csv(str(tmp_path / "rows"))
+    sink = StreamingCsvWriter(filename, flush_rows=6, flush_seconds=60)
+    for page_num in range(1, 5):
+        sink.write_page(page_num, make_page(page_num))
+    sink.close()
+
+    assert sink.rows_written == 12
+    assert sink.flushes == 2
+    assert sink.fsyncs == 0
+
+
+def test_streaming_writer_flushes_on_interval(tmp_path):
+    filename = initialize_csv(str(tmp_path / "interval"))
+    sink = StreamingCsvWriter(filename, flush_seconds=0.05)
+    sink.write_page(1, make_page(1))
+    time.sleep(0.3)
+
+    with open(filename) as file:
+        assert len(file.read().splitlines()) == 1 + 3
+    sink.close()
+
+
+def test_streaming_writer_checkpoint_commits_synced_output(tmp_path):
+    filename = initialize_csv(str(tmp_path / "journaled"))
+    journal = CheckpointJournal.for_output(filename)
+    journal.start(3)
+    sink = StreamingCsvWriter(filename, journal)
+
+    sink.write_page(1, make_page(1))
+    sink.write_page(2, make_page(2))
+    sink.checkpoint([1, 2])
+    sink.write_page(3, make_page(3))
+    sink.close()
+
+    entries = [json.loads(line) for line in open(journal.path)]
+    assert entries[-1]["pages"] == [1, 2]
+    with open(filename, "rb") as file:
+        committed = file.read()[: entries[-1]["output_bytes"]]
+    assert len(committed.decode().splitlines()) == 1 + 6
+    assert journal.pending_pages(3) == [3]
+    assert sink.fsyncs == 1
+
+
+@patch("src.sinks.LOGGER.critical")
+def test_streaming_writer_error_exits(logger, tmp_path):
+    filename = initialize_csv(str(tmp_path / "broken"))
+    sink = StreamingCsvWriter(filename)
+    sink.write_page(1, 1)
+
+    with pytest.raises(SystemExit):
+        sink.close()
+
+    assert logger.called
+
+
+def test_batch_sink_writes_whole_batch_at_checkpoint():
+    write = Mock()
+    sink = BatchSink(write)
+
+    sink.write_page(1, ["page 1"])
+    sink.write_page(2, ["page 2"])
+    assert not write.called
+    sink.checkpoint([1, 2])
+    sink.checkpoint([])
+
+    write.assert_called_once_with([1, 2], [["page 1"], ["page 2"]])
+
+
+def test_realtor_key_normalizes_name_and_number():
+    assert realtor_key("  Jane   DOE ", "(555) 123-4567") == "jane doe|5551234567"
+
+
+def test_sqlite_sink_upserts_repeated_realtors(tmp_path):
+    filename = str(tmp_path / "realtors.db")
+    sink = SqliteSink(filename, RealtorData._fields)
+    jane = RealtorData("Jane Doe", "Agent", "Office A", "1 St", "555-123-4567")
+    sink.write_page(1, [jane, make_page(1, cards=1)[0]])
+    sink.checkpoint([1])
+    # Same realtor on a later page, formatted differently and with a new office
+    sink.write_page(2, [jane._replace(name="JANE DOE", number="(555) 1234567")])
+    sink.write_page(2, [jane._replace(company="Office B")])
+    sink.checkpoint([2])
+    sink.close()
+
+    connection = sqlite3.connect(filename)
+    rows = connection.execute(
+        "SELECT name, company, page FROM realtors ORDER BY name"
+    ).fetchall()
+    (journal_mode,) = connection.execute("PRAGMA journal_mode").fetchone()
+    connection.close()
+    assert rows == [("Jane Doe", "Office B", 2), ("name 1-0", "office", 1)]
+    assert journal_mode == "wal"
+
+
+def test_sqlite_sink_keeps_every_blank_card(tmp_path):
+    filename = str(tmp_path / "realtors.db")
+    sink = SqliteSink(filename, RealtorData._fields)
+    blank = RealtorData("", "Agent", "Office A", "1 St", "")
+    sink.write_page(1, [blank, blank._replace(company="Office B")])
+    sink.checkpoint([1])
+    sink.close()
+
+    connection = sqlite3.connect(filename)
+    rows = connection.execute(
+        "SELECT company, realtor_key FROM realtors ORDER BY company"
+    ).fetchall()
+    connection.close()
+    assert rows == [("Office A", None), ("Office B", None)]
+
+
+def test_sqlite_sink_rerun_updates_last_seen(tmp_path):
+    filename = str(tmp_path / "realtors.db")
+    page = make_page(1)
+    first_run = SqliteSink(filename, RealtorData._fields)
+    first_run.seen_at = "2024-01-01T00:00:00+00:00"
+    first_run.write_page(1, page)
+    first_run.close()
+
+    second_run = SqliteSink(filename, RealtorData._fields)
+    second_run.write_page(1, page[:1])
+    second_run.checkpoint([1])
+    second_run.close()
+
+    connection = sqlite3.connect(filename)
+    rows = connection.execute(
+        "SELECT first_seen, last_seen FROM realtors ORDER BY name"
+    ).fetchall()
+    connection.close()
+    assert len(rows) == 3
+    assert rows[0] == ("2024-01-01T00:00:00+00:00", second_run.seen_at)
+    assert rows[1] == ("2024-01-01T00:00:00+00:00", "2024-01-01T00:00:00+00:00")
+
+
+@patch("src.sinks.LOGGER.critical")
+def test_sqlite_sink_exits_on_a_table_with_other_columns(logger, tmp_path):
+    filename = str(tmp_path / "realtors.db")
+    SqliteSink(filename, RealtorData._fields).close()
+
+    with pytest.raises(SystemExit):
+        SqliteSink(filename, ["change", *RealtorData._fields])
+    assert "use another file name" in logger.call_args_list[0][0][0]
+
+    old_filename = str(tmp_path / "old.db")
+    connection = sqlite3.connect(old_filename)
+    connection.execute(
+        f"CREATE TABLE realtors ({', '.join(RealtorData._fields)}, "
+        "realtor_key TEXT NOT NULL, page INTEGER, first_seen TEXT, last_seen TEXT)"
+    )
+    connection.close()
+    with pytest.raises(SystemExit):
+        SqliteSink(old_filename, RealtorData._fields)
+
+
+def test_parquet_sink_writes_row_groups(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    filename = str(tmp_path / "realtors.parquet")
+    sink = ParquetSink(filename, RealtorData._fields, row_group_rows=4)
+    pages = [make_page(page_num) for page_num in range(1, 4)]
+    for page_num, page_data in enumerate(pages, 1):
+        sink.write_page(page_num, page_data)
+        sink.checkpoint([page_num])
+    sink.close()
+
+    parquet_file = parquet.ParquetFile(filename)
+    table = parquet_file.read()
+    assert parquet_file.metadata.num_row_groups == 2
+    assert [RealtorData(*row.values()) for row in table.to_pylist()] == [
+        row for page in pages for row in page
+    ]
+    assert str(table.schema.field("company").type).startswith("dictionary")
@@ -0,0 +1,104 @@
+import os
+from unittest.mock import Mock, PropertyMock, patch
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from src.supervisor import RSS_CHECK_PAGES, DriverSupervisor
+
+
+def new_drivers(count):
+    return Mock(side_effect=[Mock(name=f"driver {index}") for index in range(count)])
+
+
+def test_driver_is_recycled_after_recycle_pages():
+    first_driver = Mock()
+    restart_driver = new_drivers(2)
+    supervisor = DriverSupervisor(first_driver, restart_driver, recycle_pages=2)
+
+    used = [supervisor.render(lambda driver, page_num: driver, n) for n in range(5)]
+
+    assert used[:2] == [first_driver] * 2
+    assert used[2] is used[3] is not first_driver
+    assert used[4] is not used[2]
+    assert first_driver.quit.called
+    assert supervisor.recycles == 2
+
+
+@patch("src.supervisor.time.sleep")
+def test_dead_session_is_restarted_and_page_retried(mock_sleep):
+    dead_driver = Mock()
+    type(dead_driver).window_handles = PropertyMock(
+        side_effect=WebDriverException("invalid session id")
+    )
+    restart_driver = new_drivers(1)
+    supervisor = DriverSupervisor(dead_driver, restart_driver, backoff=0.5)
+
+    def render(driver, page_num):
+        if driver is dead_driver:
+            raise WebDriverException("chrome not reachable")
+        return f"page {page_num}"
+
+    assert supervisor.render(render, 3) == "page 3"
+    assert dead_driver.quit.called
+    assert supervisor.driver is not dead_driver
+    assert supervisor.restarts == 1
+    assert mock_sleep.call_args_list[0][0][0] == 0.5
+
+
+@patch("src.supervisor.time.sleep")
+def test_live_session_is_retried_with_backoff(mock_sleep):
+    driver = Mock()
+    render = Mock(side_effect=[WebDriverException("timeout")] * 2 + ["data"])
+    supervisor = DriverSupervisor(driver, new_drivers(0), backoff=1)
+
+    assert supervisor.render(render, 1) == "data"
+    assert supervisor.driver is driver
+    assert [call[0][0] for call in mock_sleep.call_args_list] == [1, 2]
+
+
+@patch("src.supervisor.time.sleep")
+def test_gives_up_after_retries(mock_sleep):
+    render = Mock(side_effect=WebDriverException("timeout"))
+    supervisor = DriverSupervisor(Mock(), new_drivers(0), retries=2)
+
+    with pytest.raises(WebDriverException):
+        supervisor.render(render, 1)
+
+    assert render.call_count == 3
+
+
+def test_without_restart_driver_errors_are_not_retried():
+    render = Mock(side_effect=WebDriverException("timeout"))
+    supervisor = DriverSupervisor(Mock())
+
+    with pytest.raises(WebDriverException):
+        supervisor.render(render, 1)
+
+    assert render.call_count == 1
+
+
+def test_page_errors_are_not_retried():
+    render = Mock(side_effect=AssertionError("no cards"))
+    supervisor = DriverSupervisor(Mock(), new_drivers(1))
+
+    with pytest.raises(AssertionError):
+        supervisor.render(render, 1)
+
+    assert render.call_count == 1
+
+
+@patch("src.supervisor.process_tree_rss_bytes", return_value=3 * 1024 * 1024)
+def test_driver_is_recycled_past_rss_limit(mock_rss):
+    driver = Mock()
+    driver.service.process.pid = os.getpid()
+    restart_driver = new_drivers(1)
+    supervisor = DriverSupervisor(driver, restart_driver, recycle_rss_bytes=1024**2)
+
+    for page_num in range(RSS_CHECK_PAGES + 1):
+        supervisor.render(lambda driver, page_num: None, page_num)
+
+    # Only checked once the driver has done RSS_CHECK_PAGES pages
+    assert mock_rss.call_count == 1
+    assert driver.quit.called
+    assert supervisor.driver is not driver
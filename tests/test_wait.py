@@ -0,0 +1,139 @@
+from unittest.mock import Mock, patch
+from selenium.common.exceptions import TimeoutException
+from src.wait import (
+    CARD_SELECTOR,
+    MIN_SAMPLES,
+    PAGER_CURRENT_SELECTOR,
+    PAGER_TOTAL_SELECTOR,
+    CardsSettled,
+    WaitStats,
+    wait_for_cards,
+)
+
+
+def driver_with_card_counts(counts, page_num=None, total_pages=None):
+    # Each look for cards returns the next count worth of them, the pager
+    # shows page_num of total_pages when given
+    counts = iter(counts)
+    pager = {
+        PAGER_CURRENT_SELECTOR: page_num,
+        PAGER_TOTAL_SELECTOR: total_pages,
+    }
+
+    def find_elements(by, selector):
+        if selector == CARD_SELECTOR:
+            return ["card"] * next(counts)
+        if pager[selector] is None:
+            return []
+        return [Mock(text=f" {pager[selector]} ")]
+
+    driver = Mock()
+    driver.find_elements.side_effect = find_elements
+    return driver
+
+
+def test_cards_settled_waits_for_stable_count():
+    driver = driver_with_card_counts([0, 3, 5, 5, 5])
+    condition = CardsSettled(stable_polls=2)
+
+    results = [condition(driver) for _ in range(5)]
+
+    assert results == [False, False, False, False, True]
+    assert condition.last_count == 5
+
+
+def test_cards_settled_ignores_empty_page():
+    driver = driver_with_card_counts([0, 0, 0, 0], page_num=3, total_pages=5)
+    condition = CardsSettled(stable_polls=2)
+
+    assert not any(condition(driver) for _ in range(4))
+
+
+def test_cards_settled_on_a_page_past_the_last_one():
+    driver = driver_with_card_counts([0], page_num=6, total_pages=5)
+    condition = CardsSettled(stable_polls=2)
+
+    assert condition(driver)
+    assert condition.last_count == 0
+
+
+def test_wait_for_cards_doesnt_wait_out_the_ceiling_past_the_last_page():
+    driver = driver_with_card_counts([0], page_num=6, total_pages=5)
+    wait_stats = WaitStats(ceiling=5)
+
+    card_count = wait_for_cards(driver, wait_stats, poll_interval=0.01)
+
+    assert card_count == 0
+    assert wait_stats.timeouts == 0
+    assert wait_stats.samples[0] < 1
+
+
+def test_wait_for_cards_returns_once_settled():
+    driver = driver_with_card_counts([0, 2, 2, 2])
+    wait_stats = WaitStats(ceiling=5)
+
+    card_count = wait_for_cards(driver, wait_stats, poll_interval=0.01)
+
+    assert card_count == 2
+    assert wait_stats.pages == 1
+    assert wait_stats.timeouts == 0
+    assert wait_stats.samples[0] < 1
+
+
+@patch("src.wait.LOGGER.warning")
+@patch("selenium.webdriver.support.wait.WebDriverWait")
+def test_wait_for_cards_timeout_is_recorded(mock_wait, logger):
+    mock_wait.return_value.until.side_effect = TimeoutException()
+    wait_stats = WaitStats(ceiling=3)
+
+    card_count = wait_for_cards(Mock(), wait_stats)
+
+    assert card_count == 0
+    assert wait_stats.timeouts == 1
+    assert mock_wait.call_args_list[0][0][1] == 3
+    assert logger.called
+
+
+def test_wait_for_cards_waits_past_the_adaptive_ceiling_for_a_slow_page():
+    wait_stats = WaitStats(ceiling=5, floor=0.05)
+    for _ in range(MIN_SAMPLES):
+        wait_stats.record(0.01)
+    assert wait_stats.current_ceiling() == 0.05
+    # The second half of the cards only turns up after the adaptive ceiling
+    driver = driver_with_card_counts([0] * 10 + [3] * 2 + [6] * 3)
+
+    card_count = wait_for_cards(driver, wait_stats, poll_interval=0.01)
+
+    assert card_count == 6
+    assert wait_stats.timeouts == 0
+
+
+def test_wait_stats_ceiling_adapts_within_bounds():
+    wait_stats = WaitStats(ceiling=8, floor=1)
+    assert wait_stats.current_ceiling() == 8
+
+    for _ in range(MIN_SAMPLES):
+        wait_stats.record(0.2)
+    assert wait_stats.current_ceiling() == 1
+
+    for _ in range(MIN_SAMPLES):
+        wait_stats.record(2)
+    assert wait_stats.current_ceiling() == 4
+
+    for _ in range(MIN_SAMPLES):
+        wait_stats.record(8, timed_out=True)
+    assert wait_stats.current_ceiling() == 8
+
+
+def test_wait_stats_summary():
+    wait_stats = WaitStats(ceiling=8)
+    wait_stats.record(1)
+    wait_stats.record(3, timed_out=True)
+
+    summary = wait_stats.summary()
+
+    assert summary["pages"] == 2
+    assert summary["timeouts"] == 1
+    assert summary["mean"] == 2
+    assert summary["max"] == 3
+    assert summary["ceiling"] == 8